@@ -1,8 +1,151 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
 from rest_framework.authentication import BaseAuthentication
 from rest_framework.exceptions import AuthenticationFailed
 from usersapi.models import CustomObtainToken
 
 
+class TokenCache:
+    """
+    Two-level cache of resolved tokens: a bounded in-process LRU in front of CACHES["default"].
+    Local entries live only a few seconds, so an invalidation made by another worker
+    is picked up quickly, while the shared entry saves the database round-trip.
+    Entries carry the user, so usersapi.signals drops them whenever the user changes.
+
+    Every key has a generation that invalidate() replaces. A fill takes a stamp() before loading the token
+    and set() stores the entry under that stamp, so a fill that loaded the token before an invalidation
+    writes an entry that get() no longer accepts instead of bringing the stale token back.
+    """
+
+    key_prefix = "auth_token"
+    generation_prefix = "auth_token_generation"
+
+    def __init__(self, max_size: int, local_ttl: int, shared_ttl: int):
+        self.max_size = max_size
+        self.local_ttl = local_ttl
+        self.shared_ttl = shared_ttl
+        self._local = OrderedDict()
+        self._local_epoch = 0
+        self._lock = threading.Lock()
+
+    def _cache_key(self, key: str) -> str:
+        return f"{self.key_prefix}:{key}"
+
+    def _generation_key(self, key: str) -> str:
+        return f"{self.generation_prefix}:{key}"
+
+    def get(self, key: str) -> CustomObtainToken | None:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is not None:
+                token, expires_at = entry
+                if expires_at > now:
+                    self._local.move_to_end(key)
+                    return token
+                del self._local[key]
+            epoch = self._local_epoch
+
+        cache_key, generation_key = self._cache_key(key), self._generation_key(key)
+        values = cache.get_many([cache_key, generation_key])
+        entry = values.get(cache_key)
+        if entry is None or generation_key not in values:
+            return None
+
+        generation, token = entry
+        if generation != values[generation_key]:
+            return None
+
+        self._remember(key, token, epoch)
+        return token
+
+    def stamp(self, key: str) -> tuple[str, int]:
+        """
+        Returns the current generation of the key, to be taken before loading the token and passed to set()
+        """
+        with self._lock:
+            epoch = self._local_epoch
+
+        generation_key = self._generation_key(key)
+        generation = cache.get(generation_key)
+        if generation is None:
+            generation = uuid.uuid4().hex
+            if not cache.add(generation_key, generation, self.shared_ttl):
+                generation = cache.get(generation_key, generation)
+        return generation, epoch
+
+    def set(self, key: str, token: CustomObtainToken, stamp: tuple[str, int]) -> None:
+        generation, epoch = stamp
+        cache.set(self._cache_key(key), (generation, token), self.shared_ttl)
+        self._remember(key, token, epoch)
+
+    def invalidate(self, *keys: str) -> None:
+        if not keys:
+            return
+
+        with self._lock:
+            for key in keys:
+                self._local.pop(key, None)
+            self._local_epoch += 1
+        cache.set_many({self._generation_key(key): uuid.uuid4().hex for key in keys}, self.shared_ttl)
+        cache.delete_many([self._cache_key(key) for key in keys])
+
+    def clear_local(self) -> None:
+        with self._lock:
+            self._local.clear()
+            self._local_epoch += 1
+
+    def _remember(self, key: str, token: CustomObtainToken, epoch: int) -> None:
+        with self._lock:
+            if epoch != self._local_epoch:
+                return
+
+            self._local[key] = (token, time.monotonic() + self.local_ttl)
+            self._local.move_to_end(key)
+            while len(self._local) > self.max_size:
+                self._local.popitem(last=False)
+
+
+token_cache = TokenCache(
+    max_size=settings.AUTH_TOKEN_CACHE_SIZE,
+    local_ttl=settings.AUTH_TOKEN_CACHE_LOCAL_TTL,
+    shared_ttl=settings.AUTH_TOKEN_CACHE_TTL,
+)
+
+
+def resolve_token(key: str) -> CustomObtainToken | None:
+    """
+    Return the online, unexpired token with its user, loading both in one query on a cache miss
+    """
+    token = token_cache.get(key)
+    if token is not None:
+        return token
+
+    stamp = token_cache.stamp(key)
+    try:
+        token = CustomObtainToken.objects.select_related("user").get(
+            key=key, status=CustomObtainToken.Status.ONLINE, expires_at__gt=timezone.now()
+        )
+    except CustomObtainToken.DoesNotExist:
+        return None
+
+    token_cache.set(key, token, stamp)
+    return token
+
+
+def invalidate_tokens(*keys: str) -> None:
+    """
+    Drop the given token keys from the authentication cache
+    """
+    token_cache.invalidate(*keys)
+
+
 class CustomObtainTokenAuthentication(BaseAuthentication):
     def authenticate(self, request):
         auth_header = request.META.get("HTTP_AUTHORIZATION")
@@ -11,11 +154,14 @@ class CustomObtainTokenAuthentication(BaseAuthentication):
 
         try:
             token_type, key = auth_header.split(" ")
-            if token_type != "Token":
-                raise AuthenticationFailed("Invalid Token header")
+        except ValueError:
+            raise AuthenticationFailed("Invalid Token")
+
+        if token_type != "Token":
+            raise AuthenticationFailed("Invalid Token header")
 
-            token = CustomObtainToken.objects.get(key=key)
-        except (ValueError, CustomObtainToken.DoesNotExist):
+        token = resolve_token(key)
+        if token is None or token.is_expired or not token.user.is_active:
             raise AuthenticationFailed("Invalid Token")
 
         return (token.user, token)
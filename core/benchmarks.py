@@ -0,0 +1,30 @@
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.management.base import CommandError
+from django.test.utils import setup_databases, teardown_databases
+
+
+def add_benchmark_arguments(parser) -> None:
+    parser.add_argument(
+        "--i-know-this-is-not-prod",
+        action="store_true",
+        help="Run with DEBUG off. The seeded data still lives on the configured database server.",
+    )
+
+
+@contextmanager
+def benchmark_database(options: dict):
+    """
+    Runs the benchmark against a freshly migrated test database next to the configured one, dropped afterwards,
+    so seeded rows never mix with real data. Refuses to start with DEBUG off unless --i-know-this-is-not-prod is given.
+    """
+    if not settings.DEBUG and not options["i_know_this_is_not_prod"]:
+        raise CommandError("Benchmarks load the database server. Run them with DEBUG on or --i-know-this-is-not-prod.")
+
+    verbosity = options["verbosity"]
+    old_config = setup_databases(verbosity=verbosity, interactive=False, serialized_aliases=set())
+    try:
+        yield
+    finally:
+        teardown_databases(old_config, verbosity=verbosity)
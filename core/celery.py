@@ -3,6 +3,7 @@ from __future__ import absolute_import, unicode_literals
 import os
 
 from celery import Celery
+from celery.signals import worker_process_init
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings")
 
@@ -11,6 +12,13 @@ app.config_from_object("django.conf:settings", namespace="CELERY")
 app.autodiscover_tasks()
 
 
+@worker_process_init.connect
+def warm_templates(**kwargs):
+    from usersapi.emails import warm_email_templates
+
+    warm_email_templates()
+
+
 @app.task(bind=True)
 def debug_task(self):
     print(f"Request: {self.request!r}")
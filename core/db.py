@@ -0,0 +1,29 @@
+from contextlib import nullcontext
+from typing import Callable
+
+from django.db import IntegrityError, models, router, transaction
+
+
+def violates_unique_field(error: IntegrityError, model: type[models.Model], field_name: str) -> bool:
+    column = model._meta.get_field(field_name).column
+    return f"({column})" in str(error)
+
+
+def save_with_unique_key(
+    instance: models.Model, field_name: str, generate: Callable[[], str], save: Callable[[], None], max_attempts=5
+) -> None:
+    """
+    Saves the instance and, if the generated key collides with an existing row, draws a new key and tries again.
+    The unique constraint does the uniqueness check, so no lookup query is needed before the insert.
+    """
+    connection = transaction.get_connection(router.db_for_write(type(instance)))
+    for attempt in range(max_attempts):
+        # Inside a transaction the failed insert has to be rolled back to a savepoint so the caller can go on.
+        # In autocommit mode the statement fails on its own and the savepoint would only cost two more round-trips.
+        try:
+            with transaction.atomic(using=connection.alias) if connection.in_atomic_block else nullcontext():
+                return save()
+        except IntegrityError as e:
+            if attempt == max_attempts - 1 or not violates_unique_field(e, type(instance), field_name):
+                raise
+            setattr(instance, field_name, generate())
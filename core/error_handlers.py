@@ -1,37 +1,136 @@
-import difflib
+import threading
+import time
+from collections import Counter, OrderedDict, defaultdict
 
+from django.conf import settings
 from django.http import JsonResponse
 from django.urls import get_resolver
 from rest_framework import status
 
 
 def get_all_urls():
-    url_patterns = get_resolver().url_patterns
+    """
+    Full paths of all plain routes, e.g. "/api/login/".
+    Regex routes are kept only when they are a literal path, like the ones registered by DRF routers.
+    """
     all_urls = []
 
-    def extract_urls(patterns):
+    def extract_urls(patterns, prefix):
         for pattern in patterns:
+            route = str(pattern.pattern).removeprefix("^").removesuffix("$")
+            if "(" in route or "\\" in route or "[" in route:
+                continue
             if hasattr(pattern, "url_patterns"):
-                extract_urls(pattern.url_patterns)
+                extract_urls(pattern.url_patterns, prefix + route)
             else:
-                try:
-                    all_urls.append(pattern.pattern._route)
-                except AttributeError:
-                    pass
+                all_urls.append(prefix + route)
 
-    extract_urls(url_patterns)
-    return all_urls
+    extract_urls(get_resolver().url_patterns, "/")
+    return list(dict.fromkeys(all_urls))
 
 
-def find_closest_match(requested_url, all_urls):
-    closest_matches = difflib.get_close_matches(requested_url, all_urls, n=1, cutoff=0.3)
-    return closest_matches[0] if closest_matches else None
+def ngrams(value: str, size: int = 3) -> set[str]:
+    padded = f"{' ' * (size - 1)}{value.lower()} "
+    return {padded[i : i + size] for i in range(len(padded) - size + 1)}
+
+
+class RouteIndex:
+    """
+    Trigram index over the routes. A lookup only scores routes that share a trigram with the path,
+    by their Dice similarity, instead of comparing the path with every route.
+    """
+
+    def __init__(self, routes: list[str], cutoff: float = 0.3, max_path_length: int = 200):
+        self.routes = routes
+        self.cutoff = cutoff
+        self.max_path_length = max_path_length
+        self.sizes = []
+        self.postings = defaultdict(list)
+        for route_id, route in enumerate(routes):
+            grams = ngrams(route)
+            self.sizes.append(len(grams))
+            for gram in grams:
+                self.postings[gram].append(route_id)
+
+    def closest(self, path: str) -> str | None:
+        grams = ngrams(path[: self.max_path_length])
+        shared = Counter()
+        for gram in grams:
+            shared.update(self.postings.get(gram, ()))
+
+        size = len(grams)
+        best_id, best_score = None, self.cutoff
+        for route_id, common in shared.items():
+            score = 2 * common / (size + self.sizes[route_id])
+            if score >= best_score:
+                best_id, best_score = route_id, score
+        return self.routes[best_id] if best_id is not None else None
+
+
+class SuggestionCache:
+    """
+    Bounded in-process LRU of path -> suggestion, including paths without any suggestion,
+    so a scanner repeating the same paths does not pay for the lookup again
+    """
+
+    def __init__(self, max_size: int, ttl: int):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, path: str):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is None:
+                return False, None
+            suggestion, expires_at = entry
+            if expires_at <= now:
+                del self._entries[path]
+                return False, None
+            self._entries.move_to_end(path)
+            return True, suggestion
+
+    def set(self, path: str, suggestion: str | None) -> None:
+        with self._lock:
+            self._entries[path] = (suggestion, time.monotonic() + self.ttl)
+            self._entries.move_to_end(path)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+_route_index = None
+_route_index_lock = threading.Lock()
+suggestion_cache = SuggestionCache(settings.NOT_FOUND_SUGGESTION_CACHE_SIZE, settings.NOT_FOUND_SUGGESTION_CACHE_TTL)
+
+
+def get_route_index() -> RouteIndex:
+    """
+    The URLconf does not change while the process runs, so the index is built on the first 404 and reused
+    """
+    global _route_index
+    if _route_index is None:
+        with _route_index_lock:
+            if _route_index is None:
+                _route_index = RouteIndex(get_all_urls())
+    return _route_index
+
+
+def find_closest_match(requested_url):
+    found, closest_match = suggestion_cache.get(requested_url)
+    if not found:
+        closest_match = get_route_index().closest(requested_url)
+        suggestion_cache.set(requested_url, closest_match)
+    return closest_match
 
 
 def custom_404(request, exception=None):
-    requested_url = request.path
-    all_urls = get_all_urls()
-    closest_match = find_closest_match(requested_url, all_urls)
+    closest_match = find_closest_match(request.path)
 
     if closest_match:
         message = f"Page not found. Maybe you meant: '{closest_match}'?"
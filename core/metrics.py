@@ -0,0 +1,206 @@
+import hmac
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connection
+from django.http import Http404, HttpResponse, HttpResponseForbidden
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: tuple[str, ...], values: tuple, *extra: str) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs.extend(pair for pair in extra if pair)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labels: tuple[str, ...]):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._values = defaultdict(float)
+
+    def inc(self, labels: tuple, amount: float = 1) -> None:
+        self._values[labels] += amount
+
+    def value(self, labels: tuple) -> float:
+        return self._values.get(labels, 0)
+
+    def expose(self, const: str = "") -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for labels, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_labels(self.labels, labels, const)} {value:g}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labels: tuple[str, ...], buckets: tuple[float, ...]):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: one count per bucket plus +Inf, then the sum of the observed values
+        self._values = {}
+
+    def observe(self, labels: tuple, value: float) -> None:
+        state = self._values.get(labels)
+        if state is None:
+            state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        state[0][bisect_left(self.buckets, value)] += 1
+        state[1] += value
+
+    def count(self, labels: tuple) -> int:
+        state = self._values.get(labels)
+        return sum(state[0]) if state else 0
+
+    def expose(self, const: str = "") -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total) in sorted(self._values.items()):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += count
+                le = 'le="{}"'.format(bound if bound == "+Inf" else f"{bound:g}")
+                lines.append(f"{self.name}_bucket{_labels(self.labels, labels, const, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, labels, const)} {total:g}")
+            lines.append(f"{self.name}_count{_labels(self.labels, labels, const)} {cumulative}")
+        return lines
+
+
+class Registry:
+    """
+    In-process metrics of the worker. Updates are a few dictionary operations under one lock,
+    so recording a request costs microseconds next to the request itself.
+    Every series carries the worker's pid, so series of different workers sum up instead of overwriting each other.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._create_metrics()
+
+    def _create_metrics(self) -> None:
+        self.requests = Counter(
+            "http_requests_total", "Requests by view, method and status.", ("view", "method", "status")
+        )
+        self.latency = Histogram(
+            "http_request_duration_seconds",
+            "Request latency by view.",
+            ("view", "method"),
+            settings.METRICS_LATENCY_BUCKETS,
+        )
+        self.queries = Histogram(
+            "http_request_db_queries",
+            "Database queries per request by view.",
+            ("view",),
+            settings.METRICS_QUERY_COUNT_BUCKETS,
+        )
+        self.query_time = Counter(
+            "db_query_duration_seconds_total", "Time spent in database queries by view.", ("view",)
+        )
+        self.cache = Counter(
+            "response_cache_requests_total", "Cached view lookups by view and result.", ("view", "result")
+        )
+
+    def record(self, request_metrics: "RequestMetrics", method: str, status: int, elapsed: float) -> None:
+        view = request_metrics.view
+        with self._lock:
+            self.requests.inc((view, method, str(status)))
+            self.latency.observe((view, method), elapsed)
+            self.queries.observe((view,), request_metrics.queries)
+            self.query_time.inc((view,), request_metrics.query_time)
+            if request_metrics.cache_result:
+                self.cache.inc((view, request_metrics.cache_result))
+
+    def expose(self) -> str:
+        worker = f'worker="{os.getpid()}"'
+        with self._lock:
+            lines = []
+            for metric in (self.requests, self.latency, self.queries, self.query_time, self.cache):
+                lines.extend(metric.expose(worker))
+        return "\n".join(lines) + "\n"
+
+    def reset(self) -> None:
+        with self._lock:
+            self._create_metrics()
+
+
+registry = Registry()
+
+
+class RequestMetrics:
+    __slots__ = ("view", "queries", "query_time", "cache_result")
+
+    def __init__(self):
+        self.view = "<unresolved>"
+        self.queries = 0
+        self.query_time = 0.0
+        self.cache_result = None
+
+    def __call__(self, execute, sql, params, many, context):
+        """
+        connection.execute_wrapper hook: counts and times every query of the request
+        """
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.query_time += time.perf_counter() - started
+
+
+def record_cache_result(request, hit: bool) -> None:
+    """
+    Notes whether a cached view answered from the cache. Accepts both Django and DRF requests.
+    """
+    request_metrics = getattr(getattr(request, "_request", request), "metrics", None)
+    if request_metrics is not None:
+        request_metrics.cache_result = "hit" if hit else "miss"
+
+
+class MetricsMiddleware:
+    """
+    Records latency, database queries and response cache results of every request, labelled by URL name
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.METRICS_ENABLED:
+            return self.get_response(request)
+
+        request_metrics = request.metrics = RequestMetrics()
+        started = time.perf_counter()
+        with connection.execute_wrapper(request_metrics):
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - started
+
+        match = getattr(request, "resolver_match", None)
+        if match is not None and match.view_name:
+            request_metrics.view = match.view_name
+        registry.record(request_metrics, request.method, response.status_code, elapsed)
+        return response
+
+
+def metrics_view(request):
+    """
+    Served to the addresses in METRICS_ALLOWED_IPS and to requests with the METRICS_TOKEN bearer token
+    """
+    if not settings.METRICS_ENABLED:
+        raise Http404
+    if not _metrics_access_allowed(request):
+        return HttpResponseForbidden()
+    return HttpResponse(registry.expose(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+def _metrics_access_allowed(request) -> bool:
+    if request.META.get("REMOTE_ADDR") in settings.METRICS_ALLOWED_IPS:
+        return True
+    authorization = request.META.get("HTTP_AUTHORIZATION", "")
+    return bool(settings.METRICS_TOKEN) and hmac.compare_digest(authorization, f"Bearer {settings.METRICS_TOKEN}")
@@ -13,7 +13,7 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 import os
 from pathlib import Path
 
-from decouple import config
+from decouple import Csv, config
 import colorlog
 
 # from decouple import config
@@ -46,6 +46,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     # INSTALLED
     "rest_framework",
     "rest_framework.authtoken",
@@ -54,6 +55,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "core.metrics.MetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -69,8 +71,16 @@ TEMPLATES = [
     {
         "BACKEND": "django.template.backends.django.DjangoTemplates",
         "DIRS": [BASE_DIR / "templates"],
-        "APP_DIRS": True,
         "OPTIONS": {
+            "loaders": [
+                (
+                    "django.template.loaders.cached.Loader",
+                    [
+                        "django.template.loaders.filesystem.Loader",
+                        "django.template.loaders.app_directories.Loader",
+                    ],
+                ),
+            ],
             "context_processors": [
                 "django.template.context_processors.debug",
                 "django.template.context_processors.request",
@@ -157,6 +167,8 @@ REST_FRAMEWORK = {
 
 # Cryptography
 ENCRYPTION_KEY = config("ENCRYPTION_KEY")
+# HMAC key of the wallet address blind index, deliberately separate from the encryption key
+BLIND_INDEX_KEY = config("BLIND_INDEX_KEY")
 
 # Logging
 LOGGING = {
@@ -195,6 +207,11 @@ EMAIL_HOST_USER = config("DEFAULT_FROM_EMAIL")
 EMAIL_HOST_PASSWORD = config("EMAIL_SECRET_KEY")
 EMAIL_PORT = 587
 DEFAULT_FROM_EMAIL = f"NFT market <{EMAIL_HOST_USER}>"
+EMAIL_BATCH_SIZE = 50
+EMAIL_RATE_LIMIT = 10  # messages per second
+EMAIL_MAX_ATTEMPTS = 5
+EMAIL_RETRY_BACKOFF = 30  # seconds, doubled on every attempt
+EMAIL_SEND_LEASE = 60 * 5  # seconds a claimed batch is reserved for the worker sending it
 
 # Celery Configuration
 CELERY_BROKER_URL = "amqp://guest@localhost:5672//"
@@ -205,6 +222,28 @@ CELERY_TIMEZONE = TIME_ZONE
 CELERY_ENABLE_UTC = True
 CELERY_TASK_BACKEND = "rpc://"
 CELERY_BEAT_SCHEDULER = "django_celery_beat.schedulers:DatabaseScheduler"
+CELERY_BEAT_SCHEDULE = {
+    "refresh-payment-node-url": {
+        "task": "wallet.tasks.refresh_payment_node_url",
+        "schedule": 60.0,
+    },
+    "process-payment-inbox": {
+        "task": "wallet.tasks.process_payment_inbox",
+        "schedule": 5.0,
+    },
+    "fold-wallet-balance-shards": {
+        "task": "wallet.tasks.fold_wallet_balance_shards",
+        "schedule": 30.0,
+    },
+    "flush-email-outbox": {
+        "task": "usersapi.tasks.flush_email_outbox",
+        "schedule": 5.0,
+    },
+    "purge-sessions": {
+        "task": "usersapi.tasks.purge_sessions",
+        "schedule": 60.0 * 15,
+    },
+}
 
 # Redis
 CACHES = {
@@ -213,3 +252,49 @@ CACHES = {
         "LOCATION": "redis://redis:6379",
     }
 }
+
+# Token authentication cache
+AUTH_TOKEN_CACHE_SIZE = 10_000
+AUTH_TOKEN_CACHE_LOCAL_TTL = 5
+AUTH_TOKEN_CACHE_TTL = 60 * 5
+
+# Sessions: lifetime of a token and the batch size used by purge_sessions
+AUTH_TOKEN_TTL = 60 * 60 * 24 * 30
+SESSION_PURGE_BATCH_SIZE = 1000
+
+# Largest batch accepted by the bulk NFT mint endpoint
+PRODUCT_BULK_MINT_MAX_ITEMS = 5000
+
+# Largest number of recipients accepted by the batch wallet transfer endpoint
+WALLET_BATCH_TRANSFER_MAX_ITEMS = 1000
+
+# 404 handler: in-process cache of route suggestions per requested path
+NOT_FOUND_SUGGESTION_CACHE_SIZE = 10_000
+NOT_FOUND_SUGGESTION_CACHE_TTL = 60
+
+# Request metrics exposed on /metrics in the Prometheus text format, per worker process.
+# Only served to the allowed addresses and to scrapers sending "Authorization: Bearer <METRICS_TOKEN>"
+METRICS_ENABLED = config("METRICS_ENABLED", default=True, cast=bool)
+METRICS_ALLOWED_IPS = config("METRICS_ALLOWED_IPS", default="127.0.0.1,::1", cast=Csv())
+METRICS_TOKEN = config("METRICS_TOKEN", default="")
+METRICS_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+METRICS_QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+# Payment service client
+PAYMENT_SERVICE_CONNECT_TIMEOUT = 3
+PAYMENT_SERVICE_READ_TIMEOUT = 10
+PAYMENT_SERVICE_MAX_RETRIES = 2
+PAYMENT_SERVICE_BACKOFF = 0.2
+PAYMENT_SERVICE_FAILURE_THRESHOLD = 5
+PAYMENT_SERVICE_RESET_TIMEOUT = 30
+
+# Payment node discovery
+PAYMENT_NODE_DISCOVERY_URL = config("PAYMENT_NODE_DISCOVERY_URL", default="http://ngrok:4040/api/tunnels")
+PAYMENT_SERVICE_URL = config("PAYMENT_SERVICE_URL", default=None)
+PAYMENT_NODE_URL_LOCAL_TTL = 30
+PAYMENT_NODE_URL_TTL = 60 * 5
+PAYMENT_NODE_URL_FAILURE_TTL = 10
+
+# Payment webhook: "sync" applies refills inside the callback, "inbox" stores them for process_payment_inbox
+PAYMENT_WEBHOOK_MODE = config("PAYMENT_WEBHOOK_MODE", default="sync")
+PAYMENT_WEBHOOK_INBOX_BATCH_SIZE = 100
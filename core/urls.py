@@ -19,12 +19,14 @@ from django.contrib import admin
 from django.urls import path, include
 
 from core.error_handlers import custom_404, custom_500
+from core.metrics import metrics_view
 
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("api/", include("storeapi.urls")),
     path("api/", include("usersapi.urls")),
     path("api/", include("wallet.urls")),
+    path("metrics", metrics_view, name="metrics"),
 ]
 
 handler404 = custom_404
@@ -0,0 +1,49 @@
+import time
+from functools import wraps
+from urllib.parse import urlencode
+
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.response import Response
+
+from core.metrics import record_cache_result
+
+MARKET_CACHE_TIMEOUT = 60 * 10
+MARKET_VERSION_KEY = "market_cache_version"
+
+
+def get_market_cache_version() -> int:
+    return cache.get(MARKET_VERSION_KEY, 0)
+
+
+def bump_market_cache_version() -> None:
+    """
+    Makes every cached market page unreachable. Called whenever a product is created or changes hands, or its owner is renamed.
+    """
+    cache.set(MARKET_VERSION_KEY, time.time_ns(), None)
+
+
+def cache_market_page(timeout: int = MARKET_CACHE_TIMEOUT):
+    """
+    Stores the rendered page of the market listing under the current catalog version and query string
+    """
+
+    def decorator(view_method):
+        @wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            query = urlencode(sorted(request.GET.lists()), doseq=True)
+            key = f"market_page:{get_market_cache_version()}:{query}"
+
+            cached = cache.get(key)
+            record_cache_result(request, cached is not None)
+            if cached is not None:
+                return Response(cached)
+
+            response = view_method(self, request, *args, **kwargs)
+            if response.status_code == status.HTTP_200_OK:
+                cache.set(key, response.data, timeout)
+            return response
+
+        return wrapper
+
+    return decorator
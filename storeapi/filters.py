@@ -0,0 +1,37 @@
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db.models import F
+from django_filters import rest_framework as rest_filters
+from rest_framework import filters
+
+from storeapi.models import Product
+
+
+class ProductFilter(rest_filters.FilterSet):
+    min_price = rest_filters.NumberFilter(field_name="price", lookup_expr="gte")
+    max_price = rest_filters.NumberFilter(field_name="price", lookup_expr="lte")
+    for_sale = rest_filters.BooleanFilter(field_name="for_sale")
+
+    class Meta:
+        model = Product
+        fields = ["name", "price", "min_price", "max_price", "for_sale"]
+
+
+class ProductSearchFilter(filters.BaseFilterBackend):
+    """
+    Full-text search over the product name and description, best matches first
+    """
+
+    search_param = "search"
+    search_config = "english"
+
+    def filter_queryset(self, request, queryset, view):
+        search_terms = request.query_params.get(self.search_param, "").strip()
+        if not search_terms:
+            return queryset
+
+        query = SearchQuery(search_terms, search_type="websearch", config=self.search_config)
+        return (
+            queryset.filter(search_vector=query)
+            .annotate(rank=SearchRank(F("search_vector"), query))
+            .order_by("-rank", "id")
+        )
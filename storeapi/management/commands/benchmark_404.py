@@ -0,0 +1,69 @@
+import difflib
+import random
+import string
+import time
+
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+
+from core.error_handlers import RouteIndex, custom_404, get_all_urls, suggestion_cache
+
+
+def random_paths(routes, count, repeat_ratio, seed=0):
+    """
+    Scanner-like 404 paths: typos of real routes, random junk and a share of paths requested again
+    """
+    rng = random.Random(seed)
+    alphabet = string.ascii_lowercase + "-_/."
+
+    def typo(route):
+        chars = list(route)
+        position = rng.randrange(len(chars))
+        chars[position] = rng.choice(alphabet)
+        return "".join(chars)
+
+    def junk():
+        return "/" + "/".join("".join(rng.choices(alphabet, k=rng.randint(3, 12))) for _ in range(rng.randint(1, 4)))
+
+    unique = [
+        typo(rng.choice(routes)) if rng.random() < 0.5 else junk() for _ in range(int(count * (1 - repeat_ratio)))
+    ]
+    return unique + [rng.choice(unique) for _ in range(count - len(unique))]
+
+
+class Command(BaseCommand):
+    help = (
+        "Fires random 404s at the 404 handler and compares the previous lookup "
+        "(walking the resolver and running difflib per request) with the trigram route index"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=10_000)
+        parser.add_argument("--repeats", type=float, default=0.5)
+
+    def handle(self, *args, **options):
+        routes = get_all_urls()
+        paths = random_paths(routes, options["requests"], options["repeats"])
+        factory = RequestFactory()
+        requests = [factory.get(path) for path in paths]
+        self.stdout.write(f"{len(routes)} routes, {len(paths)} requests, {len(set(paths))} distinct paths")
+
+        started = time.perf_counter()
+        for path in paths:
+            difflib.get_close_matches(path, get_all_urls(), n=1, cutoff=0.3)
+        self.report("resolver walk + difflib", len(paths), time.perf_counter() - started)
+
+        index = RouteIndex(routes)
+        started = time.perf_counter()
+        for path in paths:
+            index.closest(path)
+        self.report("trigram index", len(paths), time.perf_counter() - started)
+
+        suggestion_cache.clear()
+        started = time.perf_counter()
+        for request in requests:
+            custom_404(request)
+        self.report("custom_404 (index + cache)", len(paths), time.perf_counter() - started)
+
+    def report(self, name, count, elapsed):
+        self.stdout.write(f"{name:<28} {elapsed:6.2f}s  {elapsed / count * 1_000_000:8.1f} us/request")
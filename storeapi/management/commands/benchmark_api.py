@@ -0,0 +1,312 @@
+import json
+import math
+import threading
+import time
+from contextlib import ExitStack
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from core.benchmarks import add_benchmark_arguments, benchmark_database
+from storeapi.cache import bump_market_cache_version
+from storeapi.models import Product
+from usersapi.models import CustomObtainToken, CustomUser
+from usersapi.tasks import send_email
+from wallet.ledger import post_credit
+from wallet.models import LedgerEntry, Wallet, WalletToWalletTransaction
+from wallet.utils import address_digest, encrypt_data
+
+PASSWORD = "Benchmark-pass-2024"
+FLOWS = ["register", "login", "wallet_connect", "transfer", "history", "market", "buy_nft", "webhook_refill"]
+
+
+def percentile(sorted_values: list[float], share: float) -> float:
+    """
+    Nearest-rank percentile of an already sorted list
+    """
+    return sorted_values[max(0, math.ceil(share * len(sorted_values)) - 1)]
+
+
+def summarize(latencies: list[float], errors: int, elapsed: float) -> dict:
+    latencies = sorted(latencies)
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 2),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+    }
+
+
+def compare(report: dict, baseline: dict, max_regression: float) -> list[str]:
+    """
+    Endpoints whose p95 grew by more than `max_regression` (0.25 = 25%) over the baseline run
+    """
+    regressions = []
+    for name, stats in report["endpoints"].items():
+        before = baseline.get("endpoints", {}).get(name)
+        if before and before["p95_ms"] and stats["p95_ms"] > before["p95_ms"] * (1 + max_regression):
+            regressions.append(f"{name}: p95 {before['p95_ms']}ms -> {stats['p95_ms']}ms")
+    return regressions
+
+
+class Command(BaseCommand):
+    help = (
+        "Seeds users, wallets, products and transfer history, then drives the main API flows in-process "
+        "through the DRF test client and prints p50/p95/p99 latency and requests per second per endpoint as JSON. "
+        "With --baseline the run fails when an endpoint's p95 regressed. Runs against a throwaway test database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=50)
+        parser.add_argument("--products", type=int, default=500)
+        parser.add_argument("--history", type=int, default=5000, help="Seeded transfers shown by the history flow")
+        parser.add_argument("--requests", type=int, default=200, help="Requests per flow")
+        parser.add_argument("--threads", type=int, default=1)
+        parser.add_argument("--flows", default=",".join(FLOWS))
+        parser.add_argument("--fast-hasher", action="store_true", help="Hash passwords with MD5 to leave them out")
+        parser.add_argument("--output", help="Write the JSON report to this file instead of stdout")
+        parser.add_argument("--baseline", help="JSON report of an earlier run to compare p95 with")
+        parser.add_argument("--max-regression", type=float, default=0.25)
+        add_benchmark_arguments(parser)
+
+    def handle(self, *args, **options):
+        flows = options["flows"].split(",")
+        unknown = set(flows) - set(FLOWS)
+        if unknown:
+            raise CommandError(f"Unknown flows: {', '.join(sorted(unknown))}. Available: {', '.join(FLOWS)}")
+
+        self.run_id = int(time.time())
+        self.prefix = f"api_bench_{self.run_id}"
+        self.threads = options["threads"]
+        self.count = options["requests"]
+        report = {
+            "run": {
+                "run_id": self.run_id,
+                "started_at": timezone.now().isoformat(),
+                **{key: options[key] for key in ("users", "products", "history", "requests", "threads")},
+                "fast_hasher": options["fast_hasher"],
+            },
+            "endpoints": {},
+        }
+
+        with ExitStack() as stack:
+            stack.enter_context(benchmark_database(options))
+            # Market pages cached during the run must not outlive the test database
+            stack.callback(bump_market_cache_version)
+            if options["fast_hasher"]:
+                stack.enter_context(
+                    override_settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"])
+                )
+            # Emails are queued in the outbox in-process instead of through the broker
+            eager = send_email.app.conf.task_always_eager
+            send_email.app.conf.task_always_eager = True
+            stack.callback(setattr, send_email.app.conf, "task_always_eager", eager)
+
+            self.seed(options["users"], options["products"], options["history"])
+            for flow in flows:
+                report["endpoints"][flow] = getattr(self, f"flow_{flow}")()
+                self.stderr.write(f"{flow:<15} {json.dumps(report['endpoints'][flow])}")
+
+        output = json.dumps(report, indent=2)
+        if options["output"]:
+            with open(options["output"], "w") as file:
+                file.write(output + "\n")
+        else:
+            self.stdout.write(output)
+
+        if options["baseline"]:
+            with open(options["baseline"]) as file:
+                regressions = compare(report, json.load(file), options["max_regression"])
+            if regressions:
+                raise CommandError("Regressions against the baseline:\n" + "\n".join(regressions))
+
+    def seed(self, users: int, products: int, history: int) -> None:
+        password = make_password(PASSWORD)
+        self.users = CustomUser.objects.bulk_create(
+            [
+                CustomUser(
+                    username=f"{self.prefix}_{i}",
+                    email=f"{self.prefix}_{i}@bench.invalid",
+                    password=password,
+                    user_own_invite_code=f"ab{self.run_id % 100_000}-{i}",
+                )
+                for i in range(users)
+            ]
+        )
+        self.wallets = Wallet.objects.bulk_create(
+            [Wallet(user=user, address=Wallet.generate_key()) for user in self.users]
+        )
+        for wallet in self.wallets:
+            post_credit(LedgerEntry.Kind.REFILL, LedgerEntry.Account.PAYMENTS, wallet, Decimal("1000000.00"))
+        self.tokens = [CustomObtainToken.objects.create(user=user).key for user in self.users]
+
+        self.products = Product.objects.bulk_create(
+            [
+                Product(
+                    name=f"{self.prefix}_nft_{i}",
+                    description="benchmark",
+                    owner=self.users[i % users],
+                    price=Decimal("10.00"),
+                )
+                for i in range(products)
+            ],
+            batch_size=500,
+        )
+        bump_market_cache_version()
+
+        encrypted = [encrypt_data(wallet.address) for wallet in self.wallets]
+        digests = [address_digest(wallet.address) for wallet in self.wallets]
+        WalletToWalletTransaction.objects.bulk_create(
+            [
+                WalletToWalletTransaction(
+                    user_from=self.users[i % users],
+                    user_to=self.users[(i + 1) % users],
+                    wallet_addr_from=encrypted[i % users],
+                    wallet_addr_to=encrypted[(i + 1) % users],
+                    wallet_addr_from_hash=digests[i % users],
+                    wallet_addr_to_hash=digests[(i + 1) % users],
+                    amount=Decimal("10.00"),
+                )
+                for i in range(history)
+            ],
+            batch_size=1000,
+        )
+
+    def run(self, count: int, send) -> dict:
+        """
+        Calls send(client, i) for i in range(count), spread over the threads, and summarizes the latencies.
+        Any response outside 2xx counts as an error.
+        """
+        latencies, errors = [], []
+
+        def worker(offset):
+            client = APIClient(HTTP_USER_AGENT="benchmark", REMOTE_ADDR="127.0.0.1")
+            local_latencies, local_errors = [], 0
+            try:
+                for i in range(offset, count, self.threads):
+                    started = time.perf_counter()
+                    response = send(client, i)
+                    local_latencies.append(time.perf_counter() - started)
+                    local_errors += not 200 <= response.status_code < 300
+            finally:
+                latencies.extend(local_latencies)
+                errors.append(local_errors)
+                if self.threads > 1:
+                    connection.close()
+
+        started = time.perf_counter()
+        if self.threads > 1:
+            threads = [threading.Thread(target=worker, args=(offset,)) for offset in range(self.threads)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        else:
+            worker(0)
+        return summarize(latencies, sum(errors), time.perf_counter() - started)
+
+    def auth(self, i: int) -> dict:
+        return {"HTTP_AUTHORIZATION": f"Token {self.tokens[i % len(self.tokens)]}"}
+
+    def flow_register(self) -> dict:
+        url = reverse("register-list")
+        return self.run(
+            self.count,
+            lambda client, i: client.post(
+                url,
+                {
+                    "username": f"{self.prefix}_new_{i}",
+                    "email": f"{self.prefix}_new_{i}@bench.invalid",
+                    "password": PASSWORD,
+                    "password2": PASSWORD,
+                    "first_name": "Bench",
+                    "last_name": "Mark",
+                },
+                format="json",
+            ),
+        )
+
+    def flow_login(self) -> dict:
+        url = reverse("login")
+        return self.run(
+            self.count,
+            lambda client, i: client.post(
+                url, {"username": self.users[i % len(self.users)].username, "password": PASSWORD}, format="json"
+            ),
+        )
+
+    def flow_wallet_connect(self) -> dict:
+        """
+        Connects wallets of fresh users, so every request creates one
+        """
+        password = make_password(PASSWORD)
+        users = CustomUser.objects.bulk_create(
+            [
+                CustomUser(
+                    username=f"{self.prefix}_connect_{i}",
+                    email=f"{self.prefix}_connect_{i}@bench.invalid",
+                    password=password,
+                    user_own_invite_code=f"ac{self.run_id % 100_000}-{i}",
+                )
+                for i in range(self.count)
+            ]
+        )
+        tokens = [CustomObtainToken.objects.create(user=user).key for user in users]
+        url = reverse("connect_wallet")
+        return self.run(self.count, lambda client, i: client.post(url, HTTP_AUTHORIZATION=f"Token {tokens[i]}"))
+
+    def flow_transfer(self) -> dict:
+        url = reverse("wallet_to_wallet_transaction")
+        users = len(self.wallets)
+
+        def send(client, i):
+            # The amount varies so that repeated pairs are not rejected by the duplicate check
+            payload = {"wallet_addr_to": self.wallets[(i + 1) % users].address, "amount": f"{20 + i / 100:.2f}"}
+            return client.post(url, payload, format="json", **self.auth(i))
+
+        return self.run(self.count, send)
+
+    def flow_history(self) -> dict:
+        url = reverse("transactions_history-list")
+        pages = max(1, len(self.users))
+        return self.run(self.count, lambda client, i: client.get(url, {"page": 1 + i // pages % 5}, **self.auth(i)))
+
+    def flow_market(self) -> dict:
+        url = reverse("market-list")
+        pages = max(1, len(self.products) // 25)
+        return self.run(self.count, lambda client, i: client.get(url, {"page": 1 + i % pages}))
+
+    def flow_buy_nft(self) -> dict:
+        url = reverse("buy-nft")
+        count = min(self.count, len(self.products))
+        # Product i belongs to user i, so user i + 1 buys it
+        return self.run(
+            count,
+            lambda client, i: client.post(url, {"name": self.products[i].name}, format="json", **self.auth(i + 1)),
+        )
+
+    def flow_webhook_refill(self) -> dict:
+        url = reverse("payment_webhook")
+        return self.run(
+            self.count,
+            lambda client, i: client.post(
+                url,
+                {
+                    "user_id": self.users[i % len(self.users)].pk,
+                    "status": "success",
+                    "amount": 10_000,
+                    "transactionId": f"{self.prefix}_{i}",
+                    "invoiceId": f"{self.prefix}_invoice_{i}",
+                },
+                format="json",
+            ),
+        )
@@ -0,0 +1,86 @@
+import threading
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from core.benchmarks import add_benchmark_arguments, benchmark_database
+from storeapi.models import Product
+from storeapi.purchases import PurchaseError, purchase_product
+from usersapi.models import CustomUser
+from wallet.ledger import post_credit
+from wallet.models import LedgerEntry, Wallet
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures NFT purchases per second with several buyer threads. With --contention every product is "
+        "raced by all threads, and exactly one buyer per product must win. Runs against a throwaway test database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=2000)
+        parser.add_argument("--threads", type=int, default=8)
+        parser.add_argument("--contention", action="store_true")
+        add_benchmark_arguments(parser)
+
+    def handle(self, *args, **options):
+        with benchmark_database(options):
+            self.benchmark(options)
+
+    def benchmark(self, options):
+        run_id = int(time.time())
+        threads = options["threads"]
+        seller = CustomUser.objects.create(username=f"purchase_bench_{run_id}", user_own_invite_code=f"pb{run_id}")
+        buyers = [
+            CustomUser.objects.create(username=f"purchase_bench_{run_id}_{i}", user_own_invite_code=f"pb{run_id}{i}")
+            for i in range(threads)
+        ]
+        wallets = Wallet.objects.bulk_create(
+            [Wallet(user=user, address=Wallet.generate_key()) for user in [seller] + buyers]
+        )
+        for wallet in wallets[1:]:
+            post_credit(LedgerEntry.Kind.REFILL, LedgerEntry.Account.PAYMENTS, wallet, Decimal("1e9"))
+        names = [f"purchase-bench-{run_id}-{i}" for i in range(options["products"])]
+        Product.objects.bulk_create(
+            [Product(name=name, description="benchmark", owner=seller, price=Decimal("1.00")) for name in names]
+        )
+
+        elapsed, bought, rejected = self.race(seller, buyers, names, options["contention"])
+        self.stdout.write(
+            f"{bought} purchases, {rejected} rejected in {elapsed:.2f}s  {bought / elapsed:.1f} purchases/s"
+        )
+        self.verify(seller, buyers, names, bought)
+
+    @staticmethod
+    def race(seller, buyers, names, contention):
+        bought, rejected = [], []
+
+        def buy(thread_number):
+            buyer = buyers[thread_number]
+            chunk = names if contention else names[thread_number :: len(buyers)]
+            try:
+                for name in chunk:
+                    try:
+                        purchase_product(buyer, name, expected_owner=seller.username)
+                        bought.append(name)
+                    except PurchaseError:
+                        rejected.append(name)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=buy, args=(i,)) for i in range(len(buyers))]
+        started = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        return time.perf_counter() - started, len(bought), len(rejected)
+
+    def verify(self, seller, buyers, names, bought):
+        sold = Product.objects.filter(name__in=names).exclude(owner=seller).count()
+        seller_balance = Wallet.objects.get(user=seller).wallet_balance
+        if bought != len(names) or sold != len(names) or seller_balance != Decimal(len(names)):
+            raise CommandError(f"{bought} purchases, {sold} products sold, seller balance {seller_balance}")
+        self.stdout.write(self.style.SUCCESS("Every product was sold exactly once"))
@@ -0,0 +1,83 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import RequestFactory
+from rest_framework.request import Request
+
+from core.benchmarks import add_benchmark_arguments, benchmark_database
+from storeapi.filters import ProductFilter, ProductSearchFilter
+from storeapi.models import Product
+from storeapi.paginations import ProductPagination
+from usersapi.models import CustomUser
+
+WORDS = [
+    "dragon", "fox", "ocean", "forest", "pixel", "neon", "golden", "shadow", "crystal", "storm",
+    "robot", "samurai", "galaxy", "desert", "lotus", "tiger", "cyber", "ancient", "frozen", "ember",
+]  # fmt: skip
+
+QUERIES = [
+    {"search": "dragon"},
+    {"search": "golden tiger"},
+    {"search": '"neon samurai"'},
+    {"min_price": "100", "max_price": "150"},
+    {"for_sale": "true", "min_price": "10", "max_price": "12"},
+    {"search": "crystal", "for_sale": "true", "max_price": "50"},
+]
+
+
+class Command(BaseCommand):
+    help = "Measures market search and facet filtering on a seeded catalog. " "Runs against a throwaway test database."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=1_000_000)
+        parser.add_argument("--repeat", type=int, default=5)
+        add_benchmark_arguments(parser)
+
+    def handle(self, *args, **options):
+        with benchmark_database(options):
+            self.benchmark(options)
+
+    def benchmark(self, options):
+        owner = CustomUser.objects.create(username="benchmark_creator", user_own_invite_code="bench-creator")
+        self.seed(owner, options["products"])
+
+        for params in QUERIES:
+            timings = []
+            for _ in range(options["repeat"]):
+                started = time.perf_counter()
+                count, page = self.search(params)
+                timings.append(time.perf_counter() - started)
+            self.stdout.write(f"{statistics.median(timings) * 1000:9.2f} ms  {count:>8} hits  {params}")
+
+    def seed(self, owner, products):
+        table = Product._meta.db_table
+        words = "ARRAY[" + ", ".join(f"'{word}'" for word in WORDS) + "]"
+        self.stdout.write(f"Seeding {products} products...")
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                INSERT INTO {table} (image, name, description, owner_id, price, release_data, for_sale)
+                SELECT
+                    '',
+                    initcap(({words})[1 + i %% 20] || ' ' || ({words})[1 + (i / 20) %% 20]) || ' #' || i,
+                    'A ' || ({words})[1 + (i / 400) %% 20] || ' ' || ({words})[1 + (i * 7) %% 20] || ' artwork',
+                    %s,
+                    1 + (i * 37) %% 50000 / 100.0,
+                    now(),
+                    i %% 3 <> 0
+                FROM generate_series(1, %s) AS i
+                """,
+                [owner.pk, products],
+            )
+            cursor.execute(f"ANALYZE {table}")
+
+    @staticmethod
+    def search(params):
+        request = Request(RequestFactory().get("/", params))
+        queryset = Product.objects.select_related("owner").defer("search_vector").order_by("release_data", "id")
+        queryset = ProductFilter(request.query_params, queryset=queryset, request=request).qs
+        queryset = ProductSearchFilter().filter_queryset(request, queryset, None)
+        page = list(queryset[: ProductPagination.page_size])
+        return queryset.count(), page
@@ -0,0 +1,36 @@
+# Generated by Django 5.1 on 2026-10-17 21:55
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def rename_duplicate_names(apps, schema_editor):
+    """
+    Names were not unique in the database before this migration. The oldest product keeps its name,
+    later ones get their id appended.
+    """
+    Product = apps.get_model("storeapi", "Product")
+    duplicates = Product.objects.values("name").annotate(count=Count("id")).filter(count__gt=1)
+    for name in duplicates.values_list("name", flat=True):
+        for pk in Product.objects.filter(name=name).order_by("id").values_list("id", flat=True)[1:]:
+            suffix = f" #{pk}"
+            Product.objects.filter(pk=pk).update(name=name[: 127 - len(suffix)] + suffix)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("storeapi", "0004_product_search"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(rename_duplicate_names, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="product",
+            constraint=models.UniqueConstraint(
+                fields=("name",), name="product_name_unique"
+            ),
+        ),
+    ]
@@ -0,0 +1,95 @@
+from django.db import connection, transaction
+
+from storeapi.models import Product
+from storeapi.serializers import ProductBulkItemSerializer
+
+BULK_CREATE_BATCH_SIZE = 500
+
+# Names are locked by bucket, so a batch of any size takes at most NAME_LOCK_BUCKETS advisory locks.
+# The buckets are taken in order so that two batches cannot deadlock.
+# NAME_LOCK_SPACE is the first key of the two-key advisory locks, keeping them apart from other lock users.
+NAME_LOCK_SPACE = 20_001
+NAME_LOCK_BUCKETS = 16
+LOCK_NAMES_SQL = """
+    SELECT pg_advisory_xact_lock(%(space)s, bucket) FROM (
+        SELECT DISTINCT abs(hashtext(name) %% %(buckets)s) AS bucket
+        FROM unnest(%(names)s::text[]) AS name
+        ORDER BY bucket
+    ) AS buckets
+"""
+
+
+def mint_products(owner, items: list, files=None) -> tuple[list[tuple[int, Product]], list[dict]]:
+    """
+    Validates and creates a batch of products for the owner.
+    Items are validated one by one without touching the database, then names are checked against the
+    catalog with a single query and the valid products are inserted with bulk_create.
+    The names are locked for the check and the insert, so a concurrent mint of one of them waits
+    and then reports the name as taken for its item.
+    An item's "image" names the uploaded file it uses; the file is streamed to storage on insert
+    and deleted again when the insert fails.
+    Returns the created products with their item index and the errors of the rejected items.
+    """
+    files = files or {}
+    valid, errors = [], []
+    seen_names = set()
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            errors.append({"index": index, "errors": {"non_field_errors": ["Expected an object."]}})
+            continue
+
+        item = dict(item)
+        image_field = item.get("image")
+        if image_field:
+            if image_field not in files:
+                errors.append({"index": index, "errors": {"image": [f"No file uploaded as '{image_field}'."]}})
+                continue
+            item["image"] = files[image_field]
+
+        serializer = ProductBulkItemSerializer(data=item)
+        if not serializer.is_valid():
+            errors.append({"index": index, "errors": serializer.errors})
+            continue
+
+        name = serializer.validated_data["name"]
+        if name in seen_names:
+            errors.append({"index": index, "errors": {"name": ["Duplicate name in this batch."]}})
+            continue
+        seen_names.add(name)
+        valid.append((index, serializer.validated_data))
+
+    with transaction.atomic():
+        taken = lock_names(seen_names)
+        products = []
+        for index, data in valid:
+            if data["name"] in taken:
+                errors.append({"index": index, "errors": {"name": ["product with this name already exists."]}})
+            else:
+                products.append((index, Product(owner=owner, **data)))
+
+        try:
+            Product.objects.bulk_create([product for _, product in products], batch_size=BULK_CREATE_BATCH_SIZE)
+        except Exception:
+            delete_images([product for _, product in products])
+            raise
+
+    errors.sort(key=lambda error: error["index"])
+    return products, errors
+
+
+def lock_names(names: set[str]) -> set[str]:
+    """
+    Locks the names until the end of the transaction and returns those already in the catalog.
+    Every way of creating a product takes these locks before checking its name.
+    """
+    if not names:
+        return set()
+    with connection.cursor() as cursor:
+        cursor.execute(LOCK_NAMES_SQL, {"space": NAME_LOCK_SPACE, "buckets": NAME_LOCK_BUCKETS, "names": list(names)})
+    return set(Product.objects.filter(name__in=names).values_list("name", flat=True))
+
+
+def delete_images(products: list[Product]) -> None:
+    for product in products:
+        if product.image:
+            product.image.delete(save=False)
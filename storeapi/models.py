@@ -1,3 +1,5 @@
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
 from django.db import models
 
 from core import settings
@@ -11,3 +13,17 @@ class Product(models.Model):
     price = models.DecimalField(max_digits=12, decimal_places=2)
     release_data = models.DateTimeField(auto_now=True)
     for_sale = models.BooleanField(default=True)
+    search_vector = models.GeneratedField(
+        expression=SearchVector("name", weight="A", config="english")
+        + SearchVector("description", weight="B", config="english"),
+        output_field=SearchVectorField(),
+        db_persist=True,
+    )
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=["search_vector"], name="product_search_vector_idx"),
+            models.Index(fields=["for_sale", "price"], name="product_for_sale_price_idx"),
+            models.Index(fields=["price"], name="product_price_idx"),
+        ]
+        constraints = [models.UniqueConstraint(fields=["name"], name="product_name_unique")]
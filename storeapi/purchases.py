@@ -0,0 +1,76 @@
+from decimal import Decimal
+
+from django.db import transaction
+
+from storeapi.models import Product
+from usersapi.models import UserNFTBackpack
+from wallet.models import LedgerEntry, WalletToWalletTransaction
+from wallet.shards import available_balance
+from wallet.transfers import TransferError, lock_user_wallets, move_funds
+
+
+class PurchaseError(Exception):
+    pass
+
+
+class ProductNotFoundError(PurchaseError):
+    pass
+
+
+def purchase_product(
+    buyer, product_name: str, expected_owner: str | None = None, expected_price: Decimal | None = None
+) -> tuple[Product, WalletToWalletTransaction, Decimal]:
+    """
+    Buys the product for its listed price in one transaction.
+    The buyer agrees to the owner and price they saw on the market, read from the unlocked row when not given.
+    The product row is locked first and both wallets after it, so concurrent buyers of the same product
+    queue up and every one after the first finds a new owner and is rejected.
+    Returns the product, the payment record and the buyer's new balance.
+    """
+    if expected_owner is None or expected_price is None:
+        listing = Product.objects.filter(name=product_name).values("owner__username", "price").first()
+        if listing is None:
+            raise ProductNotFoundError("No Product matches the given query.")
+        expected_owner = listing["owner__username"] if expected_owner is None else expected_owner
+        expected_price = listing["price"] if expected_price is None else expected_price
+
+    with transaction.atomic():
+        try:
+            product = (
+                Product.objects.select_for_update(of=("self",))
+                .select_related("owner")
+                .defer("search_vector")
+                .get(name=product_name)
+            )
+        except Product.DoesNotExist:
+            raise ProductNotFoundError("No Product matches the given query.")
+
+        seller = product.owner
+        if seller.pk == buyer.pk:
+            raise PurchaseError("You cannot buy your own product.")
+        if not product.for_sale:
+            raise PurchaseError("This product is not for sale.")
+        if seller.username != expected_owner:
+            raise PurchaseError("This product has already been sold to another user.")
+        if product.price != expected_price:
+            raise PurchaseError("The price of this product has changed.")
+
+        wallets = lock_user_wallets(buyer.pk, seller.pk, credited=(seller.pk,))
+        if buyer.pk not in wallets:
+            raise PurchaseError("To make Wallet-To-Wallet transaction you need to create a wallet")
+        if seller.pk not in wallets:
+            raise PurchaseError("The product owner has not connected the wallet ")
+
+        try:
+            payment = move_funds(
+                buyer, seller, wallets[buyer.pk], wallets[seller.pk], product.price, LedgerEntry.Kind.PURCHASE
+            )
+        except TransferError as e:
+            raise PurchaseError(str(e))
+
+        UserNFTBackpack.objects.update_or_create(products=product, defaults={"user": buyer})
+        product.owner = buyer
+        product.save(update_fields=["owner", "release_data"])
+        balance = available_balance(wallets[buyer.pk])
+
+    return product, payment, balance
@@ -1,5 +1,3 @@
-from datetime import datetime
-
 from rest_framework import serializers
 from rest_framework.validators import UniqueValidator
 
@@ -26,11 +24,28 @@ class ProductSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         user = self.context["owner"]
-        print(user)
         product = Product.objects.create(owner=user, **validated_data)
         return product
 
 
+class ProductBulkItemSerializer(ProductSerializer):
+    """
+    One item of a bulk mint. Name uniqueness is checked for the whole batch at once by mint_products.
+    """
+
+    name = serializers.CharField(required=True, max_length=127)
+
+
+class BuyNFTSerializer(serializers.Serializer):
+    """
+    The owner and price are the ones the buyer saw on the market, the purchase is rejected when either changed
+    """
+
+    name = serializers.CharField(max_length=127)
+    owner = serializers.CharField(required=False)
+    price = serializers.DecimalField(max_digits=12, decimal_places=2, required=False)
+
+
 class ProductListSerializer(serializers.ModelSerializer):
     owner = serializers.CharField(source="owner.username", read_only=True)
 
@@ -40,9 +55,6 @@ class ProductListSerializer(serializers.ModelSerializer):
 
     def to_representation(self, instance):
         ret = super().to_representation(instance)
-        release_data = ret["release_data"]
-        datetime_obj = datetime.strptime(release_data, "%Y-%m-%dT%H:%M:%S.%fZ")
-        formatted_release_data = datetime_obj.strftime("%Y-%m-%d")
-        ret["release_data"] = formatted_release_data
+        ret["release_data"] = instance.release_data.strftime("%Y-%m-%d")
 
         return ret
@@ -1,3 +1,403 @@
-from django.test import TestCase
+import io
+import json
+import os
+import tempfile
+import threading
+from decimal import Decimal
+from unittest.mock import patch
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, connection, transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from PIL import Image
+from rest_framework.test import APIClient
+
+from core.error_handlers import RouteIndex, suggestion_cache
+from core.metrics import registry
+from storeapi.management.commands.benchmark_api import compare, summarize
+from storeapi.minting import NAME_LOCK_BUCKETS, lock_names, mint_products
+from storeapi.models import Product
+from storeapi.purchases import PurchaseError, purchase_product
+from usersapi.models import CustomObtainToken, CustomUser, UserNFTBackpack
+from wallet.models import Wallet, WalletToWalletTransaction
+
+LOCMEM_CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ProductListTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = CustomUser.objects.create_user(username="creator", password="password")
+        for i in range(3):
+            Product.objects.create(name=f"nft-{i}", description="art", owner=self.owner, price=Decimal("10.00"))
+        self.client = APIClient()
+
+    def test_listing_is_served_from_cache(self):
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse("market-list"))
+        self.assertEqual(response.data["count"], 3)
+        self.assertEqual(response.data["results"][0]["owner"], "creator")
+
+        with self.assertNumQueries(0):
+            self.client.get(reverse("market-list"))
+
+    def test_created_product_invalidates_listing(self):
+        self.client.get(reverse("market-list"))
+
+        token = CustomObtainToken.objects.create(user=self.owner, user_agent="tests")
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+        response = self.client.post(
+            reverse("create-nft-list"), {"name": "nft-new", "description": "art", "price": "5.00"}
+        )
+        self.assertEqual(response.status_code, 201)
+
+        response = self.client.get(reverse("market-list"))
+        self.assertEqual(response.data["count"], 4)
+
+    def test_owner_username_change_invalidates_listing(self):
+        self.client.get(reverse("market-list"))
+
+        token = CustomObtainToken.objects.create(user=self.owner, user_agent="tests")
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(
+                reverse("edit_user_data-detail", kwargs={"pk": self.owner.pk}), {"username": "renamed"}
+            )
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.get(reverse("market-list"))
+        self.assertEqual(response.data["results"][0]["owner"], "renamed")
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ProductSearchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        owner = CustomUser.objects.create_user(username="creator", password="password")
+        Product.objects.create(name="Blue dragon", description="A calm sea", owner=owner, price=Decimal("50.00"))
+        Product.objects.create(name="Red fox", description="A dragon hiding", owner=owner, price=Decimal("15.00"))
+        Product.objects.create(
+            name="Green tree", description="Forest", owner=owner, price=Decimal("30.00"), for_sale=False
+        )
+        self.client = APIClient()
+
+    def names(self, **params):
+        response = self.client.get(reverse("market-list"), params)
+        return [product["name"] for product in response.data["results"]]
+
+    def test_search_ranks_name_matches_first(self):
+        self.assertEqual(self.names(search="dragons"), ["Blue dragon", "Red fox"])
+
+    def test_price_range_and_for_sale_facets(self):
+        self.assertEqual(self.names(min_price="20", max_price="60"), ["Blue dragon", "Green tree"])
+        self.assertEqual(self.names(min_price="20", for_sale="false"), ["Green tree"])
+
+
+class NotFoundHandlerTests(TestCase):
+    def setUp(self):
+        suggestion_cache.clear()
+
+    def test_suggests_the_closest_route(self):
+        response = self.client.get("/api/market/by-nft/")
+
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json()["error"], "Page not found. Maybe you meant: '/api/market/buy-nft/'?")
+
+    def test_repeated_path_is_served_from_cache(self):
+        first = self.client.get("/wp-login.php")
+
+        with patch.object(RouteIndex, "closest") as closest:
+            response = self.client.get("/wp-login.php")
+
+        closest.assert_not_called()
+        self.assertEqual(response.json(), first.json())
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class PurchaseTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.seller = CustomUser.objects.create_user(username="seller", password="password")
+        self.buyer = CustomUser.objects.create_user(username="buyer", password="password")
+        Wallet.objects.create(user=self.seller, wallet_balance=Decimal("0.00"))
+        self.buyer_wallet = Wallet.objects.create(user=self.buyer, wallet_balance=Decimal("100.00"))
+        self.product = Product.objects.create(name="nft", description="art", owner=self.seller, price=Decimal("40"))
+        self.client = APIClient()
+        self.client.force_authenticate(self.buyer)
+
+    def test_purchase_moves_funds_and_ownership(self):
+        response = self.client.post(reverse("buy-nft"), {"name": "nft"}, format="json")
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data["Your balance"], Decimal("60.00"))
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.owner, self.buyer)
+        self.assertTrue(self.product.for_sale)
+        self.assertTrue(UserNFTBackpack.objects.filter(user=self.buyer, products=self.product).exists())
+        self.assertEqual(Wallet.objects.get(user=self.seller).wallet_balance, Decimal("40.00"))
+
+    def test_stale_listing_cannot_be_bought(self):
+        self.client.post(reverse("buy-nft"), {"name": "nft"}, format="json")
+        other = CustomUser.objects.create_user(username="other", password="password")
+        Wallet.objects.create(user=other, wallet_balance=Decimal("100.00"))
+        self.client.force_authenticate(other)
+
+        response = self.client.post(reverse("buy-nft"), {"name": "nft", "owner": "seller"}, format="json")
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(reverse("buy-nft"), {"name": "nft", "price": "30.00"}, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(WalletToWalletTransaction.objects.count(), 1)
+
+    def test_bought_product_can_be_resold(self):
+        self.client.post(reverse("buy-nft"), {"name": "nft"}, format="json")
+        other = CustomUser.objects.create_user(username="other", password="password")
+        Wallet.objects.create(user=other, wallet_balance=Decimal("100.00"))
+        self.client.force_authenticate(other)
+
+        response = self.client.post(
+            reverse("buy-nft"), {"name": "nft", "owner": "buyer", "price": "40.00"}, format="json"
+        )
+
+        self.assertEqual(response.status_code, 201)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.owner, other)
+        self.assertEqual(Wallet.objects.get(user=self.buyer).wallet_balance, Decimal("100.00"))
+
+    def test_insufficient_funds_changes_nothing(self):
+        Wallet.objects.filter(pk=self.buyer_wallet.pk).update(wallet_balance=Decimal("10.00"))
+
+        response = self.client.post(reverse("buy-nft"), {"name": "nft"}, format="json")
+
+        self.assertEqual(response.status_code, 400)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.owner, self.seller)
+        self.assertFalse(UserNFTBackpack.objects.exists())
+
+
+class ConcurrentPurchaseTests(TransactionTestCase):
+    buyer_count = 8
+
+    def setUp(self):
+        self.seller = CustomUser.objects.create_user(username="seller", password="password")
+        Wallet.objects.create(user=self.seller, wallet_balance=Decimal("0.00"))
+        self.product = Product.objects.create(name="nft", description="art", owner=self.seller, price=Decimal("40"))
+        self.buyers = []
+        for i in range(self.buyer_count):
+            buyer = CustomUser.objects.create_user(username=f"buyer{i}", password="password")
+            Wallet.objects.create(user=buyer, wallet_balance=Decimal("100.00"))
+            self.buyers.append(buyer)
+
+    def test_only_one_concurrent_buyer_gets_the_product(self):
+        bought, rejected = [], []
+        barrier = threading.Barrier(len(self.buyers))
+
+        def buy(buyer):
+            try:
+                barrier.wait()
+                purchase_product(buyer, "nft", expected_owner="seller")
+                bought.append(buyer)
+            except PurchaseError:
+                rejected.append(buyer)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=buy, args=(buyer,)) for buyer in self.buyers]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        self.assertEqual(len(bought), 1)
+        self.assertEqual(len(rejected), len(self.buyers) - 1)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.owner, bought[0])
+        self.assertEqual(UserNFTBackpack.objects.get(products=self.product).user, bought[0])
+        self.assertEqual(WalletToWalletTransaction.objects.count(), 1)
+        self.assertEqual(sum(Wallet.objects.values_list("wallet_balance", flat=True)), Decimal("800.00"))
+        self.assertEqual(Wallet.objects.get(user=self.seller).wallet_balance, Decimal("40.00"))
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class BulkMintTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.creator = CustomUser.objects.create_user(username="creator", password="password")
+        Product.objects.create(name="taken", description="art", owner=self.creator, price=Decimal("1"))
+        self.client = APIClient()
+        self.client.force_authenticate(self.creator)
+
+    def test_reports_item_errors_without_failing_the_batch(self):
+        items = [
+            {"name": "first", "description": "art", "price": "10"},
+            {"name": "taken", "description": "art", "price": "10"},
+            {"name": "first", "description": "art", "price": "10"},
+            {"name": "free", "description": "art", "price": "0"},
+            {"name": "second", "description": "art", "price": "5"},
+        ]
+
+        response = self.client.post(reverse("create-nft-bulk"), {"items": items}, format="json")
+
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual([item["name"] for item in response.data["created"]], ["first", "second"])
+        self.assertEqual([error["index"] for error in response.data["errors"]], [1, 2, 3])
+        self.assertEqual(Product.objects.filter(owner=self.creator).count(), 3)
+
+    def test_query_count_does_not_grow_with_the_batch(self):
+        items = [{"name": f"nft-{i}", "description": "art", "price": "10"} for i in range(200)]
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse("create-nft-bulk"), {"items": items}, format="json")
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data["created"]), 200)
+        self.assertLessEqual(len([q for q in queries if q["sql"].startswith(("SELECT", "INSERT"))]), 2)
+
+    def test_images_are_uploaded_with_multipart(self):
+        image = io.BytesIO()
+        Image.new("RGB", (1, 1)).save(image, "PNG")
+        upload = SimpleUploadedFile("cover.png", image.getvalue(), content_type="image/png")
+        items = [{"name": "with-image", "description": "art", "price": "10", "image": "cover"}]
+
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            response = self.client.post(
+                reverse("create-nft-bulk"), {"items": json.dumps(items), "cover": upload}, format="multipart"
+            )
+            product = Product.objects.get(name="with-image")
+            self.assertTrue(product.image.storage.exists(product.image.name))
+
+        self.assertEqual(response.status_code, 201)
+
+    def test_images_are_deleted_when_the_insert_fails(self):
+        image = io.BytesIO()
+        Image.new("RGB", (1, 1)).save(image, "PNG")
+        upload = SimpleUploadedFile("cover.png", image.getvalue(), content_type="image/png")
+        items = [{"name": "with-image", "description": "art", "price": "10", "image": "cover"}]
+        original_bulk_create = Product.objects.bulk_create
+
+        def bulk_create(*args, **kwargs):
+            original_bulk_create(*args, **kwargs)
+            raise DatabaseError("connection lost")
+
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            with patch.object(Product.objects, "bulk_create", side_effect=bulk_create):
+                with self.assertRaises(DatabaseError):
+                    mint_products(self.creator, items, {"cover": upload})
+            self.assertEqual(os.listdir(os.path.join(media_root, "products_images")), [])
+
+        self.assertFalse(Product.objects.filter(name="with-image").exists())
+
+    def test_single_create_checks_the_name_under_the_mint_lock(self):
+        # As if the product was minted between the serializer's check and the insert
+        with patch("rest_framework.validators.UniqueValidator.__call__"):
+            response = self.client.post(
+                reverse("create-nft-list"), {"name": "taken", "description": "art", "price": "10"}, format="json"
+            )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Product.objects.filter(name="taken").count(), 1)
+
+    def test_large_batch_takes_a_bounded_number_of_locks(self):
+        with transaction.atomic():
+            lock_names({f"nft-{i}" for i in range(5000)})
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT count(*) FROM pg_locks WHERE locktype = 'advisory' AND pid = pg_backend_pid()")
+                locks = cursor.fetchone()[0]
+
+        self.assertLessEqual(locks, NAME_LOCK_BUCKETS)
+
+
+class ConcurrentMintTests(TransactionTestCase):
+    def test_concurrent_batches_mint_a_name_once(self):
+        creators = [CustomUser.objects.create_user(username=f"creator{i}", password="password") for i in range(4)]
+        results = []
+        barrier = threading.Barrier(len(creators))
+
+        def mint(creator):
+            try:
+                barrier.wait()
+                results.append(mint_products(creator, [{"name": "shared", "description": "art", "price": "10"}]))
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=mint, args=(creator,)) for creator in creators]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        self.assertEqual(Product.objects.filter(name="shared").count(), 1)
+        self.assertEqual(sorted(len(created) for created, _ in results), [0, 0, 0, 1])
+        self.assertEqual(sorted(len(errors) for _, errors in results), [0, 1, 1, 1])
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class MetricsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        registry.reset()
+        owner = CustomUser.objects.create_user(username="creator", password="password")
+        Product.objects.create(name="nft", description="art", owner=owner, price=Decimal("10.00"))
+
+    def test_requests_are_recorded_per_view(self):
+        self.client.get(reverse("market-list"))
+        self.client.get(reverse("market-list"))
+        self.client.get("/api/no-such-page/")
+
+        self.assertEqual(registry.requests.value(("market-list", "GET", "200")), 2)
+        self.assertEqual(registry.requests.value(("<unresolved>", "GET", "404")), 1)
+        self.assertEqual(registry.latency.count(("market-list", "GET")), 2)
+        self.assertEqual(registry.cache.value(("market-list", "miss")), 1)
+        self.assertEqual(registry.cache.value(("market-list", "hit")), 1)
+        body = self.client.get("/metrics").content.decode()
+        worker = f'worker="{os.getpid()}"'
+        self.assertIn(f'http_requests_total{{view="market-list",method="GET",status="200",{worker}}} 2', body)
+        # The miss runs the count and the page query, the hit none
+        self.assertIn(f'http_request_db_queries_bucket{{view="market-list",{worker},le="0"}} 1', body)
+        self.assertIn(f'http_request_db_queries_bucket{{view="market-list",{worker},le="2"}} 2', body)
+        self.assertIn(f'http_request_duration_seconds_count{{view="market-list",method="GET",{worker}}} 2', body)
+        self.assertIn(f'response_cache_requests_total{{view="market-list",result="hit",{worker}}} 1', body)
+
+    @override_settings(METRICS_TOKEN="scrape-secret")
+    def test_metrics_are_served_to_allowed_addresses_and_the_token_only(self):
+        self.assertEqual(self.client.get("/metrics", REMOTE_ADDR="10.0.0.7").status_code, 403)
+        self.assertEqual(
+            self.client.get("/metrics", REMOTE_ADDR="10.0.0.7", HTTP_AUTHORIZATION="Bearer wrong").status_code, 403
+        )
+        response = self.client.get("/metrics", REMOTE_ADDR="10.0.0.7", HTTP_AUTHORIZATION="Bearer scrape-secret")
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(METRICS_ENABLED=False)
+    def test_disabled_metrics_record_nothing(self):
+        self.client.get(reverse("market-list"))
+
+        self.assertEqual(self.client.get("/metrics").status_code, 404)
+        self.assertEqual(registry.requests.value(("market-list", "GET", "200")), 0)
+
+
+class BenchmarkReportTests(SimpleTestCase):
+    def test_summary_uses_nearest_rank_percentiles(self):
+        stats = summarize([i / 1000 for i in range(100, 0, -1)], errors=2, elapsed=2.0)
+
+        self.assertEqual(stats["requests"], 100)
+        self.assertEqual(stats["errors"], 2)
+        self.assertEqual(stats["rps"], 50.0)
+        self.assertEqual((stats["p50_ms"], stats["p95_ms"], stats["p99_ms"]), (50.0, 95.0, 99.0))
+
+    def test_only_p95_growth_past_the_threshold_is_a_regression(self):
+        baseline = {"endpoints": {"login": {"p95_ms": 10.0}, "market": {"p95_ms": 10.0}}}
+        report = {"endpoints": {"login": {"p95_ms": 12.0}, "market": {"p95_ms": 13.0}, "history": {"p95_ms": 50.0}}}
+
+        self.assertEqual(compare(report, baseline, 0.25), ["market: p95 10.0ms -> 13.0ms"])
+
+    @override_settings(DEBUG=False)
+    def test_refuses_to_run_outside_debug_without_confirmation(self):
+        with patch("core.benchmarks.setup_databases") as setup_databases:
+            with self.assertRaisesMessage(CommandError, "--i-know-this-is-not-prod"):
+                call_command("benchmark_api")
+
+        setup_databases.assert_not_called()
@@ -1,98 +1,126 @@
+import json
 import logging
-import time
 
-from django.shortcuts import get_object_or_404
-from django.utils.decorators import method_decorator
-from django.views.decorators.cache import cache_page
+from django.conf import settings
+from django.db import transaction
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework import filters, status
+from rest_framework import status
 from rest_framework import permissions, generics
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.viewsets import GenericViewSet
 
 from core import permissions as custom_permissions
+from storeapi.cache import bump_market_cache_version, cache_market_page
+from storeapi.filters import ProductFilter, ProductSearchFilter
+from storeapi.minting import lock_names, mint_products
 from storeapi.models import Product
 from storeapi.paginations import ProductPagination
-from storeapi.serializers import ProductSerializer, ProductListSerializer
-from usersapi.models import CustomObtainToken, UserNFTBackpack
-from wallet.mixins import WalletTransactionMixin
+from storeapi.purchases import ProductNotFoundError, PurchaseError, purchase_product
+from storeapi.serializers import BuyNFTSerializer, ProductSerializer, ProductListSerializer
+from wallet.cache import bump_wallet_cache_version
 
 
 class CreateProductView(generics.CreateAPIView, GenericViewSet):
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
     permission_classes = [permissions.IsAuthenticated]
+    logger = logging.getLogger()
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
-        header_auth = self.request.headers.get("Authorization")
-        header_token = header_auth.split(" ")[1]
-        user = CustomObtainToken.objects.get(key=header_token).user
+        context["owner"] = self.request.user
+        return context
+
+    def perform_create(self, serializer):
+        # The name check of the serializer ran without a lock, it is repeated under the lock mint_products takes
+        with transaction.atomic():
+            if lock_names({serializer.validated_data["name"]}):
+                raise ValidationError({"name": ["product with this name already exists."]})
+            super().perform_create(serializer)
+        bump_market_cache_version()
+
+    @action(detail=False, methods=["post"], url_path="bulk")
+    def bulk(self, request):
+        """
+        Mints a collection: {"items": [{"name", "description", "price", "image"}]}.
+        With multipart uploads "items" is a JSON string and an item's "image" is the name of its file field.
+        """
+        items = request.data.get("items")
+        if isinstance(items, str):
+            try:
+                items = json.loads(items)
+            except ValueError:
+                items = None
+        if not isinstance(items, list) or not items:
+            return Response({"error": "Provide a non-empty list of items."}, status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > settings.PRODUCT_BULK_MINT_MAX_ITEMS:
+            return Response(
+                {"error": f"At most {settings.PRODUCT_BULK_MINT_MAX_ITEMS} items can be minted at once."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
 
-        if user:
-            context["owner"] = user
+        products, errors = mint_products(request.user, items, request.FILES)
+        if products:
+            bump_market_cache_version()
+        self.logger.info(f"Minted {len(products)} of {len(items)} products for {request.user}")
 
-        return context
+        if not products:
+            response_status = status.HTTP_400_BAD_REQUEST
+        elif errors:
+            response_status = status.HTTP_207_MULTI_STATUS
+        else:
+            response_status = status.HTTP_201_CREATED
+        return Response(
+            {
+                "created": [{"index": index, "id": product.pk, "name": product.name} for index, product in products],
+                "errors": errors,
+            },
+            status=response_status,
+        )
 
 
 class ProductListView(generics.ListAPIView, GenericViewSet):
     serializer_class = ProductListSerializer
     permission_classes = [custom_permissions.ReadOnly]
     pagination_class = ProductPagination
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter]
-    filterset_fields = ["name", "price"]
+    filter_backends = [DjangoFilterBackend, ProductSearchFilter]
+    filterset_class = ProductFilter
 
     def get_queryset(self):
-        queryset = Product.objects.all().order_by("release_data")
+        queryset = Product.objects.select_related("owner").defer("search_vector").order_by("release_data", "id")
 
         return queryset
 
-    @method_decorator(cache_page(60 * 10))
+    @cache_market_page()
     def list(self, request, *args, **kwargs):
-        time.sleep(1)
         return super().list(request, *args, **kwargs)
 
 
-class BuyNFT(WalletTransactionMixin, APIView):
+class BuyNFT(APIView):
     permission_classes = [permissions.IsAuthenticated]
     logger = logging.getLogger()
 
     def post(self, request, *args, **kwargs):
-        request_user = request.user
-        product_instance = get_object_or_404(Product, name=request.data.get("name"))
-        wallet_from = self._get_wallet_from_user(request_user)
-        wallet_to = self._get_wallet_from_user(product_instance.owner)
-        validated_amount = self._validate_amount(product_instance.price)
-
-        if not wallet_from:
-            return self._error_response("To make Wallet-To-Wallet transaction you need to create a wallet")
-        if not wallet_to:
-            return self._error_response("The product owner has not connected the wallet ")
-        if product_instance.owner == request_user:
-            return self._error_response("You cannot buy your own product.")
-        if wallet_from.wallet_balance < validated_amount:
-            return self._error_response("Insufficient funds in wallet.")
-
-        self._check_transaction_duplicate(
-            request_user, product_instance.owner, wallet_from, wallet_to, validated_amount
-        )
-        self._perform_transaction(request_user, product_instance.owner, wallet_from, wallet_to, validated_amount)
-
-        user_backpack, created = UserNFTBackpack.objects.update_or_create(
-            products=product_instance, defaults={"user": request_user}
-        )
-        if created:
-            self.logger.info(f"New UserNFTBackpack created for user: {request_user}, product: {product_instance.name}")
-        else:
-            self.logger.info(
-                f"Updated existing UserNFTBackpack for user: {request_user}, product: {product_instance.name}"
+        serializer = BuyNFTSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        try:
+            product, payment, balance = purchase_product(
+                request.user, data["name"], expected_owner=data.get("owner"), expected_price=data.get("price")
             )
+        except ProductNotFoundError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_404_NOT_FOUND)
+        except PurchaseError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-        product_instance.owner = request_user
-        product_instance.save()
+        self.logger.info(f"User {request.user} bought {product.name} in transaction {payment.transaction_id}")
+        bump_wallet_cache_version(request.user.id, payment.user_to_id)
+        bump_market_cache_version()
 
         return Response(
-            {"message": "Transaction was successful", "Your balance": wallet_from.wallet_balance},
+            {"message": "Transaction was successful", "Your balance": balance},
             status=status.HTTP_201_CREATED,
         )
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class UsersapiConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "usersapi"
+
+    def ready(self):
+        from usersapi import signals  # noqa: F401
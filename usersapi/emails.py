@@ -0,0 +1,173 @@
+import logging
+import time
+from datetime import timedelta
+from functools import lru_cache
+
+from decouple import config
+from django.conf import settings
+from django.core.cache import cache
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.template import engines
+from django.template.loader import get_template
+from django.utils import timezone
+from django.utils.html import strip_tags
+
+from usersapi.models import OutgoingEmail
+
+logger = logging.getLogger()
+
+
+def enqueue_email(email: str, subject: str, template_name: str, context: dict) -> OutgoingEmail:
+    return OutgoingEmail.objects.create(email=email, subject=subject, template_name=template_name, context=context)
+
+
+EMAIL_TEMPLATES = [
+    "emails/W2WTransaction.html",
+    "emails/W2WBatchTransaction.html",
+    "emails/registration_email.html",
+    "emails/wallet_connection.html",
+]
+
+
+@lru_cache(maxsize=None)
+def get_email_templates(template_name: str):
+    """
+    Compiles the HTML template and its plain-text twin once per process.
+    The plain-text twin is the template source with the tags stripped,
+    so rendering it gives the same text as strip_tags on the rendered HTML.
+    """
+    html_template = get_template(template_name)
+    text_template = engines["django"].from_string(strip_tags(html_template.template.source))
+    return html_template, text_template
+
+
+def warm_email_templates() -> None:
+    for template_name in EMAIL_TEMPLATES:
+        get_email_templates(template_name)
+
+
+def render_email(template_name: str, context: dict) -> tuple[str, str]:
+    """
+    Returns the plain-text and HTML bodies of the email
+    """
+    html_template, text_template = get_email_templates(template_name)
+    return text_template.render(context), html_template.render(context)
+
+
+def build_message(outgoing: OutgoingEmail, connection) -> EmailMultiAlternatives:
+    plain_message, html_message = render_email(outgoing.template_name, outgoing.context)
+    message = EmailMultiAlternatives(
+        subject=outgoing.subject,
+        body=plain_message,
+        from_email=config("DEFAULT_FROM_EMAIL"),
+        to=[outgoing.email],
+        connection=connection,
+    )
+    message.attach_alternative(html_message, "text/html")
+    return message
+
+
+class RateLimiter:
+    """
+    Keeps all workers together under `rate` sends per second.
+    Every window has a counter in CACHES["default"]; a caller over the limit sleeps until the next window.
+    """
+
+    cache_key = "email_rate_limit"
+
+    def __init__(self, rate: float):
+        self.rate = rate
+
+    def wait(self) -> None:
+        if not self.rate:
+            return
+        window = max(1.0, 1 / self.rate)
+        limit = max(1, int(self.rate * window))
+        while True:
+            now = time.time()
+            slot = int(now // window)
+            key = f"{self.cache_key}:{slot}"
+            cache.add(key, 0, timeout=int(window) + 1)
+            try:
+                if cache.incr(key) <= limit:
+                    return
+            except ValueError:
+                # The window expired between add and incr
+                continue
+            time.sleep((slot + 1) * window - now)
+
+
+def flush_outbox(
+    batch_size: int = settings.EMAIL_BATCH_SIZE,
+    rate_limit: float = settings.EMAIL_RATE_LIMIT,
+    max_attempts: int = settings.EMAIL_MAX_ATTEMPTS,
+    retry_backoff: int = settings.EMAIL_RETRY_BACKOFF,
+    lease: int = settings.EMAIL_SEND_LEASE,
+) -> int:
+    """
+    Sends up to `batch_size` due emails over a single SMTP connection.
+    The batch is claimed in a short transaction, sent outside of it and the results are recorded in another one.
+    Rows of a worker that died mid-batch are claimed again once their `lease` runs out.
+    Failed messages are retried with exponential backoff until `max_attempts` is reached.
+    Returns the number of messages sent.
+    """
+    batch = claim_outbox_batch(batch_size, lease)
+    if not batch:
+        return 0
+
+    sent = 0
+    limiter = RateLimiter(rate_limit)
+    connection = get_connection(fail_silently=False)
+    try:
+        connection.open()
+    except Exception as e:
+        for outgoing in batch:
+            _schedule_retry(outgoing, e, max_attempts, retry_backoff)
+    else:
+        for outgoing in batch:
+            limiter.wait()
+            try:
+                connection.send_messages([build_message(outgoing, connection)])
+            except Exception as e:
+                _schedule_retry(outgoing, e, max_attempts, retry_backoff)
+                continue
+
+            outgoing.status = OutgoingEmail.Status.SENT
+            outgoing.sent_at = timezone.now()
+            outgoing.attempts += 1
+            sent += 1
+        connection.close()
+
+    OutgoingEmail.objects.bulk_update(batch, ["status", "attempts", "next_attempt_at", "error", "sent_at"])
+    logger.info(f"Sent {sent} of {len(batch)} emails")
+    return sent
+
+
+def claim_outbox_batch(batch_size: int, lease: int) -> list[OutgoingEmail]:
+    """
+    Marks up to `batch_size` due emails as sending for `lease` seconds.
+    SKIP LOCKED lets several workers claim at once; the locks are released when this returns.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        batch = list(
+            OutgoingEmail.objects.select_for_update(skip_locked=True)
+            .filter(status__in=[OutgoingEmail.Status.PENDING, OutgoingEmail.Status.SENDING], next_attempt_at__lte=now)
+            .order_by("next_attempt_at", "id")[:batch_size]
+        )
+        OutgoingEmail.objects.filter(pk__in=[outgoing.pk for outgoing in batch]).update(
+            status=OutgoingEmail.Status.SENDING, next_attempt_at=now + timedelta(seconds=lease)
+        )
+    return batch
+
+
+def _schedule_retry(outgoing: OutgoingEmail, error: Exception, max_attempts: int, retry_backoff: int) -> None:
+    outgoing.attempts += 1
+    outgoing.error = str(error)
+    if outgoing.attempts >= max_attempts:
+        outgoing.status = OutgoingEmail.Status.FAILED
+        logger.error(f"Giving up on email to {outgoing.email}: {error}")
+    else:
+        outgoing.status = OutgoingEmail.Status.PENDING
+        outgoing.next_attempt_at = timezone.now() + timedelta(seconds=retry_backoff * 2 ** (outgoing.attempts - 1))
@@ -0,0 +1,91 @@
+import time
+
+from decouple import config
+from django.core.mail import send_mail
+from django.core.mail.backends import locmem
+from django.core.management.base import BaseCommand
+from django.template.loader import render_to_string
+from django.test.utils import override_settings
+from django.utils.html import strip_tags
+
+from core.benchmarks import add_benchmark_arguments, benchmark_database
+from usersapi.emails import enqueue_email, flush_outbox
+
+
+class HandshakeEmailBackend(locmem.EmailBackend):
+    """
+    In-memory backend that pays a fixed delay whenever a connection is opened, like an SMTP/TLS handshake
+    """
+
+    handshake = 0.0
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.opened = False
+
+    def open(self):
+        if self.opened:
+            return False
+        time.sleep(self.handshake)
+        self.opened = True
+        return True
+
+    def close(self):
+        self.opened = False
+
+    def send_messages(self, messages):
+        new_connection = self.open()
+        try:
+            return super().send_messages(messages)
+        finally:
+            if new_connection:
+                self.close()
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares one send_mail call per message with the batched outbox that reuses a single connection. "
+        "Uses an in-memory backend with a simulated handshake and a throwaway test database for the outbox."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--messages", type=int, default=500)
+        parser.add_argument("--handshake-ms", type=float, default=50)
+        add_benchmark_arguments(parser)
+
+    def handle(self, *args, **options):
+        with benchmark_database(options):
+            self.benchmark(options)
+
+    def benchmark(self, options):
+        HandshakeEmailBackend.handshake = options["handshake_ms"] / 1000
+        backend = f"{__name__}.HandshakeEmailBackend"
+        count = options["messages"]
+        context = {"username": "benchmark"}
+
+        with override_settings(EMAIL_BACKEND=backend):
+            started = time.perf_counter()
+            for i in range(count):
+                html_message = render_to_string("emails/registration_email.html", context)
+                send_mail(
+                    subject="Registration complete",
+                    message=strip_tags(html_message),
+                    from_email=config("DEFAULT_FROM_EMAIL"),
+                    recipient_list=[f"user{i}@example.com"],
+                    html_message=html_message,
+                )
+            self.report("send_mail per message", count, time.perf_counter() - started)
+
+            for i in range(count):
+                enqueue_email(
+                    f"user{i}@example.com", "Registration complete", "emails/registration_email.html", context
+                )
+
+            started = time.perf_counter()
+            sent = 0
+            while batch_sent := flush_outbox(rate_limit=0):
+                sent += batch_sent
+            self.report("batched outbox", sent, time.perf_counter() - started)
+
+    def report(self, name, count, elapsed):
+        self.stdout.write(f"{name:<24} {count:>6} messages in {elapsed:7.2f}s  {count / elapsed:9.1f} msg/s")
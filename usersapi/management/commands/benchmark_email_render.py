@@ -0,0 +1,43 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.template.loader import render_to_string
+from django.utils.html import strip_tags
+
+from usersapi.emails import EMAIL_TEMPLATES, render_email
+
+CONTEXT = {
+    "transaction_id": "0f6a3c2e-5b1d-4c7e-9a8b-2d4e6f8a0b1c",
+    "username": "benchmark",
+    "amount": "125.00",
+    "user_to": "receiver",
+    "wallet_to_addr": "ab" * 32,
+}
+
+
+class Command(BaseCommand):
+    help = "Measures per-message render time of the email templates: render_to_string + strip_tags vs render_email"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--messages", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        count = options["messages"]
+        for template_name in EMAIL_TEMPLATES:
+            before = self.measure(count, lambda: strip_tags(render_to_string(template_name, CONTEXT)))
+            after = self.measure(count, lambda: render_email(template_name, CONTEXT))
+            self.stdout.write(
+                f"{template_name:<34} before {before:7.1f} us/msg | after {after:7.1f} us/msg | x{before / after:.1f}"
+            )
+
+    @staticmethod
+    def measure(count, render):
+        render()
+        timings = []
+        for _ in range(5):
+            started = time.perf_counter()
+            for _ in range(count // 5):
+                render()
+            timings.append((time.perf_counter() - started) / (count // 5))
+        return statistics.median(timings) * 1_000_000
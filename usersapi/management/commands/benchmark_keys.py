@@ -0,0 +1,76 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+
+from core.benchmarks import add_benchmark_arguments, benchmark_database
+from usersapi.models import CustomUser
+from usersapi.tasks import send_email
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures login and wallet-connect throughput and the queries each request runs. "
+        "Passwords use a fast hasher so the key generation and database round-trips dominate. "
+        "Runs against a throwaway test database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=500)
+        add_benchmark_arguments(parser)
+
+    def handle(self, *args, **options):
+        with benchmark_database(options):
+            self.benchmark(options)
+
+    def benchmark(self, options):
+        run_id = int(time.time())
+        password = "benchmark-password"
+
+        with override_settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"]):
+            started = time.perf_counter()
+            users = [
+                CustomUser.objects.create_user(username=f"key_bench_{run_id}_{i}", password=password)
+                for i in range(options["users"])
+            ]
+            self.report("create user", len(users), time.perf_counter() - started, None)
+
+            eager = send_email.app.conf.task_always_eager
+            send_email.app.conf.task_always_eager = True
+            try:
+                tokens = self.run_requests("login", users, lambda client, user: self.login(client, user, password))
+                self.run_requests(
+                    "wallet connect",
+                    users,
+                    lambda client, user: client.post(
+                        reverse("connect_wallet"), HTTP_AUTHORIZATION=f"Token {tokens[user.pk]}"
+                    ),
+                )
+            finally:
+                send_email.app.conf.task_always_eager = eager
+
+    def run_requests(self, name, users, send):
+        client = Client(HTTP_USER_AGENT="benchmark", REMOTE_ADDR="127.0.0.1")
+        results = {}
+        started = time.perf_counter()
+        with CaptureQueriesContext(connection) as queries:
+            for user in users:
+                results[user.pk] = send(client, user)
+        self.report(name, len(users), time.perf_counter() - started, len(queries))
+        return results
+
+    @staticmethod
+    def login(client, user, password):
+        response = client.post(
+            reverse("login"), {"username": user.username, "password": password}, content_type="application/json"
+        )
+        return response.json()["Token"]
+
+    def report(self, name, count, elapsed, queries):
+        line = f"{name:<16} {count:>6} requests in {elapsed:6.2f}s  {count / elapsed:8.1f} req/s"
+        if queries is not None:
+            line += f"  {queries / count:5.1f} queries/request"
+        self.stdout.write(line)
@@ -0,0 +1,48 @@
+from django.db import migrations, models
+
+OFFLINE, ONLINE = 0, 1
+
+
+def statuses_to_enum(apps, schema_editor):
+    CustomObtainToken = apps.get_model("usersapi", "CustomObtainToken")
+    CustomObtainToken.objects.exclude(status="Online").update(status_enum=OFFLINE)
+
+
+def statuses_to_text(apps, schema_editor):
+    CustomObtainToken = apps.get_model("usersapi", "CustomObtainToken")
+    CustomObtainToken.objects.filter(status_enum=OFFLINE).update(status="Offline")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("usersapi", "0006_outgoingemail"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="customobtaintoken",
+            name="status_enum",
+            field=models.PositiveSmallIntegerField(choices=[(0, "Offline"), (1, "Online")], default=ONLINE),
+        ),
+        migrations.RunPython(statuses_to_enum, statuses_to_text),
+        migrations.RemoveField(
+            model_name="customobtaintoken",
+            name="status",
+        ),
+        migrations.RenameField(
+            model_name="customobtaintoken",
+            old_name="status_enum",
+            new_name="status",
+        ),
+        migrations.AddIndex(
+            model_name="customobtaintoken",
+            index=models.Index(fields=["user", "user_agent", "ip_address"], name="token_session_lookup_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="customobtaintoken",
+            index=models.Index(
+                condition=models.Q(("status", 1)), fields=["user", "created"], name="token_online_sessions_idx"
+            ),
+        ),
+    ]
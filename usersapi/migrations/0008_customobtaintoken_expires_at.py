@@ -0,0 +1,41 @@
+# Generated by Django 5.1 on 2026-10-17 20:35
+
+from datetime import timedelta
+
+import usersapi.models
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F
+
+
+def expire_from_created(apps, schema_editor):
+    CustomObtainToken = apps.get_model("usersapi", "CustomObtainToken")
+    CustomObtainToken.objects.update(expires_at=F("created") + timedelta(seconds=settings.AUTH_TOKEN_TTL))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("usersapi", "0007_customobtaintoken_status_enum"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="customobtaintoken",
+            name="expires_at",
+            field=models.DateTimeField(default=usersapi.models.default_token_expiry),
+        ),
+        migrations.RunPython(expire_from_created, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="customobtaintoken",
+            index=models.Index(fields=["expires_at"], name="token_expires_at_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="customobtaintoken",
+            index=models.Index(
+                condition=models.Q(("status", 0)),
+                fields=["id"],
+                name="token_offline_idx",
+            ),
+        ),
+    ]
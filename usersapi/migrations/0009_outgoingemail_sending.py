@@ -0,0 +1,39 @@
+# Generated by Django 5.1 on 2026-10-17 21:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("usersapi", "0008_customobtaintoken_expires_at"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="outgoingemail",
+            name="outgoing_email_pending_idx",
+        ),
+        migrations.AlterField(
+            model_name="outgoingemail",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("pending", "Pending"),
+                    ("sending", "Sending"),
+                    ("sent", "Sent"),
+                    ("failed", "Failed"),
+                ],
+                default="pending",
+                max_length=15,
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="outgoingemail",
+            index=models.Index(
+                condition=models.Q(("status__in", ["pending", "sending"])),
+                fields=["next_attempt_at"],
+                name="outgoing_email_pending_idx",
+            ),
+        ),
+    ]
@@ -1,11 +1,14 @@
 import hashlib
 import secrets
-import uuid
+from datetime import timedelta
 
 from django.conf import settings
 from django.contrib.auth.models import AbstractUser
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
+from django.utils import timezone
 
+from core.db import save_with_unique_key
 from storeapi.models import Product
 
 
@@ -16,38 +19,70 @@ class CustomUser(AbstractUser):
     user_own_invite_code = models.CharField(max_length=15, unique=True)
 
     def save(self, *args, **kwargs):
-        if not self.user_own_invite_code:
-            self.user_own_invite_code = self.generate_user_invite_code()
-        return super().save(*args, **kwargs)
+        if self.user_own_invite_code:
+            return super().save(*args, **kwargs)
+
+        self.user_own_invite_code = self.generate_user_invite_code()
+        save_with_unique_key(
+            self,
+            "user_own_invite_code",
+            self.generate_user_invite_code,
+            lambda: super(CustomUser, self).save(*args, **kwargs),
+        )
 
     @staticmethod
     def generate_user_invite_code():
-        return str(uuid.uuid4())[:15]
+        return secrets.token_hex(8)[:15]
+
+
+def default_token_expiry():
+    return timezone.now() + timedelta(seconds=settings.AUTH_TOKEN_TTL)
 
 
 class CustomObtainToken(models.Model):
+    class Status(models.IntegerChoices):
+        OFFLINE = 0, "Offline"
+        ONLINE = 1, "Online"
+
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="auth_tokens")
     key = models.CharField(max_length=64, unique=True)
     created = models.DateTimeField(auto_now_add=True)
     user_agent = models.CharField(max_length=255)
     ip_address = models.GenericIPAddressField(blank=True, null=True)
-    status = models.CharField(max_length=15, default="Online", null=False)
+    status = models.PositiveSmallIntegerField(choices=Status, default=Status.ONLINE)
+    expires_at = models.DateTimeField(default=default_token_expiry)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "user_agent", "ip_address"], name="token_session_lookup_idx"),
+            models.Index(fields=["user", "created"], condition=models.Q(status=1), name="token_online_sessions_idx"),
+            models.Index(fields=["expires_at"], name="token_expires_at_idx"),
+            models.Index(fields=["id"], condition=models.Q(status=0), name="token_offline_idx"),
+        ]
 
     def save(self, *args, **kwargs):
-        if not self.key:
-            self.key = self.generate_key()
-        return super().save(*args, **kwargs)
+        if self.key:
+            return super().save(*args, **kwargs)
 
-    def generate_key(self):
-        while True:
-            random_string = secrets.token_bytes(20)
-            raw_key = f"{self.user}{self.user_agent}{self.ip_address}{random_string}"
-            token = hashlib.sha256(raw_key.encode()).hexdigest()
+        self.key = self.generate_key()
+        save_with_unique_key(
+            self, "key", self.generate_key, lambda: super(CustomObtainToken, self).save(*args, **kwargs)
+        )
 
-            if not CustomObtainToken.objects.filter(key=token).exists():
-                break
+    def rotate_key(self):
+        self.key = self.generate_key()
+        save_with_unique_key(
+            self, "key", self.generate_key, lambda: super(CustomObtainToken, self).save(update_fields=["key"])
+        )
 
-        return token
+    @property
+    def is_expired(self):
+        return self.expires_at <= timezone.now()
+
+    def generate_key(self):
+        random_string = secrets.token_bytes(20)
+        raw_key = f"{self.user_id}{self.user_agent}{self.ip_address}{random_string}"
+        return hashlib.sha256(raw_key.encode()).hexdigest()
 
     def __str__(self):
         return f"{self.user} - {self.key}"
@@ -56,3 +91,34 @@ class CustomObtainToken(models.Model):
 class UserNFTBackpack(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="user_backpack")
     products = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="user_products")
+
+
+class OutgoingEmail(models.Model):
+    class Status(models.TextChoices):
+        PENDING = "pending"
+        SENDING = "sending"
+        SENT = "sent"
+        FAILED = "failed"
+
+    email = models.EmailField()
+    subject = models.CharField(max_length=255)
+    template_name = models.CharField(max_length=255)
+    context = models.JSONField(encoder=DjangoJSONEncoder, default=dict)
+    status = models.CharField(max_length=15, choices=Status.choices, default=Status.PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    error = models.TextField(blank=True, default="")
+    created = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["next_attempt_at"],
+                condition=models.Q(status__in=["pending", "sending"]),
+                name="outgoing_email_pending_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} -> {self.email} ({self.status})"
@@ -99,6 +99,8 @@ class UserSerializer(serializers.ModelSerializer):
 
 
 class CustomObtainTokenSerializer(serializers.ModelSerializer):
+    status = serializers.CharField(source="get_status_display")
+
     class Meta:
         model = CustomObtainToken
         fields = ["id", "key", "created", "user_agent", "status"]
@@ -111,7 +113,7 @@ class CustomObtainTokenSerializer(serializers.ModelSerializer):
 
         if instance.key != header_token:
             ret["key"] = hashlib.sha256(raw_key.encode()).hexdigest()
-        if instance.status == "Online":
+        if instance.status == CustomObtainToken.Status.ONLINE:
             return ret
 
         raise serializers.ValidationError({"key": "To see other tokens, the status of your token must be ONLINE"})
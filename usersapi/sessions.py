@@ -0,0 +1,47 @@
+from django.db import connection, transaction
+from django.utils import timezone
+
+from core.authentication import invalidate_tokens
+from usersapi.models import CustomObtainToken
+
+
+def revoke_other_sessions(user_id: int, keep_key: str) -> list[str]:
+    """
+    Deletes every session of the user except the one with `keep_key` in a single statement
+    and evicts the deleted keys from the authentication cache.
+    Returns the revoked keys.
+    """
+    table = CustomObtainToken._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {table} WHERE user_id = %s AND key <> %s RETURNING key", [user_id, keep_key])
+        revoked_keys = [key for (key,) in cursor.fetchall()]
+
+    invalidate_tokens(*revoked_keys)
+    return revoked_keys
+
+
+def purge_sessions_batch(batch_size: int) -> dict:
+    """
+    Deletes up to `batch_size` offline or expired sessions in one short transaction.
+    Rows locked by a concurrent request are skipped and picked up by a later batch.
+    Returns the number of offline and expired sessions removed.
+    """
+    table = CustomObtainToken._meta.db_table
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            DELETE FROM {table} WHERE id IN (
+                SELECT id FROM {table}
+                WHERE status = %s OR expires_at <= %s
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING key, status
+            """,
+            [CustomObtainToken.Status.OFFLINE, timezone.now(), batch_size],
+        )
+        rows = cursor.fetchall()
+
+    invalidate_tokens(*[key for key, _ in rows])
+    offline = sum(1 for _, status in rows if status == CustomObtainToken.Status.OFFLINE)
+    return {"offline": offline, "expired": len(rows) - offline}
@@ -0,0 +1,43 @@
+from django.db import transaction
+from django.db.models.signals import post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from core.authentication import invalidate_tokens
+from storeapi.cache import bump_market_cache_version
+from usersapi.models import CustomObtainToken, CustomUser
+
+
+def invalidate_user_tokens(user_id: int) -> None:
+    """
+    Drops the cached tokens of the user once the transaction commits, so the next request loads the changed user.
+    Needed after changes made with QuerySet.update(), which do not send post_save.
+    """
+    keys = list(CustomObtainToken.objects.filter(user_id=user_id).values_list("key", flat=True))
+    if keys:
+        transaction.on_commit(lambda: invalidate_tokens(*keys))
+
+
+@receiver(pre_save, sender=CustomUser)
+def user_saving(sender, instance, update_fields, **kwargs):
+    """
+    Remembers whether the username changes, the market listing shows it as the product owner
+    """
+    instance._username_changed = False
+    if instance._state.adding or (update_fields is not None and "username" not in update_fields):
+        return
+
+    stored = CustomUser.objects.filter(pk=instance.pk).values_list("username", flat=True).first()
+    instance._username_changed = stored is not None and stored != instance.username
+
+
+@receiver(post_save, sender=CustomUser)
+def user_saved(sender, instance, created, **kwargs):
+    if not created:
+        invalidate_user_tokens(instance.pk)
+    if instance._username_changed:
+        transaction.on_commit(bump_market_cache_version)
+
+
+@receiver(pre_delete, sender=CustomUser)
+def user_deleted(sender, instance, **kwargs):
+    invalidate_user_tokens(instance.pk)
@@ -1,20 +1,46 @@
+import logging
+
 from celery import shared_task
-from django.core.mail import send_mail
-from django.template.loader import render_to_string
-from django.utils.html import strip_tags
-from decouple import config
+from django.conf import settings
+
+from usersapi.emails import enqueue_email, flush_outbox
+from usersapi.sessions import purge_sessions_batch
+
+logger = logging.getLogger()
 
 
 @shared_task
 def send_email(email, subject, template_name, context):
-    html_message = render_to_string(template_name, context)
-    plain_message = strip_tags(html_message)
-
-    send_mail(
-        subject=subject,
-        message=plain_message,
-        from_email=config("DEFAULT_FROM_EMAIL"),
-        recipient_list=[email],
-        html_message=html_message,
-        fail_silently=False,
-    )
+    """
+    Queues the email in the outbox, flush_email_outbox sends it in the next batch
+    """
+    enqueue_email(email, subject, template_name, context)
+
+
+@shared_task
+def flush_email_outbox(max_batches=20):
+    sent = 0
+    for _ in range(max_batches):
+        batch_sent = flush_outbox()
+        sent += batch_sent
+        if not batch_sent:
+            break
+    return sent
+
+
+@shared_task
+def purge_sessions(batch_size=None, max_batches=100):
+    """
+    Removes offline and expired sessions in bounded batches, each in its own transaction
+    """
+    batch_size = batch_size or settings.SESSION_PURGE_BATCH_SIZE
+    removed = {"offline": 0, "expired": 0}
+    for _ in range(max_batches):
+        batch = purge_sessions_batch(batch_size)
+        removed["offline"] += batch["offline"]
+        removed["expired"] += batch["expired"]
+        if batch["offline"] + batch["expired"] < batch_size:
+            break
+
+    logger.info(f"Purged {removed['offline']} offline and {removed['expired']} expired sessions")
+    return removed
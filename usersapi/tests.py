@@ -1,3 +1,310 @@
-from django.test import TestCase
+from datetime import timedelta
+from unittest.mock import patch
 
-# Create your tests here.
+from django.core import mail
+from django.core.cache import cache
+from django.core.mail import get_connection
+from django.db import connection
+from django.template.loader import render_to_string
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.html import strip_tags
+from rest_framework.test import APIClient
+
+from core.authentication import resolve_token, token_cache
+from usersapi.emails import EMAIL_TEMPLATES, RateLimiter, build_message, flush_outbox, render_email
+from usersapi.models import CustomObtainToken, CustomUser, OutgoingEmail
+from usersapi.tasks import purge_sessions, send_email
+
+LOCMEM_CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class TokenAuthenticationTests(TestCase):
+    def setUp(self):
+        token_cache.clear_local()
+        self.user = CustomUser.objects.create_user(username="alice", password="password", email="alice@example.com")
+        self.token = CustomObtainToken.objects.create(user=self.user, user_agent="tests", ip_address="127.0.0.1")
+        self.client = APIClient(HTTP_USER_AGENT="tests", REMOTE_ADDR="127.0.0.1")
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+
+    def tearDown(self):
+        token_cache.clear_local()
+
+    def test_cached_token_skips_database(self):
+        self.client.get(reverse("edit_user_data-detail", kwargs={"pk": self.user.pk}))
+
+        with self.assertNumQueries(0):
+            self.assertIsNotNone(token_cache.get(self.token.key))
+
+    def test_user_changes_invalidate_cached_token(self):
+        url = reverse("edit_user_data-detail", kwargs={"pk": self.user.pk})
+        self.client.get(url)
+
+        self.user.email = "alice@example.org"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+        self.assertIsNone(token_cache.get(self.token.key))
+        self.assertEqual(self.client.get(url).status_code, 200)
+        self.assertEqual(token_cache.get(self.token.key).user.email, "alice@example.org")
+
+        self.user.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+    def test_logout_invalidates_token(self):
+        response = self.client.post(reverse("logout"))
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.post(reverse("logout"))
+        self.assertEqual(response.status_code, 403)
+
+    def test_fill_racing_a_logout_does_not_restore_the_token(self):
+        fill = token_cache.set
+
+        def logout_then_fill(key, token, stamp):
+            with patch.object(token_cache, "set", side_effect=fill):
+                self.assertEqual(self.client.post(reverse("logout")).status_code, 200)
+            fill(key, token, stamp)
+
+        with patch.object(token_cache, "set", side_effect=logout_then_fill):
+            self.assertIsNotNone(resolve_token(self.token.key))
+
+        self.assertIsNone(token_cache.get(self.token.key))
+        token_cache.clear_local()
+        self.assertIsNone(token_cache.get(self.token.key))
+        self.assertEqual(
+            self.client.get(reverse("edit_user_data-detail", kwargs={"pk": self.user.pk})).status_code, 403
+        )
+
+    def test_rotated_token_stops_authenticating(self):
+        response = self.client.post(reverse("get_new_token"))
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.get(reverse("edit_user_data-detail", kwargs={"pk": self.user.pk}))
+        self.assertEqual(response.status_code, 403)
+
+        new_key = CustomObtainToken.objects.get(pk=self.token.pk).key
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {new_key}")
+        response = self.client.get(reverse("edit_user_data-detail", kwargs={"pk": self.user.pk}))
+        self.assertEqual(response.status_code, 200)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class SessionStoreTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        token_cache.clear_local()
+        self.user = CustomUser.objects.create_user(username="alice", password="password", email="alice@example.com")
+        self.token = CustomObtainToken.objects.create(user=self.user, user_agent="tests", ip_address="127.0.0.1")
+        CustomObtainToken.objects.filter(pk=self.token.pk).update(created=timezone.now() - timedelta(days=4))
+        self.client = APIClient(HTTP_USER_AGENT="tests", REMOTE_ADDR="127.0.0.1")
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+
+    def tearDown(self):
+        token_cache.clear_local()
+
+    def login_elsewhere(self, user_agent):
+        client = APIClient(HTTP_USER_AGENT=user_agent, REMOTE_ADDR="10.0.0.1")
+        response = client.post(reverse("login"), {"username": "alice", "password": "password"}, format="json")
+        client.credentials(HTTP_AUTHORIZATION=f"Token {response.data['Token']}")
+        return client
+
+    def test_revoke_deletes_other_sessions_and_evicts_them(self):
+        others = [self.login_elsewhere(f"device-{i}") for i in range(3)]
+        for client in others:
+            self.assertEqual(client.get(reverse("edit_user_data-detail", kwargs={"pk": self.user.pk})).status_code, 200)
+
+        response = self.client.post(reverse("delete_another_tokens"))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(CustomObtainToken.objects.filter(user=self.user)), [self.token])
+        for client in others:
+            self.assertEqual(client.get(reverse("edit_user_data-detail", kwargs={"pk": self.user.pk})).status_code, 403)
+
+    def test_revoke_is_a_single_statement(self):
+        self.login_elsewhere("device")
+        self.client.get(reverse("edit_user_data-detail", kwargs={"pk": self.user.pk}))
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(reverse("delete_another_tokens"))
+
+        self.assertEqual([query["sql"].split()[0] for query in queries], ["DELETE"])
+
+    def test_logged_out_sessions_are_not_listed(self):
+        other = self.login_elsewhere("device")
+        self.assertEqual(other.post(reverse("logout")).status_code, 200)
+
+        response = self.client.get(reverse("get_active_sessions-list"))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([(s["key"], s["status"]) for s in response.data["results"]], [(self.token.key, "Online")])
+        self.assertEqual(CustomObtainToken.objects.get(user_agent="device").status, CustomObtainToken.Status.OFFLINE)
+
+    def test_login_after_logout_issues_a_new_token(self):
+        self.client.post(reverse("logout"))
+
+        response = APIClient(HTTP_USER_AGENT="tests", REMOTE_ADDR="127.0.0.1").post(
+            reverse("login"), {"username": "alice", "password": "password"}, format="json"
+        )
+
+        self.assertNotEqual(response.data["Token"], self.token.key)
+
+    def test_expired_cached_token_is_rejected(self):
+        self.client.get(reverse("edit_user_data-detail", kwargs={"pk": self.user.pk}))
+        token_cache.get(self.token.key).expires_at = timezone.now()
+
+        response = self.client.get(reverse("edit_user_data-detail", kwargs={"pk": self.user.pk}))
+
+        self.assertEqual(response.status_code, 403)
+
+    def test_purge_removes_offline_and_expired_sessions_in_batches(self):
+        offline = self.login_elsewhere("offline-device")
+        offline.post(reverse("logout"))
+        expired = [self.login_elsewhere(f"expired-{i}") for i in range(3)]
+        for client in expired:
+            client.get(reverse("edit_user_data-detail", kwargs={"pk": self.user.pk}))
+        CustomObtainToken.objects.filter(user_agent__startswith="expired-").update(expires_at=timezone.now())
+
+        removed = purge_sessions(batch_size=2)
+
+        self.assertEqual(removed, {"offline": 1, "expired": 3})
+        self.assertEqual(list(CustomObtainToken.objects.all()), [self.token])
+        for client in expired:
+            self.assertEqual(client.get(reverse("edit_user_data-detail", kwargs={"pk": self.user.pk})).status_code, 403)
+
+
+class UniqueKeyGenerationTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username="alice", password="password", email="alice@example.com")
+        self.token = CustomObtainToken.objects.create(user=self.user, user_agent="tests", ip_address="127.0.0.1")
+
+    def test_colliding_token_key_is_redrawn(self):
+        keys = iter([self.token.key, "b" * 64])
+        token = CustomObtainToken(user=self.user, user_agent="other", ip_address="127.0.0.1")
+
+        with patch.object(CustomObtainToken, "generate_key", lambda _: next(keys)):
+            token.save()
+
+        self.assertEqual(token.key, "b" * 64)
+        self.assertEqual(CustomObtainToken.objects.filter(user=self.user).count(), 2)
+
+    def test_colliding_invite_code_is_redrawn(self):
+        codes = iter([self.user.user_own_invite_code, "fresh-code"])
+
+        with patch.object(CustomUser, "generate_user_invite_code", side_effect=lambda: next(codes)):
+            user = CustomUser.objects.create_user(username="bob", password="password")
+
+        self.assertEqual(user.user_own_invite_code, "fresh-code")
+
+    def test_key_is_generated_without_lookup(self):
+        with CaptureQueriesContext(connection) as queries:
+            CustomObtainToken.objects.create(user=self.user, user_agent="other", ip_address="127.0.0.1")
+
+        statements = [query["sql"].split()[0] for query in queries]
+        self.assertEqual([statement for statement in statements if statement in ("SELECT", "INSERT")], ["INSERT"])
+
+
+class EmailOutboxTests(TestCase):
+    def queue(self, count):
+        for i in range(count):
+            send_email(f"user{i}@example.com", "Your wallet", "emails/wallet_connection.html", {"username": f"user{i}"})
+
+    def test_batch_is_sent_over_one_connection(self):
+        self.queue(3)
+
+        with patch("usersapi.emails.get_connection", wraps=get_connection) as connection_factory:
+            self.assertEqual(flush_outbox(rate_limit=0), 3)
+
+        connection_factory.assert_called_once()
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertIn("user1", mail.outbox[1].body)
+        self.assertFalse(OutgoingEmail.objects.filter(status=OutgoingEmail.Status.PENDING).exists())
+
+    def test_failed_message_is_retried_with_backoff(self):
+        self.queue(2)
+        failing = OutgoingEmail.objects.order_by("id").first()
+        original_build = build_message
+
+        def build(outgoing, connection):
+            if outgoing.pk == failing.pk:
+                raise ConnectionError("SMTP refused")
+            return original_build(outgoing, connection)
+
+        with patch("usersapi.emails.build_message", side_effect=build):
+            self.assertEqual(flush_outbox(rate_limit=0, retry_backoff=30), 1)
+
+        failing.refresh_from_db()
+        self.assertEqual(failing.status, OutgoingEmail.Status.PENDING)
+        self.assertEqual(failing.attempts, 1)
+        self.assertGreater(failing.next_attempt_at, timezone.now())
+        self.assertEqual(flush_outbox(rate_limit=0), 0)
+
+    def test_claimed_batch_is_leased_while_sending(self):
+        self.queue(2)
+        claimed_by_others = []
+        original_build = build_message
+
+        def build(outgoing, connection):
+            # Another worker flushing mid-batch finds nothing left to claim
+            claimed_by_others.append(flush_outbox(rate_limit=0))
+            return original_build(outgoing, connection)
+
+        with patch("usersapi.emails.build_message", side_effect=build):
+            self.assertEqual(flush_outbox(rate_limit=0, lease=60), 2)
+
+        self.assertEqual(claimed_by_others, [0, 0])
+        self.assertEqual(OutgoingEmail.objects.filter(status=OutgoingEmail.Status.SENT).count(), 2)
+
+    def test_expired_lease_is_claimed_again(self):
+        self.queue(1)
+        OutgoingEmail.objects.update(status=OutgoingEmail.Status.SENDING, next_attempt_at=timezone.now())
+
+        self.assertEqual(flush_outbox(rate_limit=0), 1)
+        self.assertEqual(len(mail.outbox), 1)
+
+    @override_settings(CACHES=LOCMEM_CACHES)
+    def test_rate_limit_is_shared_between_workers(self):
+        workers = [RateLimiter(2), RateLimiter(2)]
+        clock = [1000.0, 1000.1, 1000.2, 1001.0]
+        with patch("usersapi.emails.time") as emails_time:
+            emails_time.time.side_effect = clock
+            workers[0].wait()
+            workers[1].wait()
+            workers[0].wait()
+
+        emails_time.sleep.assert_called_once()
+        self.assertAlmostEqual(emails_time.sleep.call_args.args[0], 0.8)
+
+
+class EmailRenderingTests(TestCase):
+    contexts = {
+        "emails/W2WTransaction.html": {
+            "transaction_id": "5f0c",
+            "username": "alice",
+            "amount": "10.00",
+            "user_to": "bob & co",
+            "wallet_to_addr": "ab" * 32,
+        },
+        "emails/W2WBatchTransaction.html": {
+            "username": "alice",
+            "count": 2,
+            "total": "30.00",
+            "transactions": [
+                {"transaction_id": "5f0c", "amount": "10.00", "user_to": "bob & co", "wallet_addr_to": "ab" * 32},
+                {"transaction_id": "6a1d", "amount": "20.00", "user_to": "<carol>", "wallet_addr_to": "cd" * 32},
+            ],
+        },
+        "emails/registration_email.html": {"username": "alice"},
+        "emails/wallet_connection.html": {"username": "<alice>"},
+    }
+
+    def test_cached_bodies_match_full_render(self):
+        for template_name in EMAIL_TEMPLATES:
+            context = self.contexts[template_name]
+            html_message = render_to_string(template_name, context)
+
+            self.assertEqual(render_email(template_name, context), (strip_tags(html_message), html_message))
@@ -1,10 +1,7 @@
 import logging
-import time
 from datetime import timedelta
 
 from django.utils import timezone
-from django.utils.decorators import method_decorator
-from django.views.decorators.cache import cache_page
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import filters
 from rest_framework import generics, permissions, status
@@ -12,12 +9,13 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.viewsets import GenericViewSet
 
+from core.authentication import invalidate_tokens
 from usersapi import paginations
 from usersapi import serializers
 from usersapi.filters import CustomTokenFilter
-from usersapi.helpers import generate_key
 from usersapi.mixins import AuthorizationTokenMixin
 from usersapi.models import CustomObtainToken, CustomUser
+from usersapi.sessions import revoke_other_sessions
 
 """ --- Registration | Login | Logout """
 
@@ -42,15 +40,16 @@ class LoginWithObtainAuthToken(APIView):
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
         user = serializer.validated_data["user"]
-        token, created = CustomObtainToken.objects.get_or_create(
+        token = CustomObtainToken.objects.filter(
             user=user,
             user_agent=user_agent,
             ip_address=user_ip_addr,
-        )
-
-        if token:
-            token.status = "Online"
-            token.save()
+            status=CustomObtainToken.Status.ONLINE,
+            expires_at__gt=timezone.now(),
+        ).first()
+        if token is None:
+            # Offline and expired sessions are never revived, purge_sessions removes them
+            token = CustomObtainToken.objects.create(user=user, user_agent=user_agent, ip_address=user_ip_addr)
 
         self.logger.info("The user logged in successfully")
         return Response({"Token": token.key, "user_agent": token.user_agent}, status=status.HTTP_200_OK)
@@ -88,20 +87,17 @@ class LogoutView(APIView):
     logger = logging.getLogger()
 
     def post(self, request):
-        user_agent = request.META.get("HTTP_USER_AGENT", "Unknown")
-        user_ip_addr = request.META.get("REMOTE_ADDR", "Unknown")
-        try:
-            token = CustomObtainToken.objects.get(user=request.user, user_agent=user_agent, ip_address=user_ip_addr)
-            token.status = "Offline"
-            token.save()
-
-            self.logger.info("The user logged out successfully")
-            return Response({"detail": "Successfully logged out."}, status=status.HTTP_200_OK)
-
-        except CustomObtainToken.DoesNotExist:
+        token = request.auth
+        if not isinstance(token, CustomObtainToken):
             self.logger.error("Invalid token")
             return Response({"detail": "Token not found."}, status=status.HTTP_404_NOT_FOUND)
 
+        CustomObtainToken.objects.filter(pk=token.pk).update(status=CustomObtainToken.Status.OFFLINE)
+        invalidate_tokens(token.key)
+
+        self.logger.info("The user logged out successfully")
+        return Response({"detail": "Successfully logged out."}, status=status.HTTP_200_OK)
+
 
 """ --- Edit views --- """
 
@@ -121,28 +117,24 @@ class RotateTokenView(AuthorizationTokenMixin, APIView):
 
     def post(self, request):
         auth_header = request.headers.get("Authorization")
-        user_agent = request.META.get("HTTP_USER_AGENT", "Unknown")
-        user_ip_addr = request.META.get("REMOTE_ADDR", "Unknown")
         header_token, error_response = self._get_token_from_header(auth_header)
         if error_response:
             return error_response
 
         try:
-            token = CustomObtainToken.objects.get(user=request.user, user_agent=user_agent, ip_address=user_ip_addr)
-            if token.status != "Online":
-                self.logger.warning("Token status is Offline")
-                return self._error_response("Provided token status is Offline, please login to change token.")
-            if token.key == header_token:
-                token.key = generate_key(token)
-                token.save()
-                self.logger.info("Successfully rotated")
-                return Response({"new_token": token.key}, status=status.HTTP_200_OK)
-
+            token = CustomObtainToken.objects.get(user=request.user, key=header_token)
         except CustomObtainToken.DoesNotExist:
             self.logger.error("Token does not exist")
-            self._error_response("Token does not exist.", status.HTTP_404_NOT_FOUND)
+            return self._error_response("Token does not exist.", status.HTTP_404_NOT_FOUND)
 
-        return self._error_response("Bad request")
+        if token.status != CustomObtainToken.Status.ONLINE:
+            self.logger.warning("Token status is Offline")
+            return self._error_response("Provided token status is Offline, please login to change token.")
+
+        token.rotate_key()
+        invalidate_tokens(header_token)
+        self.logger.info("Successfully rotated")
+        return Response({"new_token": token.key}, status=status.HTTP_200_OK)
 
 
 """ --- Get views --- """
@@ -158,7 +150,9 @@ class GetAllActiveSessionsView(generics.ListAPIView, GenericViewSet):
 
     def get_queryset(self):
         user = self.request.user
-        queryset = CustomObtainToken.objects.filter(user=user).order_by("created")
+        queryset = CustomObtainToken.objects.filter(user=user, status=CustomObtainToken.Status.ONLINE).order_by(
+            "created"
+        )
         return queryset
 
     def get_serializer_context(self):
@@ -170,9 +164,7 @@ class GetAllActiveSessionsView(generics.ListAPIView, GenericViewSet):
 
         return context
 
-    @method_decorator(cache_page(60 * 10))
     def list(self, request, *args, **kwargs):
-        time.sleep(1)
         list_ = super().list(request, *args, **kwargs)
         self.logger.info("Successfully retrieved")
         return list_
@@ -192,10 +184,12 @@ class DeleteAccountView(AuthorizationTokenMixin, APIView):
             return error_response
 
         try:
-            token = CustomObtainToken.objects.get(user=request.user, user_agent=request.META.get("HTTP_USER_AGENT"))
+            token = CustomObtainToken.objects.get(user=request.user, key=header_token)
             if header_token == token.key:
                 user = CustomUser.objects.get(username=request.user.username)
+                user_token_keys = list(user.auth_tokens.values_list("key", flat=True))
                 user.delete()
+                invalidate_tokens(*user_token_keys)
 
                 self.logger.info("Successfully deleted account")
                 return Response({"detail": "Successfully deleted account."}, status=status.HTTP_200_OK)
@@ -217,25 +211,22 @@ class DeleteAnotherTokensView(AuthorizationTokenMixin, APIView):
         if error_response:
             return error_response
 
-        try:
-            another_user_tokens = CustomObtainToken.objects.filter(user=request.user).exclude(key=header_token)
-            token_exist = CustomObtainToken.objects.get(key=header_token, user=request.user)
-            token_age = timezone.now() - token_exist.created
-
-            if token_age < timedelta(days=3):
-                self.logger.warning("Age of the token is no more than 3 days")
-                return Response({"detail": "Invalid token age."}, status=status.HTTP_400_BAD_REQUEST)
-
-            if another_user_tokens.exists():
-                another_user_tokens.delete()
-                self.logger.info("Successfully deleted")
-                return Response({"detail": "Other tokens deleted successfully."})
-            return Response({"detail": "You have only one active token."}, status=status.HTTP_200_OK)
-
-        except CustomObtainToken.DoesNotExist:
+        if not isinstance(request.auth, CustomObtainToken) or request.auth.key != header_token:
             self.logger.error("Token does not exist")
             return Response({"detail": "Token does not exist."}, status=status.HTTP_404_NOT_FOUND)
 
+        token_age = timezone.now() - request.auth.created
+        if token_age < timedelta(days=3):
+            self.logger.warning("Age of the token is no more than 3 days")
+            return Response({"detail": "Invalid token age."}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            revoked_keys = revoke_other_sessions(request.user.id, header_token)
         except Exception as e:
             self.logger.critical("Something went wrong with a critical error")
             return Response({"detail": f"An error occurred: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        if revoked_keys:
+            self.logger.info("Successfully deleted")
+            return Response({"detail": "Other tokens deleted successfully."})
+        return Response({"detail": "You have only one active token."}, status=status.HTTP_200_OK)
@@ -0,0 +1,56 @@
+import time
+from functools import wraps
+from urllib.parse import urlencode
+
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.response import Response
+
+from core.metrics import record_cache_result
+
+WALLET_CACHE_TIMEOUT = 60 * 10
+
+
+def _version_key(user_id: int) -> str:
+    return f"wallet_cache_version:{user_id}"
+
+
+def get_wallet_cache_version(user_id: int) -> int:
+    return cache.get(_version_key(user_id), 0)
+
+
+def bump_wallet_cache_version(*user_ids: int) -> None:
+    """
+    Makes every cached wallet response of the given users unreachable.
+    Called after each balance change, old entries simply expire.
+    """
+    version = time.time_ns()
+    cache.set_many({_version_key(user_id): version for user_id in user_ids}, None)
+
+
+def cache_per_user(timeout: int = WALLET_CACHE_TIMEOUT):
+    """
+    Caches successful responses of a view method per authenticated user and query string.
+    The key includes the user's wallet cache version, so a bump invalidates all of them at once.
+    """
+
+    def decorator(view_method):
+        @wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            user_id = request.user.id
+            query = urlencode(sorted(request.GET.lists()), doseq=True)
+            key = f"wallet_response:{user_id}:{get_wallet_cache_version(user_id)}:{request.path}:{query}"
+
+            cached = cache.get(key)
+            record_cache_result(request, cached is not None)
+            if cached is not None:
+                return Response(cached)
+
+            response = view_method(self, request, *args, **kwargs)
+            if response.status_code == status.HTTP_200_OK:
+                cache.set(key, response.data, timeout)
+            return response
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,105 @@
+import logging
+import threading
+import time
+
+from celery import current_app
+from django.conf import settings
+from django.core.cache import cache
+
+from wallet.utils import get_node_url
+
+logger = logging.getLogger()
+
+
+class PaymentNodeDiscovery:
+    """
+    Resolves the payment node URL without calling the tunnel API on the request path.
+    Lookup order: in-process value, CACHES["default"], then the static PAYMENT_SERVICE_URL.
+    The shared entry is kept fresh by the refresh_payment_node_url beat task; when it is missing,
+    one refresh is queued per `failure_ttl` across all workers and the fallback is remembered locally for as long.
+    """
+
+    cache_key = "payment_node_url"
+    refresh_lock_key = "payment_node_url:refresh_queued"
+
+    def __init__(self, local_ttl: int, shared_ttl: int, fallback_url: str | None, failure_ttl: int = 10):
+        self.local_ttl = local_ttl
+        self.shared_ttl = shared_ttl
+        self.fallback_url = fallback_url
+        self.failure_ttl = failure_ttl
+        self._url = None
+        self._expires_at = 0.0
+        self._fallback_until = 0.0
+        self._lock = threading.Lock()
+        self._counters = {"local_hits": 0, "shared_hits": 0, "misses": 0, "fallbacks": 0, "refreshes": 0}
+
+    def resolve(self) -> str | None:
+        now = time.monotonic()
+        with self._lock:
+            if self._url and self._expires_at > now:
+                self._counters["local_hits"] += 1
+                return self._url
+            if self._fallback_until > now:
+                self._counters["fallbacks"] += 1
+                return self.fallback_url
+
+        url = cache.get(self.cache_key)
+        if url:
+            self._count("shared_hits")
+            self._remember(url)
+            return url
+
+        self._count("misses")
+        self._queue_refresh()
+        with self._lock:
+            self._fallback_until = now + self.failure_ttl
+            self._counters["fallbacks"] += 1
+        return self.fallback_url
+
+    def refresh(self) -> str | None:
+        """
+        Looks the URL up from the tunnel API and stores it in both cache levels.
+        Called by the beat task only. A failed lookup keeps the last known URL in the shared cache.
+        """
+        url = get_node_url()
+        if url:
+            self._count("refreshes")
+            cache.set(self.cache_key, url, self.shared_ttl)
+            self._remember(url)
+        return url
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._url = None
+            self._fallback_until = 0.0
+        cache.delete_many([self.cache_key, self.refresh_lock_key])
+
+    def _queue_refresh(self) -> None:
+        if not cache.add(self.refresh_lock_key, 1, self.failure_ttl):
+            return
+        try:
+            current_app.send_task("wallet.tasks.refresh_payment_node_url")
+        except Exception as e:
+            logger.error(f"Could not queue a payment node URL refresh: {e}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._counters)
+
+    def _remember(self, url: str) -> None:
+        with self._lock:
+            self._url = url
+            self._expires_at = time.monotonic() + self.local_ttl
+            self._fallback_until = 0.0
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._counters[name] += 1
+
+
+payment_node_discovery = PaymentNodeDiscovery(
+    local_ttl=settings.PAYMENT_NODE_URL_LOCAL_TTL,
+    shared_ttl=settings.PAYMENT_NODE_URL_TTL,
+    fallback_url=settings.PAYMENT_SERVICE_URL,
+    failure_ttl=settings.PAYMENT_NODE_URL_FAILURE_TTL,
+)
@@ -0,0 +1,65 @@
+from datetime import timedelta
+from typing import Callable
+
+from django.db import transaction
+from django.db.models import Avg, Count, DurationField, ExpressionWrapper, F, Max, Min
+from django.utils import timezone
+
+from wallet.models import PaymentWebhookEvent
+
+
+def store_webhook_event(transaction_id: str, payload: dict) -> None:
+    """
+    Persists the raw event. A replayed transaction id is dropped by the unique constraint.
+    """
+    PaymentWebhookEvent.objects.bulk_create(
+        [PaymentWebhookEvent(transaction_id=transaction_id, payload=payload)], ignore_conflicts=True
+    )
+
+
+def process_inbox_batch(process_event: Callable[[dict], None], batch_size: int) -> int:
+    """
+    Claims up to `batch_size` pending events and applies them one by one.
+    SKIP LOCKED lets several workers drain the inbox at once without waiting on each other.
+    Returns the number of events handled.
+    """
+    with transaction.atomic():
+        events = list(
+            PaymentWebhookEvent.objects.select_for_update(skip_locked=True)
+            .filter(status=PaymentWebhookEvent.Status.PENDING)
+            .order_by("id")[:batch_size]
+        )
+        for event in events:
+            try:
+                with transaction.atomic():
+                    process_event(event.payload)
+                event.status = PaymentWebhookEvent.Status.PROCESSED
+            except Exception as e:
+                event.status = PaymentWebhookEvent.Status.FAILED
+                event.error = str(e)
+            event.processed_at = timezone.now()
+
+        PaymentWebhookEvent.objects.bulk_update(events, ["status", "error", "processed_at"])
+    return len(events)
+
+
+def inbox_stats(window: timedelta = timedelta(hours=1)) -> dict:
+    """
+    Inbox depth and the receive-to-apply latency of events processed within the window
+    """
+    pending = PaymentWebhookEvent.objects.filter(status=PaymentWebhookEvent.Status.PENDING)
+    oldest_pending = pending.aggregate(oldest=Min("received_at"))["oldest"]
+    latency = PaymentWebhookEvent.objects.filter(processed_at__gte=timezone.now() - window).aggregate(
+        count=Count("id"),
+        avg=Avg(ExpressionWrapper(F("processed_at") - F("received_at"), output_field=DurationField())),
+        max=Max(ExpressionWrapper(F("processed_at") - F("received_at"), output_field=DurationField())),
+    )
+
+    return {
+        "pending": pending.count(),
+        "failed": PaymentWebhookEvent.objects.filter(status=PaymentWebhookEvent.Status.FAILED).count(),
+        "oldest_pending_age_seconds": (timezone.now() - oldest_pending).total_seconds() if oldest_pending else 0,
+        "processed_in_window": latency["count"],
+        "apply_latency_avg_seconds": latency["avg"].total_seconds() if latency["avg"] else 0,
+        "apply_latency_max_seconds": latency["max"].total_seconds() if latency["max"] else 0,
+    }
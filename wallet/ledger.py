@@ -0,0 +1,206 @@
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import F, Sum
+
+from wallet.models import LedgerEntry, Wallet, WalletBalanceShard
+from wallet.shards import credit_shard
+
+
+class LedgerError(Exception):
+    pass
+
+
+APPLY_DELTAS_SQL = """
+    UPDATE {wallets} AS wallet SET wallet_balance = wallet.wallet_balance + delta.amount
+    FROM (SELECT unnest(%s::bigint[]) AS id, unnest(%s::numeric[]) AS amount) AS delta
+    WHERE wallet.id = delta.id
+"""
+
+
+def _write_journals(entries: list[LedgerEntry], shards: dict[int, int]) -> None:
+    """
+    Inserts the entries and applies them to the wallet balances, one wallet row update per wallet.
+    Credits to wallets with balance shards go to a shard row, in wallet order so concurrent journals do not deadlock.
+    """
+    deltas = defaultdict(Decimal)
+    for entry in entries:
+        if entry.account == LedgerEntry.Account.WALLET:
+            deltas[entry.wallet_id] += entry.amount
+
+    plain = {}
+    with transaction.atomic(savepoint=False):
+        LedgerEntry.objects.bulk_create(entries, batch_size=1000)
+        for wallet_id, delta in sorted(deltas.items()):
+            if delta > 0 and shards.get(wallet_id):
+                credit_shard(wallet_id, shards[wallet_id], delta)
+            elif delta:
+                plain[wallet_id] = delta
+
+        if len(plain) == 1:
+            [(wallet_id, delta)] = plain.items()
+            Wallet.objects.filter(pk=wallet_id).update(wallet_balance=F("wallet_balance") + delta)
+        elif plain:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    APPLY_DELTAS_SQL.format(wallets=Wallet._meta.db_table), [list(plain), list(plain.values())]
+                )
+
+
+def post_journal(
+    kind: int, lines: list[tuple[int, int | None, Decimal]], reference: str = "", shards: dict[int, int] | None = None
+) -> uuid.UUID:
+    """
+    Writes one balanced journal and applies it to the balances of the wallets involved.
+    `lines` are (account, wallet id, signed amount); wallet lines carry a wallet id, system accounts None.
+    `shards` maps wallet ids to their number of balance shards; credits to those wallets go to a shard row.
+    Callers moving money out of a wallet, or crediting several wallets at once, are expected to hold their locks.
+    """
+    lines = [(account, wallet_id, amount) for account, wallet_id, amount in lines if amount]
+    if sum(amount for _, _, amount in lines) != 0:
+        raise LedgerError("Journal does not balance")
+
+    journal_id = uuid.uuid4()
+    entries = [
+        LedgerEntry(
+            journal_id=journal_id,
+            account=account,
+            wallet_id=wallet_id,
+            kind=kind,
+            amount=amount,
+            reference=str(reference),
+        )
+        for account, wallet_id, amount in lines
+    ]
+    _write_journals(entries, shards or {})
+    return journal_id
+
+
+def post_transfer(kind: int, wallet_from: Wallet, wallet_to: Wallet, amount: Decimal, reference: str = "") -> uuid.UUID:
+    wallet_line = LedgerEntry.Account.WALLET
+    lines = [(wallet_line, wallet_from.pk, -amount), (wallet_line, wallet_to.pk, amount)]
+    return post_journal(kind, lines, reference, {wallet_to.pk: wallet_to.balance_shards})
+
+
+def post_transfers(kind: int, wallet_from: Wallet, transfers: list[tuple[Wallet, Decimal, str]]) -> list[uuid.UUID]:
+    """
+    Writes one transfer journal per (wallet_to, amount, reference) with a single insert and balance update
+    """
+    entries, journal_ids, shards = [], [], {}
+    for wallet_to, amount, reference in transfers:
+        journal_id = uuid.uuid4()
+        journal_ids.append(journal_id)
+        shards[wallet_to.pk] = wallet_to.balance_shards
+        for wallet, signed_amount in ((wallet_from, -amount), (wallet_to, amount)):
+            entries.append(
+                LedgerEntry(
+                    journal_id=journal_id,
+                    account=LedgerEntry.Account.WALLET,
+                    wallet_id=wallet.pk,
+                    kind=kind,
+                    amount=signed_amount,
+                    reference=str(reference),
+                )
+            )
+    _write_journals(entries, shards)
+    return journal_ids
+
+
+def post_credit(kind: int, account: int, wallet: Wallet, amount: Decimal, reference: str = "") -> uuid.UUID:
+    """
+    Credits the wallet from a system account, e.g. a refill from the payment service
+    """
+    lines = [(LedgerEntry.Account.WALLET, wallet.pk, amount), (account, None, -amount)]
+    return post_journal(kind, lines, reference, {wallet.pk: wallet.balance_shards})
+
+
+WALLET_DRIFT_SQL = """
+    SELECT wallet.id, wallet.wallet_balance + COALESCE(shards.total, 0), COALESCE(ledger.total, 0)
+    FROM {wallets} AS wallet
+    LEFT JOIN (
+        SELECT wallet_id, SUM(amount) AS total FROM {shards}
+        WHERE wallet_id >= %s AND wallet_id < %s
+        GROUP BY wallet_id
+    ) AS shards ON shards.wallet_id = wallet.id
+    LEFT JOIN (
+        SELECT wallet_id, SUM(amount) AS total FROM {entries}
+        WHERE wallet_id >= %s AND wallet_id < %s
+        GROUP BY wallet_id
+    ) AS ledger ON ledger.wallet_id = wallet.id
+    WHERE wallet.id >= %s AND wallet.id < %s
+        AND wallet.wallet_balance + COALESCE(shards.total, 0) <> COALESCE(ledger.total, 0)
+"""
+
+UNBALANCED_JOURNALS_SQL = """
+    SELECT journal_id FROM {entries}
+    WHERE id >= %s AND id < %s
+    GROUP BY journal_id
+    HAVING SUM(amount) <> 0
+"""
+
+
+def _id_chunks(model, chunk_size: int) -> list[tuple[int, int]]:
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT MIN(id), MAX(id) FROM {model._meta.db_table}")
+        low, high = cursor.fetchone()
+    if low is None:
+        return []
+    return [(start, start + chunk_size) for start in range(low, high + 1, chunk_size)]
+
+
+def _run_chunk(sql: str, params: list) -> list[tuple]:
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+    finally:
+        connection.close()
+
+
+def verify_ledger(workers: int = 4, chunk_size: int = 10_000) -> dict:
+    """
+    Recomputes every wallet balance, shards included, from the ledger and checks that every journal sums to zero.
+    Wallets and entries are split into id ranges that are checked in parallel, each on its own connection.
+    Each range is read by a single statement, so the check can run while transfers are being made.
+    """
+    started = time.perf_counter()
+    wallet_sql = WALLET_DRIFT_SQL.format(
+        wallets=Wallet._meta.db_table, shards=WalletBalanceShard._meta.db_table, entries=LedgerEntry._meta.db_table
+    )
+    journal_sql = UNBALANCED_JOURNALS_SQL.format(entries=LedgerEntry._meta.db_table)
+    wallet_chunks = _id_chunks(Wallet, chunk_size)
+    # Entries are far more numerous than wallets, so they are split into proportionally larger ranges
+    entry_chunks = _id_chunks(LedgerEntry, chunk_size * 100)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        drift_chunks = executor.map(lambda chunk: _run_chunk(wallet_sql, [*chunk, *chunk, *chunk]), wallet_chunks)
+        journal_chunks = executor.map(lambda chunk: _run_chunk(journal_sql, list(chunk)), entry_chunks)
+        drift = [
+            {"wallet_id": wallet_id, "balance": balance, "ledger": total, "drift": balance - total}
+            for rows in drift_chunks
+            for wallet_id, balance, total in rows
+        ]
+        candidates = {journal_id for rows in journal_chunks for (journal_id,) in rows}
+
+    # A journal can straddle two entry ranges, so the candidates are checked again as a whole
+    unbalanced = []
+    if candidates:
+        unbalanced = list(
+            LedgerEntry.objects.filter(journal_id__in=candidates)
+            .values("journal_id")
+            .annotate(total=Sum("amount"))
+            .exclude(total=0)
+            .values_list("journal_id", flat=True)
+        )
+
+    return {
+        "wallet_chunks": len(wallet_chunks),
+        "entry_chunks": len(entry_chunks),
+        "drift": sorted(drift, key=lambda row: row["wallet_id"]),
+        "unbalanced_journals": unbalanced,
+        "elapsed_seconds": time.perf_counter() - started,
+    }
@@ -0,0 +1,55 @@
+import statistics
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from usersapi.models import CustomUser
+from wallet.models import WalletToWalletTransaction
+from wallet.paginations import TransactionPagination
+from wallet.serializers import TransactionHistorySerializer
+from wallet.utils import encrypt_data
+
+
+class Command(BaseCommand):
+    help = "Measures the time to render one page of transaction history, without touching the database"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", type=int, nargs="+", default=[20, 100, 1000])
+        parser.add_argument("--repeat", type=int, default=20)
+
+    def handle(self, *args, **options):
+        for size in options["sizes"]:
+            page = self.build_page(size)
+            timings = []
+            for _ in range(options["repeat"]):
+                started = time.perf_counter()
+                self.render(page)
+                timings.append(time.perf_counter() - started)
+
+            median = statistics.median(timings)
+            self.stdout.write(f"{size:>5} rows: {median * 1000:8.2f} ms/page, {median / size * 1_000_000:7.1f} us/row")
+
+    @staticmethod
+    def build_page(size):
+        users = [CustomUser(id=i, username=f"user{i}") for i in range(1, 11)]
+        now = timezone.now()
+        return [
+            WalletToWalletTransaction(
+                id=i,
+                user_to=users[i % len(users)],
+                wallet_addr_to=encrypt_data(f"{i:064x}"),
+                amount=Decimal("10.00"),
+                timestamp=now - timedelta(days=i),
+            )
+            for i in range(size)
+        ]
+
+    @staticmethod
+    def render(page):
+        pagination = TransactionPagination()
+        pagination.page = page
+        data = TransactionHistorySerializer(page, many=True).data
+        return pagination.get_paginated_response(data)
@@ -0,0 +1,87 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import RequestFactory
+from rest_framework.request import Request
+
+from core.benchmarks import add_benchmark_arguments, benchmark_database
+from usersapi.models import CustomUser
+from wallet.models import WalletToWalletTransaction
+from wallet.paginations import TransactionCursorPagination, TransactionPagination
+from wallet.utils import encrypt_data
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares page-number and cursor pagination of the transaction history at shallow and deep pages. "
+        "Runs against a throwaway test database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=2_000_000)
+        parser.add_argument("--pages", type=int, nargs="+", default=[1, 5000])
+        parser.add_argument("--repeat", type=int, default=5)
+        add_benchmark_arguments(parser)
+
+    def handle(self, *args, **options):
+        with benchmark_database(options):
+            self.benchmark(options)
+
+    def benchmark(self, options):
+        user_from = CustomUser.objects.create(username="benchmark_sender", user_own_invite_code="bench-sender")
+        user_to = CustomUser.objects.create(username="benchmark_receiver", user_own_invite_code="bench-receiver")
+        self.seed(user_from, user_to, options["rows"])
+
+        queryset = WalletToWalletTransaction.objects.filter(user_from=user_from).order_by("-timestamp", "-id")
+        for page in options["pages"]:
+            offset_ms = self.measure(options["repeat"], lambda: self.page_number(queryset, page))
+            cursor = self.cursor_for(queryset, page)
+            cursor_ms = self.measure(options["repeat"], lambda: self.keyset(queryset, cursor))
+            self.stdout.write(f"page {page:>6}: offset {offset_ms:9.2f} ms | cursor {cursor_ms:9.2f} ms")
+
+    def seed(self, user_from, user_to, rows):
+        table = WalletToWalletTransaction._meta.db_table
+        address = encrypt_data("0" * 64)
+        self.stdout.write(f"Seeding {rows} transactions...")
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                INSERT INTO {table} (
+                    transaction_id, user_from_id, user_to_id, wallet_addr_from, wallet_addr_to,
+                    wallet_addr_from_hash, wallet_addr_to_hash, amount, currency, timestamp
+                )
+                SELECT gen_random_uuid(), %s, %s, %s, %s, '', '', 10.00, 'USD', now() - i * interval '1 second'
+                FROM generate_series(1, %s) AS i
+                """,
+                [user_from.pk, user_to.pk, address, address + "x", rows],
+            )
+            cursor.execute(f"ANALYZE {table}")
+
+    @staticmethod
+    def request(**params):
+        return Request(RequestFactory().get("/", params))
+
+    def page_number(self, queryset, page):
+        return TransactionPagination().paginate_queryset(queryset, self.request(page=page))
+
+    def keyset(self, queryset, cursor):
+        params = {"cursor": cursor} if cursor else {}
+        return TransactionCursorPagination().paginate_queryset(queryset, self.request(**params))
+
+    @staticmethod
+    def cursor_for(queryset, page):
+        if page == 1:
+            return None
+        previous = queryset[(page - 1) * TransactionCursorPagination.page_size - 1]
+        return TransactionCursorPagination.encode_cursor(previous.timestamp, previous.pk)
+
+    @staticmethod
+    def measure(repeat, func):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - started)
+        return statistics.median(timings) * 1000
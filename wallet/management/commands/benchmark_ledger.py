@@ -0,0 +1,91 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from core.benchmarks import add_benchmark_arguments, benchmark_database
+from usersapi.models import CustomUser
+from wallet.ledger import verify_ledger
+from wallet.models import LedgerEntry, Wallet
+
+SEED_JOURNALS_SQL = """
+    INSERT INTO {entries} (journal_id, account, wallet_id, kind, amount, reference, created)
+    SELECT
+        md5(%(run)s || '-' || j)::uuid,
+        0,
+        CASE WHEN side = 0 THEN ids.a[1 + j %% ids.n] ELSE ids.a[1 + (j + 1 + j %% (ids.n - 1)) %% ids.n] END,
+        0,
+        CASE WHEN side = 0 THEN -1 ELSE 1 END * ((j %% 1000) + 1) / 100.0,
+        '',
+        now()
+    FROM (SELECT %(ids)s::bigint[] AS a, cardinality(%(ids)s::bigint[]) AS n) AS ids,
+        generate_series(%(start)s, %(stop)s - 1) AS j,
+        generate_series(0, 1) AS side
+"""
+
+PROJECT_BALANCES_SQL = """
+    UPDATE {wallets} AS wallet SET wallet_balance = ledger.total
+    FROM (
+        SELECT wallet_id, SUM(amount) AS total FROM {entries} WHERE wallet_id = ANY(%s) GROUP BY wallet_id
+    ) AS ledger
+    WHERE wallet.id = ledger.wallet_id
+"""
+
+
+class Command(BaseCommand):
+    help = (
+        "Seeds a ledger of transfers between generated wallets, plants drift in a few of them and times "
+        "verify_ledger with different numbers of workers. Runs against a throwaway test database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--entries", type=int, default=10_000_000)
+        parser.add_argument("--wallets", type=int, default=50_000)
+        parser.add_argument("--workers", default="1,2,4,8")
+        parser.add_argument("--drift", type=int, default=25)
+        add_benchmark_arguments(parser)
+
+    def handle(self, *args, **options):
+        with benchmark_database(options):
+            self.benchmark(options)
+
+    def benchmark(self, options):
+        run_id = int(time.time())
+        users = CustomUser.objects.bulk_create(
+            [
+                CustomUser(username=f"ledger_bench_{run_id}_{i}", user_own_invite_code=f"lb{run_id % 100_000}-{i}")
+                for i in range(options["wallets"])
+            ],
+            batch_size=5000,
+        )
+        wallets = Wallet.objects.bulk_create(
+            [Wallet(user=user, address=Wallet.generate_key()) for user in users], batch_size=5000
+        )
+        wallet_ids = [wallet.pk for wallet in wallets]
+
+        self.seed(run_id, wallet_ids, options["entries"] // 2)
+        drifted = set(wallet_ids[:: max(1, len(wallet_ids) // options["drift"])][: options["drift"]])
+        Wallet.objects.filter(pk__in=drifted).update(wallet_balance=0.01)
+
+        for workers in [int(value) for value in options["workers"].split(",")]:
+            report = verify_ledger(workers=workers)
+            found = {row["wallet_id"] for row in report["drift"]}
+            self.stdout.write(
+                f"workers={workers:<3} {report['elapsed_seconds']:7.2f}s  "
+                f"{len(report['drift'])} wallets drifted, {len(report['unbalanced_journals'])} journals unbalanced"
+            )
+            if not drifted <= found:
+                raise CommandError(f"Verifier missed planted drift in wallets {sorted(drifted - found)}")
+
+    def seed(self, run_id, wallet_ids, journals, chunk=500_000):
+        entries = LedgerEntry._meta.db_table
+        started = time.perf_counter()
+        with connection.cursor() as cursor:
+            for start in range(0, journals, chunk):
+                cursor.execute(
+                    SEED_JOURNALS_SQL.format(entries=entries),
+                    {"run": str(run_id), "ids": wallet_ids, "start": start, "stop": min(start + chunk, journals)},
+                )
+            cursor.execute(PROJECT_BALANCES_SQL.format(wallets=Wallet._meta.db_table, entries=entries), [wallet_ids])
+            cursor.execute(f"VACUUM ANALYZE {entries}")
+        self.stdout.write(f"Seeded {journals * 2} entries in {time.perf_counter() - started:.1f}s")
@@ -0,0 +1,71 @@
+import threading
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from core.benchmarks import add_benchmark_arguments, benchmark_database
+from usersapi.models import CustomUser
+from wallet.ledger import post_credit
+from wallet.models import LedgerEntry, Wallet
+from wallet.shards import fold_balance_shards, set_balance_shards
+from wallet.transfers import transfer_funds
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures credits per second to one hot wallet from concurrent senders, with the wallet unsharded "
+        "and with 1, 8 and 32 balance shards. Runs against a throwaway test database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--senders", type=int, default=16)
+        parser.add_argument("--seconds", type=float, default=10)
+        parser.add_argument("--shards", default="0,1,8,32")
+        add_benchmark_arguments(parser)
+
+    def handle(self, *args, **options):
+        with benchmark_database(options):
+            self.benchmark(options)
+
+    def benchmark(self, options):
+        run_id = int(time.time())
+        merchant = CustomUser.objects.create_user(username=f"shard_bench_{run_id}")
+        merchant_wallet = Wallet.objects.create(user=merchant)
+        senders = []
+        for i in range(options["senders"]):
+            user = CustomUser.objects.create_user(username=f"shard_bench_{run_id}_{i}")
+            wallet = Wallet.objects.create(user=user)
+            post_credit(LedgerEntry.Kind.REFILL, LedgerEntry.Account.PAYMENTS, wallet, Decimal("1000000.00"))
+            senders.append((user, wallet))
+
+        for shards in [int(value) for value in options["shards"].split(",")]:
+            set_balance_shards(merchant_wallet.pk, shards)
+            merchant_wallet.refresh_from_db()
+            credits = self.run(merchant, merchant_wallet, senders, options["seconds"])
+            fold_balance_shards()
+            label = f"{shards} shards" if shards else "unsharded"
+            self.stdout.write(f"{label:<10} {credits / options['seconds']:8.1f} credits/s")
+
+    @staticmethod
+    def run(merchant, merchant_wallet, senders, seconds):
+        counts = []
+        deadline = time.perf_counter() + seconds
+
+        def send(user, wallet):
+            count = 0
+            try:
+                while time.perf_counter() < deadline:
+                    transfer_funds(user, merchant, wallet, merchant_wallet, Decimal("1.00"))
+                    count += 1
+            finally:
+                counts.append(count)
+                connection.close()
+
+        threads = [threading.Thread(target=send, args=sender) for sender in senders]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return sum(counts)
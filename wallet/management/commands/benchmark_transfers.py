@@ -0,0 +1,60 @@
+import threading
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from core.benchmarks import add_benchmark_arguments, benchmark_database
+from usersapi.models import CustomUser
+from wallet.ledger import post_credit
+from wallet.models import LedgerEntry, Wallet
+from wallet.transfers import transfer_funds
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures transfers per second out of one hot wallet to a few receivers from concurrent threads. "
+        "Runs against a throwaway test database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=8)
+        parser.add_argument("--receivers", type=int, default=4)
+        parser.add_argument("--seconds", type=float, default=10)
+        add_benchmark_arguments(parser)
+
+    def handle(self, *args, **options):
+        with benchmark_database(options):
+            self.benchmark(options)
+
+    def benchmark(self, options):
+        run_id = int(time.time())
+        sender = CustomUser.objects.create_user(username=f"transfer_bench_{run_id}")
+        hot_wallet = Wallet.objects.create(user=sender)
+        post_credit(LedgerEntry.Kind.REFILL, LedgerEntry.Account.PAYMENTS, hot_wallet, Decimal("1000000000.00"))
+        receivers = []
+        for i in range(options["receivers"]):
+            user = CustomUser.objects.create_user(username=f"transfer_bench_{run_id}_{i}")
+            receivers.append((user, Wallet.objects.create(user=user)))
+
+        counts = []
+        deadline = time.perf_counter() + options["seconds"]
+
+        def send(thread_number):
+            user_to, wallet_to = receivers[thread_number % len(receivers)]
+            count = 0
+            try:
+                while time.perf_counter() < deadline:
+                    transfer_funds(sender, user_to, hot_wallet, wallet_to, Decimal("1.00"))
+                    count += 1
+            finally:
+                counts.append(count)
+                connection.close()
+
+        threads = [threading.Thread(target=send, args=(i,)) for i in range(options["threads"])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.stdout.write(f"{sum(counts)} transfers, {sum(counts) / options['seconds']:.1f} transfers/s")
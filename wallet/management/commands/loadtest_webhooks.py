@@ -0,0 +1,105 @@
+import random
+import threading
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.urls import reverse
+
+from core.benchmarks import add_benchmark_arguments, benchmark_database
+from usersapi.models import CustomUser
+from wallet.models import PaymentTransaction, Wallet
+
+
+def build_webhooks(wallets, count, duplicate_ratio, seed=0):
+    """
+    Returns webhook payloads where `duplicate_ratio` of them replay an earlier transaction id,
+    and the amount each wallet should be credited with
+    """
+    rng = random.Random(seed)
+    unique = [
+        {
+            "user_id": wallets[i % len(wallets)].user_id,
+            "status": "success",
+            "amount": rng.randint(100, 100_000),
+            "transactionId": f"tx-{seed}-{i}",
+            "invoiceId": f"invoice-{i}",
+        }
+        for i in range(int(count * (1 - duplicate_ratio)))
+    ]
+    payloads = unique + [rng.choice(unique) for _ in range(count - len(unique))]
+    rng.shuffle(payloads)
+
+    expected = {wallet.user_id: Decimal("0.00") for wallet in wallets}
+    for payload in unique:
+        expected[payload["user_id"]] += Decimal(payload["amount"]) / 100
+    return payloads, expected
+
+
+class Command(BaseCommand):
+    help = (
+        "Replays payment webhooks, a share of them duplicated, against PaymentWebhookView from several threads "
+        "and checks that every wallet was credited exactly once per transaction id. Runs against a throwaway test database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--webhooks", type=int, default=10_000)
+        parser.add_argument("--duplicates", type=float, default=0.3)
+        parser.add_argument("--wallets", type=int, default=50)
+        parser.add_argument("--threads", type=int, default=8)
+        add_benchmark_arguments(parser)
+
+    def handle(self, *args, **options):
+        with benchmark_database(options):
+            self.benchmark(options)
+
+    def benchmark(self, options):
+        run_id = int(time.time())
+        users = [
+            CustomUser.objects.create(username=f"webhook_load_{run_id}_{i}", user_own_invite_code=f"wl{run_id}{i}")
+            for i in range(options["wallets"])
+        ]
+        wallets = [Wallet.objects.create(user=user) for user in users]
+        payloads, expected = build_webhooks(wallets, options["webhooks"], options["duplicates"], seed=run_id)
+
+        elapsed, failures = self.replay(payloads, options["threads"])
+        self.stdout.write(
+            f"{len(payloads)} webhooks in {elapsed:.2f}s ({len(payloads) / elapsed:.0f}/s), {failures} failed"
+        )
+        self.verify(wallets, expected)
+
+    @staticmethod
+    def replay(payloads, threads):
+        failures = []
+        url = reverse("payment_webhook")
+
+        def send(chunk):
+            client = Client()
+            try:
+                for payload in chunk:
+                    if client.post(url, payload, content_type="application/json").status_code != 200:
+                        failures.append(payload["transactionId"])
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=send, args=(payloads[i::threads],)) for i in range(threads)]
+        started = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        return time.perf_counter() - started, len(failures)
+
+    def verify(self, wallets, expected):
+        unique_transactions = PaymentTransaction.objects.filter(user_id__in=expected).count()
+        balances = dict(Wallet.objects.filter(pk__in=[w.pk for w in wallets]).values_list("user_id", "wallet_balance"))
+        drift = {
+            user_id: balances[user_id] - amount for user_id, amount in expected.items() if balances[user_id] != amount
+        }
+
+        self.stdout.write(f"{unique_transactions} payment transactions recorded")
+        if drift:
+            raise CommandError(f"Balance drift in {len(drift)} wallets: {drift}")
+        self.stdout.write(self.style.SUCCESS("All balances match the unique webhooks"))
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from wallet.models import Wallet
+from wallet.shards import set_balance_shards
+
+MAX_BALANCE_SHARDS = 256
+
+
+class Command(BaseCommand):
+    help = (
+        "Spreads credits to a hot wallet over balance shard rows, or with a count of 0 turns sharding off "
+        "and folds the pending credits into the wallet"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("wallet", help="Wallet id or address")
+        parser.add_argument("count", type=int)
+
+    def handle(self, *args, **options):
+        count = options["count"]
+        if not 0 <= count <= MAX_BALANCE_SHARDS:
+            raise CommandError(f"The shard count must be between 0 and {MAX_BALANCE_SHARDS}")
+
+        wallet_ref = options["wallet"]
+        lookup = {"pk": int(wallet_ref)} if wallet_ref.isdigit() else {"address": wallet_ref}
+        wallet_id = Wallet.objects.filter(**lookup).values_list("pk", flat=True).first()
+        if wallet_id is None:
+            raise CommandError(f"Wallet {wallet_ref} does not exist")
+
+        set_balance_shards(wallet_id, count)
+        if count:
+            self.stdout.write(self.style.SUCCESS(f"Wallet {wallet_id} credits now land on {count} shards"))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Sharding turned off for wallet {wallet_id}, shards folded"))
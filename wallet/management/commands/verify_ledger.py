@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from wallet.ledger import verify_ledger
+
+
+class Command(BaseCommand):
+    help = "Recomputes wallet balances from the ledger in parallel chunks and reports any drift"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=4)
+        parser.add_argument("--chunk-size", type=int, default=10_000)
+
+    def handle(self, *args, **options):
+        report = verify_ledger(workers=options["workers"], chunk_size=options["chunk_size"])
+        self.stdout.write(
+            f"Checked {report['wallet_chunks']} wallet chunks and {report['entry_chunks']} entry chunks "
+            f"in {report['elapsed_seconds']:.2f}s"
+        )
+
+        for row in report["drift"]:
+            self.stdout.write(
+                f"wallet {row['wallet_id']}: balance {row['balance']}, ledger {row['ledger']}, drift {row['drift']}"
+            )
+        for journal_id in report["unbalanced_journals"]:
+            self.stdout.write(f"journal {journal_id} does not balance")
+
+        if report["drift"] or report["unbalanced_journals"]:
+            raise CommandError(
+                f"{len(report['drift'])} wallets drifted, {len(report['unbalanced_journals'])} journals unbalanced"
+            )
+        self.stdout.write(self.style.SUCCESS("Ledger and balances agree"))
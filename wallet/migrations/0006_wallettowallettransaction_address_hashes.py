@@ -0,0 +1,38 @@
+# Generated by Django 5.1 on 2026-10-17 20:14
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("wallet", "0005_alter_paymenttransaction_currency"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="wallettowallettransaction",
+            name="wallet_addr_from_hash",
+            field=models.CharField(default="", editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name="wallettowallettransaction",
+            name="wallet_addr_to_hash",
+            field=models.CharField(default="", editable=False, max_length=64),
+        ),
+        migrations.AddIndex(
+            model_name="wallettowallettransaction",
+            index=models.Index(
+                fields=["wallet_addr_from_hash", "wallet_addr_to_hash", "-timestamp"],
+                name="w2w_addr_pair_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="wallettowallettransaction",
+            index=models.Index(
+                fields=["wallet_addr_to_hash", "-timestamp"], name="w2w_addr_to_idx"
+            ),
+        ),
+    ]
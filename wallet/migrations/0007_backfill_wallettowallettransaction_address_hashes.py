@@ -0,0 +1,47 @@
+import hashlib
+import hmac
+
+from cryptography.fernet import Fernet
+from django.conf import settings
+from django.db import migrations
+
+BATCH_SIZE = 1000
+
+
+def backfill_address_hashes(apps, schema_editor):
+    WalletToWalletTransaction = apps.get_model("wallet", "WalletToWalletTransaction")
+    cipher = Fernet(settings.ENCRYPTION_KEY)
+    key = settings.BLIND_INDEX_KEY.encode()
+
+    def digest(encrypted_address):
+        address = cipher.decrypt(encrypted_address.encode())
+        return hmac.new(key, address, hashlib.sha256).hexdigest()
+
+    last_pk = 0
+    while True:
+        batch = list(
+            WalletToWalletTransaction.objects.filter(pk__gt=last_pk, wallet_addr_from_hash="")
+            .order_by("pk")
+            .only("pk", "wallet_addr_from", "wallet_addr_to")[:BATCH_SIZE]
+        )
+        if not batch:
+            break
+
+        for record in batch:
+            record.wallet_addr_from_hash = digest(record.wallet_addr_from)
+            record.wallet_addr_to_hash = digest(record.wallet_addr_to)
+
+        WalletToWalletTransaction.objects.bulk_update(batch, ["wallet_addr_from_hash", "wallet_addr_to_hash"])
+        last_pk = batch[-1].pk
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ("wallet", "0006_wallettowallettransaction_address_hashes"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_address_hashes, migrations.RunPython.noop),
+    ]
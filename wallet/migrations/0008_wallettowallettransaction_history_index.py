@@ -0,0 +1,22 @@
+# Generated by Django 5.1 on 2026-10-17 20:16
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("wallet", "0007_backfill_wallettowallettransaction_address_hashes"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="wallettowallettransaction",
+            index=models.Index(
+                fields=["user_from", "-timestamp", "-id"],
+                name="w2w_user_from_history_idx",
+            ),
+        ),
+    ]
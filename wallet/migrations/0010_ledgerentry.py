@@ -0,0 +1,116 @@
+# Generated by Django 5.1 on 2026-10-17 20:49
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+APPEND_ONLY_TRIGGER = """
+CREATE FUNCTION wallet_ledgerentry_append_only() RETURNS trigger AS $$
+BEGIN
+    IF current_setting('wallet.ledger_maintenance', true) = 'on' THEN
+        RETURN COALESCE(NEW, OLD);
+    END IF;
+    RAISE EXCEPTION 'wallet_ledgerentry is append-only';
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER wallet_ledgerentry_append_only
+    BEFORE UPDATE OR DELETE ON wallet_ledgerentry
+    FOR EACH ROW EXECUTE FUNCTION wallet_ledgerentry_append_only();
+"""
+
+DROP_APPEND_ONLY_TRIGGER = """
+DROP TRIGGER wallet_ledgerentry_append_only ON wallet_ledgerentry;
+DROP FUNCTION wallet_ledgerentry_append_only();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("wallet", "0009_paymentwebhookevent"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="LedgerEntry",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("journal_id", models.UUIDField(default=uuid.uuid4)),
+                (
+                    "account",
+                    models.PositiveSmallIntegerField(
+                        choices=[
+                            (0, "Wallet"),
+                            (1, "Payments"),
+                            (2, "Bonuses"),
+                            (3, "Opening balance"),
+                        ],
+                        default=0,
+                    ),
+                ),
+                (
+                    "kind",
+                    models.PositiveSmallIntegerField(
+                        choices=[
+                            (0, "Transfer"),
+                            (1, "Purchase"),
+                            (2, "Refill"),
+                            (3, "Bonus"),
+                            (4, "Opening balance"),
+                        ]
+                    ),
+                ),
+                ("amount", models.DecimalField(decimal_places=2, max_digits=15)),
+                ("reference", models.CharField(blank=True, default="", max_length=64)),
+                ("created", models.DateTimeField(auto_now_add=True)),
+                (
+                    "wallet",
+                    models.ForeignKey(
+                        blank=True,
+                        db_constraint=False,
+                        null=True,
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        related_name="ledger_entries",
+                        to="wallet.wallet",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["wallet"],
+                        include=("amount",),
+                        name="ledger_wallet_amount_idx",
+                    ),
+                    models.Index(fields=["journal_id"], name="ledger_journal_idx"),
+                ],
+                "constraints": [
+                    models.CheckConstraint(
+                        condition=models.Q(("amount", 0), _negated=True),
+                        name="ledger_entry_non_zero",
+                    ),
+                    models.CheckConstraint(
+                        condition=models.Q(
+                            models.Q(("account", 0), ("wallet__isnull", False)),
+                            models.Q(
+                                models.Q(("account", 0), _negated=True),
+                                ("wallet__isnull", True),
+                            ),
+                            _connector="OR",
+                        ),
+                        name="ledger_entry_wallet_account",
+                    ),
+                ],
+            },
+        ),
+        migrations.RunSQL(APPEND_ONLY_TRIGGER, DROP_APPEND_ONLY_TRIGGER),
+    ]
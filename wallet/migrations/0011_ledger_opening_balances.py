@@ -0,0 +1,58 @@
+import uuid
+
+from django.db import migrations
+
+BATCH_SIZE = 1000
+WALLET, OPENING_BALANCE_ACCOUNT = 0, 3
+OPENING_BALANCE_KIND = 4
+
+
+def post_opening_balances(apps, schema_editor):
+    """
+    Gives every wallet with a balance an opening journal, so the ledger sums to the current balances
+    """
+    Wallet = apps.get_model("wallet", "Wallet")
+    LedgerEntry = apps.get_model("wallet", "LedgerEntry")
+
+    last_pk = 0
+    while True:
+        batch = list(
+            Wallet.objects.filter(pk__gt=last_pk)
+            .exclude(wallet_balance=0)
+            .order_by("pk")
+            .only("pk", "wallet_balance")[:BATCH_SIZE]
+        )
+        if not batch:
+            break
+
+        entries = []
+        for wallet in batch:
+            journal_id = uuid.uuid4()
+            entries += [
+                LedgerEntry(
+                    journal_id=journal_id,
+                    account=WALLET,
+                    wallet_id=wallet.pk,
+                    kind=OPENING_BALANCE_KIND,
+                    amount=wallet.wallet_balance,
+                ),
+                LedgerEntry(
+                    journal_id=journal_id,
+                    account=OPENING_BALANCE_ACCOUNT,
+                    kind=OPENING_BALANCE_KIND,
+                    amount=-wallet.wallet_balance,
+                ),
+            ]
+        LedgerEntry.objects.bulk_create(entries)
+        last_pk = batch[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("wallet", "0010_ledgerentry"),
+    ]
+
+    operations = [
+        migrations.RunPython(post_opening_balances, migrations.RunPython.noop),
+    ]
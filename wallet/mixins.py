@@ -1,14 +1,15 @@
 from decimal import Decimal, InvalidOperation
 
-from django.db import transaction
 from django.db.utils import IntegrityError
 from django.utils import timezone
 from rest_framework import status
 from rest_framework.response import Response
 
 from usersapi.models import CustomUser
+from wallet.cache import bump_wallet_cache_version
 from wallet.models import Wallet, WalletToWalletTransaction
-from wallet.utils import encrypt_data
+from wallet.transfers import TransferError, transfer_funds
+from wallet.utils import address_digest
 
 
 class WalletTransactionMixin:
@@ -41,36 +42,35 @@ class WalletTransactionMixin:
             return None
 
     def _perform_transaction(self, user_from, user_to, wallet_from, wallet_to, amount):
+        """
+        Runs the locked transfer and refreshes the sender's balance.
+        Returns the transaction id and an error response if the transfer was rejected.
+        """
         try:
-            with transaction.atomic():
-                wallet_from.wallet_balance -= amount
-                wallet_to.wallet_balance += amount
-                wallet_from.save()
-                wallet_to.save()
+            transaction_record, balance = transfer_funds(user_from, user_to, wallet_from, wallet_to, amount)
+        except TransferError as e:
+            return None, self._error_response(str(e))
 
-                transaction_record = WalletToWalletTransaction.objects.create(
-                    user_from=user_from,
-                    user_to=user_to,
-                    wallet_addr_from=encrypt_data(wallet_from.address),
-                    wallet_addr_to=encrypt_data(wallet_to.address),
-                    amount=amount,
-                )
-                return transaction_record.transaction_id
-        except Exception as e:
-            transaction.rollback()
-            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        bump_wallet_cache_version(user_from.id, user_to.id)
+        wallet_from.wallet_balance = balance
+        return transaction_record.transaction_id, None
 
     def _check_transaction_duplicate(self, user_from, user_to, wallet_from, wallet_to, amount):
+        """
+        Returns an error response if the same transfer was made less than a minute ago
+        """
         recent_transaction = (
             WalletToWalletTransaction.objects.filter(
+                wallet_addr_from_hash=address_digest(wallet_from.address),
+                wallet_addr_to_hash=address_digest(wallet_to.address),
                 user_from=user_from,
                 user_to=user_to,
-                wallet_addr_from=encrypt_data(wallet_from.address),
-                wallet_addr_to=encrypt_data(wallet_to.address),
                 amount=amount,
             )
             .order_by("-timestamp")
+            .only("timestamp")
             .first()
         )
         if recent_transaction and (timezone.now() - recent_transaction.timestamp).total_seconds() < 60:
-            self._error_response("Duplicate transaction detected. Please wait before retrying.")
+            return self._error_response("Duplicate transaction detected. Please wait before retrying.")
+        return None
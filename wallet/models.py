@@ -4,36 +4,45 @@ import uuid
 from django.db import models
 
 from core import settings
+from core.db import save_with_unique_key
 
 
 class Wallet(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="user_wallet")
     address = models.CharField(max_length=64, unique=True, db_index=True)
     wallet_balance = models.DecimalField(max_digits=15, decimal_places=2, default=0.00)
+    # Credits to a wallet with shards land on one of its WalletBalanceShard rows instead of this row
+    balance_shards = models.PositiveSmallIntegerField(default=0)
 
     def save(self, *args, **kwargs):
-        if not self.address:
-            self.address = self.create_wallet_addr()
-        return super().save(*args, **kwargs)
+        if self.address:
+            return super().save(*args, **kwargs)
+
+        self.address = self.generate_key()
+        save_with_unique_key(self, "address", self.generate_key, lambda: super(Wallet, self).save(*args, **kwargs))
 
     @staticmethod
     def generate_key():
         return secrets.token_hex(32)
 
-    @staticmethod
-    def check_key_unique(address):
-        return not Wallet.objects.filter(address=address).exists()
 
-    @staticmethod
-    def create_wallet_addr():
-        while True:
-            keys = [Wallet.generate_key() for _ in range(3)]
-            unique_keys = [key for key in keys if Wallet.check_key_unique(key)]
+class WalletBalanceShard(models.Model):
+    """
+    Credits to a sharded wallet that have not been folded into Wallet.wallet_balance yet.
+    The balance of the wallet is wallet_balance plus the amounts of all its shards.
+    """
 
-            if unique_keys:
-                break
+    wallet = models.ForeignKey(Wallet, on_delete=models.CASCADE, related_name="balance_shard_rows")
+    shard = models.PositiveSmallIntegerField()
+    amount = models.DecimalField(max_digits=15, decimal_places=2, default=0)
 
-        return unique_keys[0]
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["wallet", "shard"], name="wallet_balance_shard_unique"),
+        ]
+
+    def __str__(self):
+        return f"Shard {self.shard} of wallet {self.wallet_id}: {self.amount}"
 
 
 class WalletToWalletTransaction(models.Model):
@@ -42,11 +51,20 @@ class WalletToWalletTransaction(models.Model):
     user_to = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="user_to")
     wallet_addr_from = models.CharField(max_length=185)
     wallet_addr_to = models.CharField(max_length=185)
+    wallet_addr_from_hash = models.CharField(max_length=64, default="", editable=False)
+    wallet_addr_to_hash = models.CharField(max_length=64, default="", editable=False)
     amount = models.DecimalField(max_digits=12, decimal_places=2)
     currency = models.CharField(max_length=3, default="USD")
     timestamp = models.DateTimeField(auto_now_add=True)
 
     class Meta:
+        indexes = [
+            models.Index(
+                fields=["wallet_addr_from_hash", "wallet_addr_to_hash", "-timestamp"], name="w2w_addr_pair_idx"
+            ),
+            models.Index(fields=["wallet_addr_to_hash", "-timestamp"], name="w2w_addr_to_idx"),
+            models.Index(fields=["user_from", "-timestamp", "-id"], name="w2w_user_from_history_idx"),
+        ]
         constraints = [
             models.CheckConstraint(check=~models.Q(user_from=models.F("user_to")), name="prevent_self_transfer"),
             models.CheckConstraint(
@@ -68,3 +86,87 @@ class PaymentTransaction(models.Model):
     currency = models.IntegerField(default=840)
     invoice_id = models.CharField(max_length=128)
     timestamp = models.DateTimeField(auto_now=True)
+
+
+class PaymentWebhookEvent(models.Model):
+    class Status(models.TextChoices):
+        PENDING = "pending"
+        PROCESSED = "processed"
+        FAILED = "failed"
+
+    transaction_id = models.CharField(max_length=64, unique=True)
+    payload = models.JSONField()
+    status = models.CharField(max_length=15, choices=Status.choices, default=Status.PENDING)
+    error = models.TextField(blank=True, default="")
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["id"], condition=models.Q(status="pending"), name="webhook_event_pending_idx"),
+            models.Index(fields=["processed_at"], name="webhook_event_processed_idx"),
+        ]
+
+    def __str__(self):
+        return f"Webhook {self.transaction_id} ({self.status})"
+
+
+class LedgerEntry(models.Model):
+    """
+    One side of a balance movement. Entries are append-only and every journal sums to zero;
+    The balance of a wallet, its row plus its balance shards, is the sum of the wallet's entries,
+    kept up to date by wallet.ledger.post_journal.
+    """
+
+    class Account(models.IntegerChoices):
+        WALLET = 0, "Wallet"
+        PAYMENTS = 1, "Payments"
+        BONUSES = 2, "Bonuses"
+        OPENING_BALANCE = 3, "Opening balance"
+
+    class Kind(models.IntegerChoices):
+        TRANSFER = 0, "Transfer"
+        PURCHASE = 1, "Purchase"
+        REFILL = 2, "Refill"
+        BONUS = 3, "Bonus"
+        OPENING_BALANCE = 4, "Opening balance"
+
+    journal_id = models.UUIDField(default=uuid.uuid4)
+    account = models.PositiveSmallIntegerField(choices=Account, default=Account.WALLET)
+    wallet = models.ForeignKey(
+        Wallet,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        null=True,
+        blank=True,
+        related_name="ledger_entries",
+    )
+    kind = models.PositiveSmallIntegerField(choices=Kind)
+    amount = models.DecimalField(max_digits=15, decimal_places=2)
+    reference = models.CharField(max_length=64, blank=True, default="")
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["wallet"], include=["amount"], name="ledger_wallet_amount_idx"),
+            models.Index(fields=["journal_id"], name="ledger_journal_idx"),
+        ]
+        constraints = [
+            models.CheckConstraint(check=~models.Q(amount=0), name="ledger_entry_non_zero"),
+            models.CheckConstraint(
+                check=models.Q(account=0, wallet__isnull=False)
+                | (~models.Q(account=0) & models.Q(wallet__isnull=True)),
+                name="ledger_entry_wallet_account",
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("Ledger entries are append-only")
+        return super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise ValueError("Ledger entries are append-only")
+
+    def __str__(self):
+        return f"{self.get_kind_display()} {self.journal_id}: {self.amount}"
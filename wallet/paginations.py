@@ -1,34 +1,96 @@
-from rest_framework.pagination import PageNumberPagination
-from rest_framework.response import Response
+from base64 import urlsafe_b64decode, urlsafe_b64encode
 from collections import defaultdict
-from .serializers import TransactionHistorySerializer
-
 from datetime import datetime
 
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
-class TransactionPagination(PageNumberPagination):
-    page_size = 20
 
-    def paginate_queryset(self, queryset, request, view=None):
-        self.page = super().paginate_queryset(queryset, request, view)
-        return self.page
+class GroupedTransactionsMixin:
+    page = None
 
-    def group_transactions_by_year_and_month(self, transactions):
+    def group_transactions_by_year_and_month(self, instances, transactions):
+        """
+        Groups the serialized rows using the datetimes of the page instances
+        """
         grouped_data = defaultdict(lambda: defaultdict(list))
-        for transaction in transactions:
-            timestamp = datetime.strptime(transaction["timestamp"], "%Y-%m-%d | %H:%M:%S")
-            year = timestamp.year
-            month = timestamp.month
-            grouped_data[year][month].append(transaction)
+        for instance, transaction in zip(instances, transactions):
+            timestamp = instance.timestamp
+            grouped_data[timestamp.year][timestamp.month].append(transaction)
         return grouped_data
 
-    def get_paginated_response(self, data):
-        serialized_data = TransactionHistorySerializer(self.page, many=True).data
-        grouped_data = self.group_transactions_by_year_and_month(serialized_data)
+    def get_grouped_results(self, data):
+        grouped_data = self.group_transactions_by_year_and_month(self.page, data)
 
         result = {}
         for year, months in grouped_data.items():
             result[year] = {"months": {}}
             for month, transactions in months.items():
                 result[year]["months"][month] = {"data": transactions}
-        return Response({"results": result})
+        return result
+
+
+class TransactionPagination(GroupedTransactionsMixin, PageNumberPagination):
+    page_size = 20
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page = super().paginate_queryset(queryset, request, view)
+        return self.page
+
+    def get_paginated_response(self, data):
+        return Response({"results": self.get_grouped_results(data)})
+
+
+class TransactionCursorPagination(GroupedTransactionsMixin, BasePagination):
+    """
+    Keyset pagination on (timestamp, id), newest first.
+    Every page is an index range scan, so deep pages cost the same as the first one.
+    """
+
+    page_size = 20
+    cursor_query_param = "cursor"
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        position = self.decode_cursor(request)
+        if position is not None:
+            timestamp, pk = position
+            queryset = queryset.filter(timestamp__lte=timestamp).filter(
+                Q(timestamp__lt=timestamp) | Q(timestamp=timestamp, pk__lt=pk)
+            )
+
+        results = list(queryset.order_by("-timestamp", "-pk")[: self.page_size + 1])
+        self.has_next = len(results) > self.page_size
+        self.page = results[: self.page_size]
+        return self.page
+
+    def get_paginated_response(self, data):
+        return Response({"next": self.get_next_link(), "results": self.get_grouped_results(data)})
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+
+        last = self.page[-1]
+        return replace_query_param(
+            self.request.build_absolute_uri(), self.cursor_query_param, self.encode_cursor(last.timestamp, last.pk)
+        )
+
+    @staticmethod
+    def encode_cursor(timestamp: datetime, pk: int) -> str:
+        return urlsafe_b64encode(f"{timestamp.isoformat()}|{pk}".encode()).decode()
+
+    def decode_cursor(self, request) -> tuple[datetime, int] | None:
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+
+        try:
+            timestamp, pk = urlsafe_b64decode(encoded.encode()).decode().split("|")
+            return datetime.fromisoformat(timestamp), int(pk)
+        except (TypeError, ValueError, UnicodeDecodeError):
+            raise NotFound(self.invalid_cursor_message)
@@ -0,0 +1,152 @@
+import logging
+import random
+import threading
+import time
+from typing import Callable
+
+import requests
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+from wallet.discovery import payment_node_discovery
+
+logger = logging.getLogger(__name__)
+
+
+class PaymentServiceError(Exception):
+    pass
+
+
+class PaymentServiceUnavailable(PaymentServiceError):
+    pass
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures and rejects calls for `reset_timeout` seconds.
+    After that a single trial call is let through: success closes the circuit, failure opens it again.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None
+
+    def allow_request(self) -> bool:
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.opened_at = time.monotonic()
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+class PaymentServiceClient:
+    """
+    Pooled client for the payment node. Connections are kept alive between calls and every call has
+    connect and read timeouts. Only failures to connect are retried, with jittered backoff:
+    creating an invoice is not idempotent, so once the request may have reached the node
+    (a read timeout, a dropped keep-alive connection, a 5xx answer) it is not sent again.
+    """
+
+    def __init__(
+        self,
+        base_url_resolver: Callable[[], str | None] = payment_node_discovery.resolve,
+        connect_timeout: float = settings.PAYMENT_SERVICE_CONNECT_TIMEOUT,
+        read_timeout: float = settings.PAYMENT_SERVICE_READ_TIMEOUT,
+        max_retries: int = settings.PAYMENT_SERVICE_MAX_RETRIES,
+        backoff: float = settings.PAYMENT_SERVICE_BACKOFF,
+        circuit_breaker: CircuitBreaker | None = None,
+        pool_size: int = 10,
+    ):
+        self.base_url_resolver = base_url_resolver
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.circuit_breaker = circuit_breaker or CircuitBreaker(
+            settings.PAYMENT_SERVICE_FAILURE_THRESHOLD, settings.PAYMENT_SERVICE_RESET_TIMEOUT
+        )
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def make_transaction(self, payload: dict) -> dict:
+        return self._post("/make-transaction", payload)
+
+    async def amake_transaction(self, payload: dict) -> dict:
+        """
+        Async variant for views served through core.asgi; runs the pooled call in a worker thread
+        """
+        return await sync_to_async(self.make_transaction, thread_sensitive=False)(payload)
+
+    def _post(self, path: str, payload: dict) -> dict:
+        if not self.circuit_breaker.allow_request():
+            raise PaymentServiceUnavailable("Payment service is temporarily unavailable")
+
+        base_url = self.base_url_resolver()
+        if not base_url:
+            # A discovery miss says nothing about the node's health, so it is kept out of the circuit breaker
+            raise PaymentServiceUnavailable("Payment service URL is not available")
+
+        url = f"{base_url}{path}"
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = self.session.post(url, json=payload, timeout=self.timeout)
+                if response.status_code < 500:
+                    self.circuit_breaker.record_success()
+                response.raise_for_status()
+                return response.json()
+
+            except requests.HTTPError as e:
+                if e.response.status_code >= 500:
+                    self.circuit_breaker.record_failure()
+                raise PaymentServiceError(str(e)) from e
+
+            except requests.ConnectionError as e:
+                if self._never_sent(e) and attempt < self.max_retries:
+                    logger.warning(f"Payment service connection failed, retrying: {e}")
+                    self._sleep(attempt)
+                    continue
+                self.circuit_breaker.record_failure()
+                raise PaymentServiceError(str(e)) from e
+
+            except requests.RequestException as e:
+                self.circuit_breaker.record_failure()
+                raise PaymentServiceError(str(e)) from e
+
+    @staticmethod
+    def _never_sent(error: requests.ConnectionError) -> bool:
+        """
+        Whether the connection failed before the request was written: a connect timeout or a refused connection
+        """
+        if isinstance(error, requests.ConnectTimeout):
+            return True
+        reason = getattr(error.args[0], "reason", None) if error.args else None
+        return isinstance(reason, NewConnectionError)
+
+    def _sleep(self, attempt: int) -> None:
+        time.sleep(random.uniform(0, self.backoff * 2**attempt))
+
+
+payment_client = PaymentServiceClient()
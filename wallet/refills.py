@@ -0,0 +1,59 @@
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from wallet.cache import bump_wallet_cache_version
+from wallet.ledger import post_credit
+from wallet.models import LedgerEntry, PaymentTransaction, Wallet
+
+
+def kopecks_to_amount(kopecks) -> Decimal:
+    """
+    Converts an integer amount of kopecks (cents) to whole currency without going through float
+    """
+    value = Decimal(str(kopecks))
+    if value != value.to_integral_value():
+        raise ValueError(f"Amount must be a whole number of kopecks: {kopecks!r}")
+    return value.scaleb(-2).quantize(Decimal("0.01"))
+
+
+def insert_refill_transaction(
+    transaction_id: str, wallet: Wallet, amount: Decimal, currency: int, invoice_id: str
+) -> bool:
+    """
+    Inserts the payment record unless a record with the same transaction id already exists.
+    Returns True if the row was inserted, False for a duplicate webhook.
+    """
+    table = PaymentTransaction._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            INSERT INTO {table} (transaction_id, user_id, user_wallet_addr, amount, currency, invoice_id, timestamp)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
+            ON CONFLICT (transaction_id) DO NOTHING
+            RETURNING id
+            """,
+            [transaction_id, wallet.user_id, wallet.address, amount, currency, invoice_id, timezone.now()],
+        )
+        return cursor.fetchone() is not None
+
+
+def increment_wallet_balance(wallet: Wallet, amount: Decimal, reference: str = "") -> None:
+    """
+    Credits the refill to the wallet through the ledger, from the payment service account
+    """
+    post_credit(LedgerEntry.Kind.REFILL, LedgerEntry.Account.PAYMENTS, wallet, amount, reference)
+    transaction.on_commit(lambda: bump_wallet_cache_version(wallet.user_id))
+
+
+def apply_refill(transaction_id: str, wallet: Wallet, amount: Decimal, currency: int, invoice_id: str) -> bool:
+    """
+    Records the refill and credits the wallet in one transaction.
+    A replayed transaction id changes nothing and returns False.
+    """
+    with transaction.atomic():
+        created = insert_refill_transaction(transaction_id, wallet, amount, currency, invoice_id)
+        if created:
+            increment_wallet_balance(wallet, amount, transaction_id)
+    return created
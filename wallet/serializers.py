@@ -1,24 +1,54 @@
-from datetime import datetime
-
 from rest_framework import serializers
 
+from wallet.constants import MAX_TRANSACTION_AMOUNT, MIN_TRANSACTION_AMOUNT
 from wallet.models import WalletToWalletTransaction
-from wallet.utils import decrypt_data
+from wallet.utils import decrypt_data, decrypt_many
+
+TIMESTAMP_FORMAT = "%Y-%m-%d | %H:%M:%S"
+
+
+class TransactionHistoryListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        transactions = list(data.all() if hasattr(data, "all") else data)
+        addresses = decrypt_many([transaction.wallet_addr_to for transaction in transactions])
+        return [self.child.represent(transaction, address) for transaction, address in zip(transactions, addresses)]
 
 
 class TransactionHistorySerializer(serializers.ModelSerializer):
     class Meta:
         model = WalletToWalletTransaction
         fields = ["transaction_id", "wallet_addr_to", "user_to", "amount", "currency", "timestamp"]
+        list_serializer_class = TransactionHistoryListSerializer
 
     def to_representation(self, instance):
-        ret = super().to_representation(instance)
-        timestamp = str(instance.timestamp)
-        date_obj = datetime.strptime(timestamp, "%Y-%m-%d %H:%M:%S.%f%z")
-        formatted_date = date_obj.strftime("%Y-%m-%d | %H:%M:%S")
+        return self.represent(instance, decrypt_data(instance.wallet_addr_to))
+
+    def represent(self, instance, wallet_addr_to):
+        """
+        Builds the row from an already decrypted address.
+        Expects user_to to be loaded with select_related.
+        """
+        return {
+            "transaction_id": str(instance.transaction_id),
+            "wallet_addr_to": wallet_addr_to,
+            "user_to": instance.user_to.username,
+            "amount": self.fields["amount"].to_representation(instance.amount),
+            "currency": instance.currency,
+            "timestamp": instance.timestamp.strftime(TIMESTAMP_FORMAT),
+        }
+
+
+class PaymentWebhookSerializer(serializers.Serializer):
+    user_id = serializers.IntegerField()
+    status = serializers.CharField(max_length=32)
+    amount = serializers.IntegerField(min_value=0)
+    transactionId = serializers.CharField(max_length=64)
+    invoiceId = serializers.CharField(max_length=128)
+    ccy = serializers.IntegerField(required=False)
 
-        ret["wallet_addr_to"] = decrypt_data(ret["wallet_addr_to"])
-        ret["user_to"] = instance.user_to.username
-        ret["timestamp"] = formatted_date
 
-        return ret
+class BatchTransferItemSerializer(serializers.Serializer):
+    wallet_addr_to = serializers.CharField(max_length=64)
+    amount = serializers.DecimalField(
+        max_digits=12, decimal_places=2, min_value=MIN_TRANSACTION_AMOUNT, max_value=MAX_TRANSACTION_AMOUNT
+    )
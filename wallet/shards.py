@@ -0,0 +1,98 @@
+import random
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import DecimalField, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from wallet.models import Wallet, WalletBalanceShard
+
+CREDIT_SHARD_SQL = """
+    INSERT INTO {shards} (wallet_id, shard, amount) VALUES (%s, %s, %s)
+    ON CONFLICT (wallet_id, shard) DO UPDATE SET amount = {shards}.amount + EXCLUDED.amount
+"""
+
+
+def credit_shard(wallet_id: int, shards: int, amount: Decimal) -> None:
+    """
+    Adds the credit to one of the wallet's shard rows picked at random.
+    Concurrent credits to the wallet only wait for each other when they pick the same shard.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            CREDIT_SHARD_SQL.format(shards=WalletBalanceShard._meta.db_table),
+            [wallet_id, random.randrange(shards), amount],
+        )
+
+
+def with_available_balance(queryset):
+    """
+    Annotates `available_balance`: the wallet row plus its unfolded shards, read by one statement
+    """
+    shard_total = (
+        WalletBalanceShard.objects.filter(wallet=OuterRef("pk"))
+        .values("wallet")
+        .annotate(total=Sum("amount"))
+        .values("total")
+    )
+    amount_field = DecimalField(max_digits=15, decimal_places=2)
+    return queryset.annotate(
+        available_balance=F("wallet_balance")
+        + Coalesce(Subquery(shard_total, output_field=amount_field), Value(Decimal("0")), output_field=amount_field)
+    )
+
+
+def available_balance(wallet: Wallet) -> Decimal:
+    """
+    Balance the wallet can spend, for a wallet locked by the caller.
+    The lock keeps fold_wallet_shards out, and shards only grow in the meantime, so the result is never too high.
+    """
+    if not wallet.balance_shards:
+        return wallet.wallet_balance
+    total = WalletBalanceShard.objects.filter(wallet_id=wallet.pk).aggregate(total=Sum("amount"))["total"]
+    return wallet.wallet_balance + (total or 0)
+
+
+def fold_wallet_shards(wallet_id: int) -> Decimal:
+    """
+    Moves the credits collected in the wallet's shards into its row. Returns the amount moved.
+    """
+    with transaction.atomic():
+        if not Wallet.objects.select_for_update().filter(pk=wallet_id).exists():
+            return Decimal(0)
+        shards = list(
+            WalletBalanceShard.objects.select_for_update()
+            .filter(wallet_id=wallet_id)
+            .exclude(amount=0)
+            .values_list("pk", "amount")
+        )
+        total = sum((amount for _, amount in shards), Decimal(0))
+        if shards:
+            WalletBalanceShard.objects.filter(pk__in=[pk for pk, _ in shards]).update(amount=0)
+            Wallet.objects.filter(pk=wallet_id).update(wallet_balance=F("wallet_balance") + total)
+    return total
+
+
+def fold_balance_shards() -> int:
+    """
+    Folds every wallet with unfolded credits, one transaction per wallet. Returns the number of wallets folded.
+    """
+    wallet_ids = list(
+        WalletBalanceShard.objects.exclude(amount=0)
+        .order_by("wallet_id")
+        .values_list("wallet_id", flat=True)
+        .distinct()
+    )
+    for wallet_id in wallet_ids:
+        fold_wallet_shards(wallet_id)
+    return len(wallet_ids)
+
+
+def set_balance_shards(wallet_id: int, shards: int) -> None:
+    """
+    Turns sharded credits on for the wallet, or off with shards=0, in which case the pending credits are folded
+    """
+    with transaction.atomic():
+        Wallet.objects.filter(pk=wallet_id).update(balance_shards=shards)
+        if not shards:
+            fold_wallet_shards(wallet_id)
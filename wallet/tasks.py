@@ -0,0 +1,36 @@
+from celery import shared_task
+from django.conf import settings
+
+from wallet.discovery import payment_node_discovery
+from wallet.inbox import process_inbox_batch
+from wallet.shards import fold_balance_shards
+from wallet.views import PaymentWebhookView
+
+
+@shared_task
+def refresh_payment_node_url():
+    return payment_node_discovery.refresh()
+
+
+@shared_task
+def process_payment_inbox(batch_size=None, max_batches=50):
+    """
+    Drains pending webhook events in batches through PaymentWebhookView's refill logic
+    """
+    view = PaymentWebhookView()
+    batch_size = batch_size or settings.PAYMENT_WEBHOOK_INBOX_BATCH_SIZE
+    processed = 0
+    for _ in range(max_batches):
+        handled = process_inbox_batch(view.process_event, batch_size)
+        processed += handled
+        if handled < batch_size:
+            break
+    return processed
+
+
+@shared_task
+def fold_wallet_balance_shards():
+    """
+    Folds the credits collected in balance shards back into the wallet rows
+    """
+    return fold_balance_shards()
@@ -1,3 +1,729 @@
-from django.test import TestCase
+import io
+import json
+import socket
+import threading
+import time
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Sum
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from usersapi.models import CustomUser
+from wallet.discovery import PaymentNodeDiscovery
+from wallet.inbox import inbox_stats, store_webhook_event
+from wallet.management.commands.loadtest_webhooks import build_webhooks
+from wallet.mixins import WalletTransactionMixin
+from wallet.ledger import LedgerError, post_credit, post_journal, verify_ledger
+from wallet.models import LedgerEntry, PaymentTransaction, Wallet, WalletBalanceShard, WalletToWalletTransaction
+from wallet.paginations import TransactionCursorPagination
+from wallet.payment_client import (
+    CircuitBreaker,
+    PaymentServiceClient,
+    PaymentServiceError,
+    PaymentServiceUnavailable,
+)
+from wallet.refills import increment_wallet_balance, kopecks_to_amount
+from wallet.shards import available_balance, fold_balance_shards, set_balance_shards
+from wallet.tasks import process_payment_inbox
+from wallet.transfers import InsufficientFundsError, transfer_funds
+
+LOCMEM_CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+
+class TransferConcurrencyTests(TransactionTestCase):
+    threads = 8
+    transfers_per_thread = 10
+
+    def setUp(self):
+        self.sender = CustomUser.objects.create_user(username="hot", password="password")
+        self.hot_wallet = Wallet.objects.create(user=self.sender, wallet_balance=Decimal("1000.00"))
+        self.receivers = []
+        for i in range(4):
+            user = CustomUser.objects.create_user(username=f"receiver{i}", password="password")
+            self.receivers.append((user, Wallet.objects.create(user=user, wallet_balance=Decimal("0.00"))))
+
+    def _total_balance(self):
+        return sum(Wallet.objects.values_list("wallet_balance", flat=True))
+
+    def _run_threads(self, target):
+        workers = [threading.Thread(target=target, args=(i,)) for i in range(self.threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+    def test_concurrent_transfers_conserve_balance(self):
+        errors = []
+
+        def send(thread_number):
+            user_to, wallet_to = self.receivers[thread_number % len(self.receivers)]
+            try:
+                for _ in range(self.transfers_per_thread):
+                    transfer_funds(self.sender, user_to, self.hot_wallet, wallet_to, Decimal("10.00"))
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        total_before = self._total_balance()
+        self._run_threads(send)
+        transfers = self.threads * self.transfers_per_thread
+
+        self.assertEqual(errors, [])
+        self.assertEqual(self._total_balance(), total_before)
+        self.hot_wallet.refresh_from_db()
+        self.assertEqual(self.hot_wallet.wallet_balance, Decimal("1000.00") - transfers * Decimal("10.00"))
+        self.assertEqual(WalletToWalletTransaction.objects.count(), transfers)
+        ledger = LedgerEntry.objects.filter(account=LedgerEntry.Account.WALLET)
+        self.assertEqual(ledger.aggregate(total=Sum("amount"))["total"], Decimal("0.00"))
+        self.assertEqual(
+            ledger.filter(wallet=self.hot_wallet).aggregate(total=Sum("amount"))["total"],
+            -transfers * Decimal("10.00"),
+        )
+
+    def test_concurrent_transfers_never_overdraw(self):
+        rejected = []
+
+        def send(thread_number):
+            user_to, wallet_to = self.receivers[thread_number % len(self.receivers)]
+            try:
+                for _ in range(self.transfers_per_thread):
+                    try:
+                        transfer_funds(self.sender, user_to, self.hot_wallet, wallet_to, Decimal("25.00"))
+                    except InsufficientFundsError:
+                        rejected.append(thread_number)
+            finally:
+                connection.close()
+
+        total_before = self._total_balance()
+        self._run_threads(send)
+
+        self.hot_wallet.refresh_from_db()
+        self.assertEqual(self.hot_wallet.wallet_balance, Decimal("0.00"))
+        self.assertEqual(len(rejected), self.threads * self.transfers_per_thread - 40)
+        self.assertEqual(self._total_balance(), total_before)
+
+
+class TransactionDuplicateTests(TestCase):
+    def test_duplicate_lookup_uses_blind_index(self):
+        sender = CustomUser.objects.create_user(username="sender", password="password")
+        receiver = CustomUser.objects.create_user(username="receiver", password="password")
+        wallet_from = Wallet.objects.create(user=sender, wallet_balance=Decimal("100.00"))
+        wallet_to = Wallet.objects.create(user=receiver)
+        transfer_funds(sender, receiver, wallet_from, wallet_to, Decimal("10.00"))
+
+        error_response = WalletTransactionMixin()._check_transaction_duplicate(
+            sender, receiver, wallet_from, wallet_to, Decimal("10.00")
+        )
+        self.assertIsNotNone(error_response)
+        self.assertIsNone(
+            WalletTransactionMixin()._check_transaction_duplicate(
+                sender, receiver, wallet_from, wallet_to, Decimal("20.00")
+            )
+        )
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class TransactionHistoryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.sender = CustomUser.objects.create_user(username="sender", password="password")
+        self.wallet_from = Wallet.objects.create(user=self.sender, wallet_balance=Decimal("1000.00"))
+        self.receivers = []
+        for i in range(3):
+            user = CustomUser.objects.create_user(username=f"receiver{i}", password="password")
+            self.receivers.append((user, Wallet.objects.create(user=user)))
+        for i in range(6):
+            user_to, wallet_to = self.receivers[i % 3]
+            transfer_funds(self.sender, user_to, self.wallet_from, wallet_to, Decimal("10.00"))
+
+        self.client = APIClient()
+        self.client.force_authenticate(self.sender)
+
+    def test_history_is_grouped_without_per_row_queries(self):
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse("transactions_history-list"))
+
+        self.assertEqual(response.status_code, 200)
+        now = timezone.now()
+        rows = response.data["results"][now.year]["months"][now.month]["data"]
+        self.assertEqual(len(rows), 6)
+        self.assertEqual(rows[0]["wallet_addr_to"], self.receivers[2][1].address)
+        self.assertEqual(rows[0]["user_to"], "receiver2")
+        self.assertEqual(rows[0]["amount"], "10.00")
+
+    @patch.object(TransactionCursorPagination, "page_size", 4)
+    def test_cursor_mode_walks_all_pages(self):
+        response = self.client.get(reverse("transactions_history-list"), {"pagination": "cursor"})
+        now = timezone.now()
+        first_page = response.data["results"][now.year]["months"][now.month]["data"]
+        self.assertEqual(len(first_page), 4)
+        self.assertIsNotNone(response.data["next"])
+
+        response = self.client.get(response.data["next"])
+        second_page = response.data["results"][now.year]["months"][now.month]["data"]
+        self.assertEqual(len(second_page), 2)
+        self.assertIsNone(response.data["next"])
+
+        seen = {row["transaction_id"] for row in first_page + second_page}
+        self.assertEqual(len(seen), 6)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class WalletResponseCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.alice = CustomUser.objects.create_user(username="alice", password="password")
+        self.bob = CustomUser.objects.create_user(username="bob", password="password")
+        self.alice_wallet = Wallet.objects.create(user=self.alice, wallet_balance=Decimal("100.00"))
+        self.bob_wallet = Wallet.objects.create(user=self.bob, wallet_balance=Decimal("5.00"))
+        self.client = APIClient()
+
+    def get_balance(self, user):
+        self.client.force_authenticate(user)
+        return self.client.get(reverse("wallet")).data["wallet balance"]
+
+    def test_balance_is_cached_per_user(self):
+        self.assertEqual(self.get_balance(self.alice), Decimal("100.00"))
+        self.assertEqual(self.get_balance(self.bob), Decimal("5.00"))
+
+        self.client.force_authenticate(self.alice)
+        with self.assertNumQueries(0):
+            self.client.get(reverse("wallet"))
+
+    @patch("wallet.views.send_email.delay")
+    def test_transfer_invalidates_both_balances(self, send_email):
+        self.get_balance(self.alice)
+        self.get_balance(self.bob)
+
+        self.client.force_authenticate(self.alice)
+        response = self.client.post(
+            reverse("wallet_to_wallet_transaction"), {"wallet_addr_to": self.bob_wallet.address, "amount": "20.00"}
+        )
+        self.assertEqual(response.status_code, 201)
+
+        self.assertEqual(self.get_balance(self.alice), Decimal("80.00"))
+        self.assertEqual(self.get_balance(self.bob), Decimal("25.00"))
+
+
+class StubPaymentHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    responses = []
+    requests_seen = 0
+
+    def do_POST(self):
+        type(self).requests_seen += 1
+        self.rfile.read(int(self.headers["Content-Length"]))
+        status_code, delay = type(self).responses.pop(0) if type(self).responses else (200, 0)
+        time.sleep(delay)
+        if status_code is None:
+            # Drops the connection without answering, like a keep-alive connection closed by the node
+            self.close_connection = True
+            return
+        body = json.dumps({"invoiceId": "stub"}).encode()
+        try:
+            self.send_response(status_code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except BrokenPipeError:
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+
+class PaymentServiceClientTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), StubPaymentHandler)
+        cls.base_url = f"http://127.0.0.1:{cls.server.server_port}"
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        StubPaymentHandler.responses = []
+        StubPaymentHandler.requests_seen = 0
+
+    def make_client(self, **kwargs):
+        options = {"connect_timeout": 1, "read_timeout": 0.5, "max_retries": 2, "backoff": 0.01}
+        options.update(kwargs)
+        return PaymentServiceClient(base_url_resolver=lambda: self.base_url, **options)
+
+    def test_successful_call_reuses_connection(self):
+        client = self.make_client()
+        self.assertEqual(client.make_transaction({"amount": 100}), {"invoiceId": "stub"})
+        self.assertEqual(client.make_transaction({"amount": 100}), {"invoiceId": "stub"})
+        self.assertEqual(StubPaymentHandler.requests_seen, 2)
+
+    def test_unavailable_node_is_not_retried(self):
+        StubPaymentHandler.responses = [(503, 0)]
+        with self.assertRaises(PaymentServiceError):
+            self.make_client().make_transaction({})
+        self.assertEqual(StubPaymentHandler.requests_seen, 1)
+
+    def test_dropped_connection_is_not_retried(self):
+        StubPaymentHandler.responses = [(None, 0)]
+        with self.assertRaises(PaymentServiceError):
+            self.make_client().make_transaction({})
+        self.assertEqual(StubPaymentHandler.requests_seen, 1)
+
+    def test_refused_connection_is_retried(self):
+        with socket.socket() as closed:
+            closed.bind(("127.0.0.1", 0))
+            port = closed.getsockname()[1]
+        client = PaymentServiceClient(
+            base_url_resolver=lambda: f"http://127.0.0.1:{port}", connect_timeout=1, read_timeout=1, max_retries=2
+        )
+
+        with patch.object(client, "_sleep") as sleep, self.assertRaises(PaymentServiceError):
+            client.make_transaction({})
+        self.assertEqual(sleep.call_count, 2)
+
+    def test_missing_node_url_does_not_open_the_circuit(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+        client = PaymentServiceClient(base_url_resolver=lambda: None, circuit_breaker=breaker)
+
+        with self.assertRaises(PaymentServiceUnavailable):
+            client.make_transaction({})
+        self.assertFalse(breaker.is_open)
+
+    def test_read_timeout_is_not_retried(self):
+        StubPaymentHandler.responses = [(200, 1)]
+        with self.assertRaises(PaymentServiceError):
+            self.make_client().make_transaction({})
+        self.assertEqual(StubPaymentHandler.requests_seen, 1)
+
+    def test_circuit_opens_after_repeated_failures(self):
+        client = self.make_client(max_retries=0, circuit_breaker=CircuitBreaker(failure_threshold=2, reset_timeout=60))
+        StubPaymentHandler.responses = [(500, 0), (500, 0)]
+        for _ in range(2):
+            with self.assertRaises(PaymentServiceError):
+                client.make_transaction({})
+
+        with self.assertRaises(PaymentServiceUnavailable):
+            client.make_transaction({})
+        self.assertEqual(StubPaymentHandler.requests_seen, 2)
+
+    def test_async_variant(self):
+        self.assertEqual(async_to_sync(self.make_client().amake_transaction)({}), {"invoiceId": "stub"})
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class PaymentNodeDiscoveryTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.discovery = PaymentNodeDiscovery(local_ttl=30, shared_ttl=300, fallback_url="http://static-node")
+
+    @patch("wallet.discovery.get_node_url", return_value="https://node.ngrok.app")
+    def test_refreshed_url_is_served_from_memory(self, get_node_url):
+        self.discovery.refresh()
+        for _ in range(3):
+            self.assertEqual(self.discovery.resolve(), "https://node.ngrok.app")
+
+        get_node_url.assert_called_once()
+        self.assertEqual(self.discovery.stats()["local_hits"], 3)
+
+    @patch("wallet.discovery.get_node_url", return_value="https://node.ngrok.app")
+    def test_other_workers_share_the_cached_url(self, get_node_url):
+        self.discovery.refresh()
+        other_worker = PaymentNodeDiscovery(local_ttl=30, shared_ttl=300, fallback_url=None)
+
+        self.assertEqual(other_worker.resolve(), "https://node.ngrok.app")
+        get_node_url.assert_called_once()
+        self.assertEqual(other_worker.stats()["shared_hits"], 1)
+
+    @patch("wallet.discovery.current_app.send_task")
+    @patch("wallet.discovery.get_node_url")
+    def test_request_path_never_calls_the_tunnel_api(self, get_node_url, send_task):
+        other_worker = PaymentNodeDiscovery(local_ttl=30, shared_ttl=300, fallback_url="http://static-node")
+        for _ in range(3):
+            self.assertEqual(self.discovery.resolve(), "http://static-node")
+            self.assertEqual(other_worker.resolve(), "http://static-node")
+
+        get_node_url.assert_not_called()
+        send_task.assert_called_once_with("wallet.tasks.refresh_payment_node_url")
+        self.assertEqual(self.discovery.stats()["fallbacks"], 3)
+        self.assertEqual(self.discovery.stats()["misses"], 1)
+
+    @patch("wallet.discovery.get_node_url", side_effect=["https://node.ngrok.app", None])
+    def test_failed_refresh_keeps_the_last_known_url(self, get_node_url):
+        self.discovery.refresh()
+        self.assertIsNone(self.discovery.refresh())
+
+        other_worker = PaymentNodeDiscovery(local_ttl=30, shared_ttl=300, fallback_url=None)
+        self.assertEqual(other_worker.resolve(), "https://node.ngrok.app")
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class PaymentWebhookTests(TransactionTestCase):
+    def setUp(self):
+        self.wallets = [
+            Wallet.objects.create(user=CustomUser.objects.create_user(username=f"payer{i}", password="password"))
+            for i in range(5)
+        ]
+
+    def test_amount_conversion_is_exact(self):
+        self.assertEqual(kopecks_to_amount(1999), Decimal("19.99"))
+        self.assertEqual(kopecks_to_amount(10), Decimal("0.10"))
+        with self.assertRaises(ValueError):
+            kopecks_to_amount(10.5)
+
+    def test_replayed_webhooks_are_applied_once(self):
+        payloads, expected = build_webhooks(self.wallets, count=300, duplicate_ratio=0.3)
+        chunks = [payloads[i::6] for i in range(6)]
+        statuses = []
+
+        def replay(chunk):
+            client = APIClient()
+            try:
+                for payload in chunk:
+                    statuses.append(client.post(reverse("payment_webhook"), payload, format="json").status_code)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=replay, args=(chunk,)) for chunk in chunks]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        self.assertEqual(set(statuses), {200})
+        self.assertEqual(PaymentTransaction.objects.count(), 210)
+        for wallet in self.wallets:
+            wallet.refresh_from_db()
+            self.assertEqual(wallet.wallet_balance, expected[wallet.user_id])
+
+
+@override_settings(CACHES=LOCMEM_CACHES, PAYMENT_WEBHOOK_MODE="inbox")
+class PaymentWebhookInboxTests(TestCase):
+    def setUp(self):
+        self.wallets = [
+            Wallet.objects.create(user=CustomUser.objects.create_user(username=f"payer{i}", password="password"))
+            for i in range(3)
+        ]
+        self.client = APIClient()
+
+    def test_webhook_is_acknowledged_and_applied_by_the_worker(self):
+        payloads, expected = build_webhooks(self.wallets, count=40, duplicate_ratio=0.25)
+        for payload in payloads:
+            response = self.client.post(reverse("payment_webhook"), payload, format="json")
+            self.assertEqual(response.status_code, 200)
+
+        self.assertEqual(inbox_stats()["pending"], 30)
+        self.assertEqual(PaymentTransaction.objects.count(), 0)
+
+        self.assertEqual(process_payment_inbox(batch_size=8), 30)
+
+        stats = inbox_stats()
+        self.assertEqual(stats["pending"], 0)
+        self.assertEqual(stats["processed_in_window"], 30)
+        for wallet in self.wallets:
+            wallet.refresh_from_db()
+            self.assertEqual(wallet.wallet_balance, expected[wallet.user_id])
+
+    def test_invalid_webhook_is_rejected(self):
+        response = self.client.post(reverse("payment_webhook"), {"status": "success"}, format="json")
+        self.assertEqual(response.status_code, 400)
+
+    def test_success_after_processing_event_is_applied(self):
+        payload = {
+            "user_id": self.wallets[0].user_id,
+            "status": "processing",
+            "amount": 2500,
+            "transactionId": "tx-1",
+            "invoiceId": "invoice-1",
+        }
+        self.client.post(reverse("payment_webhook"), payload, format="json")
+        self.client.post(reverse("payment_webhook"), {**payload, "status": "success"}, format="json")
+
+        self.assertEqual(process_payment_inbox(), 1)
+        self.wallets[0].refresh_from_db()
+        self.assertEqual(self.wallets[0].wallet_balance, Decimal("25.00"))
+
+    def test_failed_event_does_not_block_the_batch(self):
+        store_webhook_event("broken", {"user_id": 0, "status": "success", "amount": 100})
+        store_webhook_event(
+            "ok",
+            {
+                "user_id": self.wallets[0].user_id,
+                "status": "success",
+                "amount": 1000,
+                "transactionId": "ok",
+                "invoiceId": "i",
+            },
+        )
+
+        self.assertEqual(process_payment_inbox(), 2)
+        self.assertEqual(inbox_stats()["failed"], 1)
+        self.wallets[0].refresh_from_db()
+        self.assertEqual(self.wallets[0].wallet_balance, Decimal("10.00"))
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class LedgerTests(TransactionTestCase):
+    def setUp(self):
+        self.alice = CustomUser.objects.create_user(username="alice", password="password", amount_bonuses=15)
+        self.bob = CustomUser.objects.create_user(username="bob", password="password")
+        self.bob_wallet = Wallet.objects.create(user=self.bob)
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+
+    def test_every_movement_is_journaled_and_balances_match(self):
+        with patch("wallet.views.send_email.delay"):
+            self.client.post(reverse("connect_wallet"))
+        alice_wallet = Wallet.objects.get(user=self.alice)
+        increment_wallet_balance(alice_wallet, Decimal("100.00"), "refill-1")
+        transfer_funds(self.alice, self.bob, alice_wallet, self.bob_wallet, Decimal("40.00"))
+
+        alice_wallet.refresh_from_db()
+        self.assertEqual(alice_wallet.wallet_balance, Decimal("75.00"))
+        self.assertEqual(
+            list(LedgerEntry.objects.order_by("id").values_list("kind", flat=True)),
+            [LedgerEntry.Kind.BONUS] * 2 + [LedgerEntry.Kind.REFILL] * 2 + [LedgerEntry.Kind.TRANSFER] * 2,
+        )
+        self.assertEqual(LedgerEntry.objects.aggregate(total=Sum("amount"))["total"], 0)
+
+        report = verify_ledger(workers=2, chunk_size=1)
+        self.assertEqual(report["drift"], [])
+        self.assertEqual(report["unbalanced_journals"], [])
+
+    def test_verifier_reports_drift(self):
+        post_credit(LedgerEntry.Kind.REFILL, LedgerEntry.Account.PAYMENTS, self.bob_wallet, Decimal("10.00"))
+        Wallet.objects.filter(pk=self.bob_wallet.pk).update(wallet_balance=Decimal("12.50"))
+
+        report = verify_ledger(workers=2)
+
+        self.assertEqual(
+            report["drift"],
+            [
+                {
+                    "wallet_id": self.bob_wallet.pk,
+                    "balance": Decimal("12.50"),
+                    "ledger": Decimal("10.00"),
+                    "drift": Decimal("2.50"),
+                }
+            ],
+        )
+
+    def test_unbalanced_journal_is_rejected(self):
+        with self.assertRaises(LedgerError):
+            post_journal(LedgerEntry.Kind.TRANSFER, [(LedgerEntry.Account.WALLET, self.bob_wallet.pk, Decimal("5"))])
+
+    def test_entries_cannot_be_changed(self):
+        post_credit(LedgerEntry.Kind.REFILL, LedgerEntry.Account.PAYMENTS, self.bob_wallet, Decimal("10.00"))
+
+        with self.assertRaises(DatabaseError), transaction.atomic():
+            LedgerEntry.objects.update(amount=Decimal("1.00"))
+        with self.assertRaises(DatabaseError), transaction.atomic():
+            LedgerEntry.objects.all().delete()
+
+    def test_entries_can_be_corrected_in_maintenance_mode(self):
+        post_credit(LedgerEntry.Kind.REFILL, LedgerEntry.Account.PAYMENTS, self.bob_wallet, Decimal("10.00"))
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute("SET LOCAL wallet.ledger_maintenance = 'on'")
+            LedgerEntry.objects.filter(wallet=self.bob_wallet).update(reference="corrected")
+            LedgerEntry.objects.filter(wallet__isnull=True).delete()
+
+        self.assertEqual(list(LedgerEntry.objects.values_list("reference", flat=True)), ["corrected"])
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class BalanceShardTests(TransactionTestCase):
+    senders = 8
+
+    def setUp(self):
+        self.merchant = CustomUser.objects.create_user(username="merchant", password="password")
+        self.merchant_wallet = Wallet.objects.create(user=self.merchant)
+        set_balance_shards(self.merchant_wallet.pk, 4)
+        self.merchant_wallet.refresh_from_db()
+        self.buyers = []
+        for i in range(self.senders):
+            buyer = CustomUser.objects.create_user(username=f"buyer{i}", password="password")
+            wallet = Wallet.objects.create(user=buyer)
+            post_credit(LedgerEntry.Kind.REFILL, LedgerEntry.Account.PAYMENTS, wallet, Decimal("100.00"))
+            self.buyers.append((buyer, wallet))
+
+    def test_credits_land_on_shards_and_are_folded(self):
+        for buyer, wallet in self.buyers:
+            transfer_funds(buyer, self.merchant, wallet, self.merchant_wallet, Decimal("10.00"))
+
+        self.merchant_wallet.refresh_from_db()
+        self.assertEqual(self.merchant_wallet.wallet_balance, 0)
+        self.assertEqual(available_balance(self.merchant_wallet), Decimal("80.00"))
+        client = APIClient()
+        client.force_authenticate(self.merchant)
+        self.assertEqual(client.get(reverse("wallet")).data["wallet balance"], Decimal("80.00"))
+        self.assertEqual(verify_ledger()["drift"], [])
+
+        self.assertEqual(fold_balance_shards(), 1)
+        self.merchant_wallet.refresh_from_db()
+        self.assertEqual(self.merchant_wallet.wallet_balance, Decimal("80.00"))
+        self.assertFalse(WalletBalanceShard.objects.exclude(amount=0).exists())
+        self.assertEqual(verify_ledger()["drift"], [])
+
+    def test_sharded_wallet_spends_unfolded_credits(self):
+        buyer, wallet = self.buyers[0]
+        transfer_funds(buyer, self.merchant, wallet, self.merchant_wallet, Decimal("30.00"))
+
+        _, balance = transfer_funds(self.merchant, buyer, self.merchant_wallet, wallet, Decimal("20.00"))
+
+        self.assertEqual(balance, Decimal("10.00"))
+        with self.assertRaises(InsufficientFundsError):
+            transfer_funds(self.merchant, buyer, self.merchant_wallet, wallet, Decimal("20.00"))
+        self.assertEqual(verify_ledger()["drift"], [])
+
+    def test_turning_shards_off_folds_them(self):
+        buyer, wallet = self.buyers[0]
+        transfer_funds(buyer, self.merchant, wallet, self.merchant_wallet, Decimal("30.00"))
+
+        set_balance_shards(self.merchant_wallet.pk, 0)
+
+        self.merchant_wallet.refresh_from_db()
+        self.assertEqual(self.merchant_wallet.balance_shards, 0)
+        self.assertEqual(self.merchant_wallet.wallet_balance, Decimal("30.00"))
+
+    def test_operators_shard_wallets_with_the_management_command(self):
+        buyer, wallet = self.buyers[0]
+        transfer_funds(buyer, self.merchant, wallet, self.merchant_wallet, Decimal("30.00"))
+
+        call_command("set_balance_shards", self.merchant_wallet.address, "0", stdout=io.StringIO())
+        self.merchant_wallet.refresh_from_db()
+        self.assertEqual(self.merchant_wallet.balance_shards, 0)
+        self.assertEqual(self.merchant_wallet.wallet_balance, Decimal("30.00"))
+
+        call_command("set_balance_shards", str(self.merchant_wallet.pk), "8", stdout=io.StringIO())
+        self.merchant_wallet.refresh_from_db()
+        self.assertEqual(self.merchant_wallet.balance_shards, 8)
+
+        with self.assertRaises(CommandError):
+            call_command("set_balance_shards", "no-such-wallet", "8")
+        with self.assertRaises(CommandError):
+            call_command("set_balance_shards", str(self.merchant_wallet.pk), "-1")
+
+    def test_concurrent_credits_to_a_hot_wallet(self):
+        errors = []
+
+        def pay(buyer, wallet):
+            try:
+                for _ in range(5):
+                    transfer_funds(buyer, self.merchant, wallet, self.merchant_wallet, Decimal("10.00"))
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=pay, args=buyer) for buyer in self.buyers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        fold_balance_shards()
+        self.merchant_wallet.refresh_from_db()
+        self.assertEqual(self.merchant_wallet.wallet_balance, Decimal("10.00") * 5 * self.senders)
+        self.assertEqual(verify_ledger()["drift"], [])
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class BatchTransferTests(TransactionTestCase):
+    def setUp(self):
+        self.sender = CustomUser.objects.create_user(username="payer", password="password", email="payer@example.com")
+        self.sender_wallet = Wallet.objects.create(user=self.sender)
+        post_credit(LedgerEntry.Kind.REFILL, LedgerEntry.Account.PAYMENTS, self.sender_wallet, Decimal("100.00"))
+        self.recipients = []
+        for i in range(3):
+            user = CustomUser.objects.create_user(username=f"payee{i}", password="password")
+            self.recipients.append(Wallet.objects.create(user=user))
+        set_balance_shards(self.recipients[2].pk, 4)
+        self.client = APIClient()
+        self.client.force_authenticate(self.sender)
+
+    def post(self, transfers):
+        with patch("wallet.views.send_email.delay") as send_email:
+            response = self.client.post(reverse("wallet_batch_transaction"), {"transfers": transfers}, format="json")
+        return response, send_email
+
+    def test_all_recipients_are_paid_in_one_transaction(self):
+        transfers = [{"wallet_addr_to": wallet.address, "amount": "20.00"} for wallet in self.recipients]
+
+        with CaptureQueriesContext(connection) as queries:
+            response, send_email = self.post(transfers)
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([row["index"] for row in response.data["transactions"]], [0, 1, 2])
+        self.assertEqual(response.data["Your balance"], Decimal("40.00"))
+        self.assertEqual(WalletToWalletTransaction.objects.filter(user_from=self.sender).count(), 3)
+        self.assertEqual(
+            sum(
+                1
+                for query in queries.captured_queries
+                if 'INSERT INTO "wallet_wallettowallettransaction"' in query["sql"]
+            ),
+            1,
+        )
+        send_email.assert_called_once()
+        self.assertEqual(send_email.call_args.kwargs["context"]["total"], "60.00")
+
+        for wallet in self.recipients:
+            wallet.refresh_from_db()
+        self.assertEqual(available_balance(self.recipients[0]), Decimal("20.00"))
+        self.assertEqual(available_balance(self.recipients[2]), Decimal("20.00"))
+        self.assertEqual(verify_ledger()["drift"], [])
+        self.assertEqual(
+            LedgerEntry.objects.filter(kind=LedgerEntry.Kind.TRANSFER).values("journal_id").distinct().count(), 3
+        )
+
+    def test_invalid_recipients_are_reported_per_item(self):
+        transfers = [
+            {"wallet_addr_to": self.recipients[0].address, "amount": "30.00"},
+            {"wallet_addr_to": "unknown", "amount": "10.00"},
+            {"wallet_addr_to": self.recipients[0].address, "amount": "10.00"},
+            {"wallet_addr_to": self.sender_wallet.address, "amount": "10.00"},
+            {"wallet_addr_to": self.recipients[1].address, "amount": "1.00"},
+            {"wallet_addr_to": self.recipients[1].address, "amount": "80.00"},
+            "not an object",
+        ]
+
+        response, _ = self.post(transfers)
+
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual([row["index"] for row in response.data["transactions"]], [0])
+        self.assertEqual(
+            [(error["index"], list(error["errors"])) for error in response.data["errors"]],
+            [
+                (1, ["wallet_addr_to"]),
+                (2, ["wallet_addr_to"]),
+                (3, ["wallet_addr_to"]),
+                (4, ["amount"]),
+                (5, ["amount"]),
+                (6, ["non_field_errors"]),
+            ],
+        )
+        self.assertEqual(response.data["Your balance"], Decimal("70.00"))
+
+    def test_nothing_paid_is_a_bad_request(self):
+        response, send_email = self.post([{"wallet_addr_to": "unknown", "amount": "10.00"}])
+
+        self.assertEqual(response.status_code, 400)
+        send_email.assert_not_called()
+        self.assertEqual(self.post([])[0].status_code, 400)
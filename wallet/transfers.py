@@ -0,0 +1,194 @@
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Q
+
+from wallet.ledger import post_transfer, post_transfers
+from wallet.models import LedgerEntry, Wallet, WalletToWalletTransaction
+from wallet.serializers import BatchTransferItemSerializer
+from wallet.shards import available_balance
+from wallet.utils import address_digest, encrypt_data
+
+
+class TransferError(Exception):
+    pass
+
+
+class InsufficientFundsError(TransferError):
+    pass
+
+
+def _lock(field: str, keys: tuple[int, ...], credited: tuple[int, ...]) -> dict[int, Wallet]:
+    wallets = Wallet.objects.filter(**{f"{field}__in": keys})
+    locking = wallets.select_for_update()
+    if credited:
+        locking = locking.filter(~Q(**{f"{field}__in": credited}) | Q(balance_shards=0))
+    locked = {getattr(wallet, field): wallet for wallet in locking.order_by("pk")}
+
+    unlocked = [key for key in credited if key not in locked]
+    if unlocked:
+        locked.update({getattr(wallet, field): wallet for wallet in wallets.filter(**{f"{field}__in": unlocked})})
+    return locked
+
+
+def lock_wallets(*wallet_ids: int, credited: tuple[int, ...] = ()) -> dict[int, Wallet]:
+    """
+    Locks the wallets in primary key order, so concurrent transfers
+    between the same wallets always queue up instead of deadlocking.
+    Wallets in `credited` that have balance shards are read without a lock, since credits to them
+    go to a shard row and leave the wallet row alone.
+    Must be called inside a transaction.
+    """
+    locked = _lock("pk", wallet_ids, credited)
+    if len(locked) != len(set(wallet_ids)):
+        raise TransferError("Wallet does not exist")
+
+    return locked
+
+
+def lock_user_wallets(*user_ids: int, credited: tuple[int, ...] = ()) -> dict[int, Wallet]:
+    """
+    Same as lock_wallets, for callers that only know the owners. Users without a wallet are left out.
+    Must be called inside a transaction.
+    """
+    return _lock("user_id", user_ids, credited)
+
+
+def move_funds(
+    user_from, user_to, wallet_from: Wallet, wallet_to: Wallet, amount: Decimal, kind=LedgerEntry.Kind.TRANSFER
+):
+    """
+    Moves the amount between two wallets that the caller has already locked and records the transaction
+    together with its ledger journal.
+    The balance of `wallet_from` is updated in place; it is exact since nobody else can change the row.
+    `wallet_to` only needs to be locked when it has no balance shards.
+    """
+    if wallet_from.pk == wallet_to.pk:
+        raise TransferError("Cannot transfer to the same wallet")
+    if available_balance(wallet_from) < amount:
+        raise InsufficientFundsError("Insufficient funds in wallet.")
+
+    transaction_record = WalletToWalletTransaction.objects.create(
+        user_from=user_from,
+        user_to=user_to,
+        wallet_addr_from=encrypt_data(wallet_from.address),
+        wallet_addr_to=encrypt_data(wallet_to.address),
+        wallet_addr_from_hash=address_digest(wallet_from.address),
+        wallet_addr_to_hash=address_digest(wallet_to.address),
+        amount=amount,
+    )
+    post_transfer(kind, wallet_from, wallet_to, amount, reference=transaction_record.transaction_id)
+    wallet_from.wallet_balance -= amount
+    if not wallet_to.balance_shards:
+        wallet_to.wallet_balance += amount
+
+    return transaction_record
+
+
+def transfer_funds(user_from, user_to, wallet_from: Wallet, wallet_to: Wallet, amount: Decimal):
+    """
+    Moves the amount between two wallets and records the transaction.
+    Returns the transaction record and the sender's available balance.
+    """
+    if wallet_from.pk == wallet_to.pk:
+        raise TransferError("Cannot transfer to the same wallet")
+
+    with transaction.atomic():
+        locked = lock_wallets(wallet_from.pk, wallet_to.pk, credited=(wallet_to.pk,))
+        transaction_record = move_funds(user_from, user_to, locked[wallet_from.pk], locked[wallet_to.pk], amount)
+        balance = available_balance(locked[wallet_from.pk])
+
+    return transaction_record, balance
+
+
+def batch_transfer(user_from, wallet_from: Wallet, items: list) -> tuple[list[dict], list[dict], Decimal | None]:
+    """
+    Pays several recipients from one wallet in one transaction.
+    Items are validated without touching the database, recipients are resolved with a single query and
+    all wallets are locked together in primary key order. Items are paid in order while the funds last.
+    Returns the payments with their item index, the errors of the rejected items and the sender's new balance.
+    """
+    valid, errors = [], []
+    seen_addresses = set()
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            errors.append({"index": index, "errors": {"non_field_errors": ["Expected an object."]}})
+            continue
+
+        serializer = BatchTransferItemSerializer(data=item)
+        if not serializer.is_valid():
+            errors.append({"index": index, "errors": serializer.errors})
+            continue
+
+        address = serializer.validated_data["wallet_addr_to"]
+        if address == wallet_from.address:
+            errors.append({"index": index, "errors": {"wallet_addr_to": ["Cannot transfer to the same wallet"]}})
+            continue
+        if address in seen_addresses:
+            errors.append({"index": index, "errors": {"wallet_addr_to": ["Duplicate recipient in this batch."]}})
+            continue
+        seen_addresses.add(address)
+        valid.append((index, address, serializer.validated_data["amount"]))
+
+    recipients = {}
+    if seen_addresses:
+        recipients = {
+            wallet.address: wallet
+            for wallet in Wallet.objects.select_related("user").filter(address__in=seen_addresses)
+        }
+    resolved = []
+    for index, address, amount in valid:
+        if address in recipients:
+            resolved.append((index, recipients[address], amount))
+        else:
+            errors.append({"index": index, "errors": {"wallet_addr_to": ["Enter valid wallet address"]}})
+
+    payments, balance = [], None
+    if resolved:
+        recipient_ids = tuple(wallet.pk for _, wallet, _ in resolved)
+        with transaction.atomic():
+            locked = lock_wallets(wallet_from.pk, *recipient_ids, credited=recipient_ids)
+            sender = locked[wallet_from.pk]
+            balance = available_balance(sender)
+
+            paid = []
+            for index, wallet_to, amount in resolved:
+                if amount > balance:
+                    errors.append({"index": index, "errors": {"amount": ["Insufficient funds in wallet."]}})
+                    continue
+                balance -= amount
+                paid.append((index, wallet_to, amount))
+
+            if paid:
+                address_from = encrypt_data(sender.address)
+                address_from_hash = address_digest(sender.address)
+                records = WalletToWalletTransaction.objects.bulk_create(
+                    [
+                        WalletToWalletTransaction(
+                            user_from=user_from,
+                            user_to=wallet_to.user,
+                            wallet_addr_from=address_from,
+                            wallet_addr_to=encrypt_data(wallet_to.address),
+                            wallet_addr_from_hash=address_from_hash,
+                            wallet_addr_to_hash=address_digest(wallet_to.address),
+                            amount=amount,
+                        )
+                        for _, wallet_to, amount in paid
+                    ],
+                    batch_size=500,
+                )
+                post_transfers(
+                    LedgerEntry.Kind.TRANSFER,
+                    sender,
+                    [
+                        (locked[wallet_to.pk], amount, record.transaction_id)
+                        for (_, wallet_to, amount), record in zip(paid, records)
+                    ],
+                )
+                payments = [
+                    {"index": index, "record": record, "wallet_to": wallet_to}
+                    for (index, wallet_to, _), record in zip(paid, records)
+                ]
+
+    errors.sort(key=lambda error: error["index"])
+    return payments, errors, balance
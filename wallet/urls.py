@@ -15,6 +15,17 @@ urlpatterns += [
     path(
         "wallet/make-transaction/", views.WalletToWallerTransactionView.as_view(), name="wallet_to_wallet_transaction"
     ),
+    path(
+        "wallet/make-transaction/batch/",
+        views.WalletBatchTransactionView.as_view(),
+        name="wallet_batch_transaction",
+    ),
     path("wallet/refill/", views.RefillWalletView.as_view(), name="refill_wallet"),
     path("wallet/webhook/", views.PaymentWebhookView.as_view(), name="payment_webhook"),
+    path(
+        "wallet/webhook/inbox/stats/", views.PaymentWebhookInboxStatsView.as_view(), name="payment_webhook_inbox_stats"
+    ),
+    path(
+        "wallet/payment-node/stats/", views.PaymentNodeDiscoveryStatsView.as_view(), name="payment_node_discovery_stats"
+    ),
 ]
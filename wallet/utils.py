@@ -1,3 +1,6 @@
+import hashlib
+import hmac
+
 import requests
 from cryptography.fernet import Fernet
 from django.urls import reverse
@@ -17,10 +20,28 @@ def decrypt_data(data: str) -> str:
     return decrypted_data.decode()
 
 
+def decrypt_many(data: list[str]) -> list[str]:
+    """
+    Decrypts a page of values in one pass with the shared cipher
+    """
+    decrypt = ciper.decrypt
+    return [decrypt(value.encode()).decode() for value in data]
+
+
+def address_digest(address: str) -> str:
+    """
+    Keyed HMAC of a wallet address. Unlike the Fernet ciphertext it is deterministic,
+    so it can be stored next to the encrypted value and queried through an index.
+    """
+    return hmac.new(settings.BLIND_INDEX_KEY.encode(), address.encode(), hashlib.sha256).hexdigest()
+
+
 def get_node_url() -> str | None:
     try:
-        # response = requests.get("http://127.0.0.1:4040/api/tunnels")
-        response = requests.get("http://ngrok:4040/api/tunnels")
+        response = requests.get(
+            settings.PAYMENT_NODE_DISCOVERY_URL,
+            timeout=(settings.PAYMENT_SERVICE_CONNECT_TIMEOUT, settings.PAYMENT_SERVICE_READ_TIMEOUT),
+        )
         response.raise_for_status()
         tunnels: list = response.json().get("tunnels", [])
         return tunnels[0]["public_url"]
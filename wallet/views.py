@@ -1,9 +1,8 @@
 import decimal
 import logging
 
-import requests
-from django.utils.decorators import method_decorator
-from django.views.decorators.cache import cache_page
+from django.conf import settings
+from django.db import transaction
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import permissions, status, generics, filters
 from rest_framework.permissions import IsAuthenticated
@@ -12,14 +11,22 @@ from rest_framework.views import APIView
 from rest_framework.viewsets import GenericViewSet
 
 from usersapi.models import CustomUser
+from usersapi.signals import invalidate_user_tokens
 from usersapi.tasks import send_email
+from wallet.cache import bump_wallet_cache_version, cache_per_user
 from wallet.constants import MAX_TRANSACTION_AMOUNT, MIN_TRANSACTION_AMOUNT
+from wallet.discovery import payment_node_discovery
 from wallet.filters import TransactionsFilter
+from wallet.inbox import inbox_stats, store_webhook_event
 from wallet.mixins import WalletTransactionMixin
-from wallet.models import Wallet, WalletToWalletTransaction, PaymentTransaction
-from wallet.paginations import TransactionPagination
-from wallet.serializers import TransactionHistorySerializer
-from wallet.utils import get_node_url
+from wallet.ledger import post_credit
+from wallet.models import LedgerEntry, Wallet, WalletToWalletTransaction
+from wallet.payment_client import PaymentServiceError, PaymentServiceUnavailable, payment_client
+from wallet.paginations import TransactionCursorPagination, TransactionPagination
+from wallet.refills import increment_wallet_balance, insert_refill_transaction, kopecks_to_amount
+from wallet.shards import available_balance, with_available_balance
+from wallet.serializers import PaymentWebhookSerializer, TransactionHistorySerializer
+from wallet.transfers import TransferError, batch_transfer
 
 """ --- WALLET --- """
 
@@ -36,8 +43,10 @@ class ConnectWalletView(APIView):
         )
 
     def post(self, request):
-        user_bonuses = CustomUser.objects.get(username=request.user.username)
-        wallet, created = Wallet.objects.get_or_create(user=request.user)
+        with transaction.atomic():
+            wallet, created = Wallet.objects.get_or_create(user=request.user)
+            if created:
+                self.credit_bonuses(request.user, wallet)
 
         if not created:
             self.logger.warning("Wallet already exists")
@@ -46,10 +55,7 @@ class ConnectWalletView(APIView):
                 status=status.HTTP_200_OK,
             )
 
-        wallet.wallet_balance += user_bonuses.amount_bonuses
-        user_bonuses.amount_bonuses = 0
-        user_bonuses.save()
-        wallet.save()
+        bump_wallet_cache_version(request.user.id)
 
         send_email.delay(
             email=request.user.email,
@@ -61,16 +67,27 @@ class ConnectWalletView(APIView):
         self.logger.info("The wallet has been successfully created")
         return Response({"message": f"Your wallet address: {wallet.address}"}, status=status.HTTP_201_CREATED)
 
+    @staticmethod
+    def credit_bonuses(user, wallet: Wallet) -> None:
+        """
+        Moves the bonuses collected before the wallet existed into it through the ledger
+        """
+        bonuses = CustomUser.objects.select_for_update().values_list("amount_bonuses", flat=True).get(pk=user.pk)
+        if bonuses:
+            post_credit(LedgerEntry.Kind.BONUS, LedgerEntry.Account.BONUSES, wallet, decimal.Decimal(bonuses))
+            CustomUser.objects.filter(pk=user.pk).update(amount_bonuses=0)
+            invalidate_user_tokens(user.pk)
+
 
 class GetWalletInfoView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
-    @method_decorator(cache_page(60 * 10))
+    @cache_per_user()
     def get(self, request):
         user = request.user
-        wallet = Wallet.objects.get(user=user)
+        wallet = with_available_balance(Wallet.objects.filter(user=user)).get()
         return Response(
-            {"wallet address": wallet.address, "wallet balance": wallet.wallet_balance}, status=status.HTTP_200_OK
+            {"wallet address": wallet.address, "wallet balance": wallet.available_balance}, status=status.HTTP_200_OK
         )
 
 
@@ -83,11 +100,29 @@ class GetWalletTransactionHistoryView(generics.ListAPIView, GenericViewSet):
 
     def get_queryset(self):
         user = self.request.user
-        transactions = WalletToWalletTransaction.objects.filter(user_from=user).order_by("-timestamp")
+        transactions = (
+            WalletToWalletTransaction.objects.filter(user_from=user)
+            .select_related("user_to")
+            .only("transaction_id", "wallet_addr_to", "user_to__username", "amount", "currency", "timestamp")
+            .order_by("-timestamp", "-id")
+        )
 
         return transactions
 
-    @method_decorator(cache_page(60 * 10))
+    @property
+    def paginator(self):
+        """
+        Switches to keyset pagination when the client asks for cursor mode
+        """
+        if not hasattr(self, "_paginator"):
+            params = self.request.query_params
+            if params.get("pagination") == "cursor" or TransactionCursorPagination.cursor_query_param in params:
+                self._paginator = TransactionCursorPagination()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
+
+    @cache_per_user()
     def list(self, request, *args, **kwargs):
         return super().list(request, *args, **kwargs)
 
@@ -136,12 +171,20 @@ class WalletToWallerTransactionView(WalletTransactionMixin, APIView):
         if validated_amount < MIN_TRANSACTION_AMOUNT:
             return self._error_response("Minimum amount of transactions 10.00")
 
-        if wallet_from.wallet_balance < validated_amount:
+        if available_balance(wallet_from) < validated_amount:
             return self._error_response("Insufficient funds in wallet.")
 
         # CREATE AND SAVE TRANSACTION
-        self._check_transaction_duplicate(request_user_from, user_to, wallet_from, wallet_to, validated_amount)
-        transaction_id = self._perform_transaction(request_user_from, user_to, wallet_from, wallet_to, validated_amount)
+        error_response = self._check_transaction_duplicate(
+            request_user_from, user_to, wallet_from, wallet_to, validated_amount
+        )
+        if error_response:
+            return error_response
+        transaction_id, error_response = self._perform_transaction(
+            request_user_from, user_to, wallet_from, wallet_to, validated_amount
+        )
+        if error_response:
+            return error_response
         self.logger.info("Transaction successful")
 
         send_email.delay(
@@ -163,6 +206,68 @@ class WalletToWallerTransactionView(WalletTransactionMixin, APIView):
         )
 
 
+class WalletBatchTransactionView(APIView):
+    permission_classes = [IsAuthenticated]
+    logger = logging.getLogger()
+
+    def post(self, request):
+        """
+        Pays several recipients at once: {"transfers": [{"wallet_addr_to", "amount"}]}
+        """
+        items = request.data.get("transfers")
+        if not isinstance(items, list) or not items:
+            return Response({"error": "Provide a non-empty list of transfers."}, status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > settings.WALLET_BATCH_TRANSFER_MAX_ITEMS:
+            return Response(
+                {"error": f"At most {settings.WALLET_BATCH_TRANSFER_MAX_ITEMS} transfers can be made at once."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        wallet_from = Wallet.objects.filter(user=request.user).first()
+        if wallet_from is None:
+            return Response(
+                {"error": "To make Wallet-To-Wallet transaction you need to create a wallet"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        try:
+            payments, errors, balance = batch_transfer(request.user, wallet_from, items)
+        except TransferError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        self.logger.info(f"Batch transfer by {request.user}: {len(payments)} of {len(items)} paid")
+
+        transactions = [
+            {
+                "index": payment["index"],
+                "transaction_id": str(payment["record"].transaction_id),
+                "wallet_addr_to": payment["wallet_to"].address,
+                "user_to": payment["wallet_to"].user.username,
+                "amount": str(payment["record"].amount),
+            }
+            for payment in payments
+        ]
+        if payments:
+            bump_wallet_cache_version(request.user.id, *{payment["wallet_to"].user_id for payment in payments})
+            send_email.delay(
+                email=request.user.email,
+                subject="Your wallet",
+                template_name="emails/W2WBatchTransaction.html",
+                context={
+                    "username": request.user.username,
+                    "count": len(payments),
+                    "total": str(sum(payment["record"].amount for payment in payments)),
+                    "transactions": transactions,
+                },
+            )
+            response_status = status.HTTP_207_MULTI_STATUS if errors else status.HTTP_201_CREATED
+        else:
+            response_status = status.HTTP_400_BAD_REQUEST
+
+        return Response(
+            {"transactions": transactions, "errors": errors, "Your balance": balance}, status=response_status
+        )
+
+
 class RefillWalletView(APIView):
     permission_classes = [IsAuthenticated]
     logger = logging.getLogger()
@@ -188,22 +293,19 @@ class RefillWalletView(APIView):
             self.logger.error("User's wallet is not defined")
             return None
 
-    @staticmethod
     def _send_transaction_request(
-        user_id: int, user_wallet: Wallet, amount: int, ccy: int, **kwargs
+        self, user_id: int, user_wallet: Wallet, amount: int, ccy: int, **kwargs
     ) -> dict | Response:
-
-        payment_service_url: str = get_node_url()
-        url = f"{payment_service_url}/make-transaction"
         payload = {"userId": user_id, "walletAddr": user_wallet.address, "amount": amount, "ccy": ccy, **kwargs}
 
         try:
-            response = requests.post(url, json=payload)
-            response.raise_for_status()
-            return Response(response.json())
-        except requests.RequestException as e:
-            print(f"Error sending transaction request: {e}")
-            return Response({"error": e}, status=status.HTTP_400_BAD_REQUEST)
+            return Response(payment_client.make_transaction(payload))
+        except PaymentServiceUnavailable as e:
+            self.logger.error(f"Payment service unavailable: {e}")
+            return Response({"error": str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        except PaymentServiceError as e:
+            self.logger.error(f"Error sending transaction request: {e}")
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
 
 class PaymentWebhookView(APIView):
@@ -211,60 +313,96 @@ class PaymentWebhookView(APIView):
 
     def post(self, request, *args, **kwargs):
         request_body = request.data
-        print(request_body)
 
-        try:
-            user_wallet: Wallet = self.get_user_wallet(request_body["user_id"])
-
-            if request_body["status"] == "success":
-                amount = self.get_correct_amount(request_body)
-                self.create_refill_transaction(request_body, user_wallet, amount)
-                self.update_wallet_balance(user_wallet, amount)
+        if settings.PAYMENT_WEBHOOK_MODE == "inbox":
+            return self.store_in_inbox(request_body)
 
+        try:
+            self.process_event(request_body)
         except Exception as e:
             self.logger.error(f"Transaction processing: {e}")
             return Response({"status": "error"}, status=status.HTTP_400_BAD_REQUEST)
 
         return Response({"status": "success"}, status=status.HTTP_200_OK)
 
+    def store_in_inbox(self, request_body) -> Response:
+        """
+        Validates the event and persists it for the process_payment_inbox task.
+        Only successful payments are stored: the inbox dedupes on the transaction id, so an earlier
+        "processing" event stored first would make the final success event look like a replay.
+        """
+        serializer = PaymentWebhookSerializer(data=request_body)
+        if not serializer.is_valid():
+            self.logger.error(f"Invalid webhook: {serializer.errors}")
+            return Response({"status": "error"}, status=status.HTTP_400_BAD_REQUEST)
+
+        if serializer.validated_data["status"] == "success":
+            store_webhook_event(serializer.validated_data["transactionId"], request_body)
+        return Response({"status": "success"}, status=status.HTTP_200_OK)
+
+    def process_event(self, request_body) -> None:
+        user_wallet: Wallet = self.get_user_wallet(request_body["user_id"])
+
+        if request_body["status"] == "success":
+            amount = self.get_correct_amount(request_body)
+            with transaction.atomic():
+                created = self.create_refill_transaction(request_body, user_wallet, amount)
+                if created:
+                    self.update_wallet_balance(user_wallet, amount, request_body["transactionId"])
+
     def get_user_wallet(self, user_id: int) -> Wallet | None:
         """
         Return an instance of the user wallet
         """
         try:
-            return Wallet.objects.select_related("user").get(user_id=user_id)
+            return Wallet.objects.get(user_id=user_id)
         except Wallet.DoesNotExist:
             self.logger.error("User's wallet is not defined")
             return None
 
     def get_correct_amount(self, request_body) -> decimal.Decimal:
         """
-        Changes the amount type from float to decimal
-        and converts the amount of kopecks to whole currency
+        Converts the integer amount of kopecks to whole currency as an exact Decimal
         """
-        converted_amount = request_body["amount"] / 100
+        converted_amount = kopecks_to_amount(request_body["amount"])
         self.logger.info(f"Amount converted: {converted_amount}")
-        return decimal.Decimal(converted_amount)
+        return converted_amount
 
-    def create_refill_transaction(self, request_body, user_wallet: Wallet, amount: decimal.Decimal) -> None:
-        refill_transaction = PaymentTransaction.objects.create(
+    def create_refill_transaction(self, request_body, user_wallet: Wallet, amount: decimal.Decimal) -> bool:
+        """
+        Records the refill, returns False if this transaction id was already processed
+        """
+        created = insert_refill_transaction(
             transaction_id=request_body["transactionId"],
-            user=user_wallet.user,
-            user_wallet_addr=user_wallet.address,
+            wallet=user_wallet,
             amount=amount,
             currency=request_body.get("ccy", 840),
             invoice_id=request_body["invoiceId"],
         )
 
-        if refill_transaction:
-            self.logger.info(f"Transaction successfully created: {refill_transaction.transaction_id}")
+        if created:
+            self.logger.info(f"Transaction successfully created: {request_body['transactionId']}")
+        else:
+            self.logger.warning(f"Duplicate webhook ignored: {request_body['transactionId']}")
+        return created
 
-        self.logger.info(f"Waiting for transaction processing to complete")
-
-    def update_wallet_balance(self, user_wallet: Wallet, amount: decimal.Decimal) -> None:
+    def update_wallet_balance(self, user_wallet: Wallet, amount: decimal.Decimal, transaction_id: str = "") -> None:
         """
         Updates the user's wallet balance.
         """
-        user_wallet.wallet_balance += amount
-        user_wallet.save()
+        increment_wallet_balance(user_wallet, amount, transaction_id)
         self.logger.info(f"The balance of wallet {user_wallet.address} has been refilled by {amount}")
+
+
+class PaymentNodeDiscoveryStatsView(APIView):
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response(payment_node_discovery.stats(), status=status.HTTP_200_OK)
+
+
+class PaymentWebhookInboxStatsView(APIView):
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response(inbox_stats(), status=status.HTTP_200_OK)